@@ -0,0 +1,113 @@
+"""Compare reading the brewery aggregates kept up to date by the writes
+against recomputing them over the catalogue, and rebuilding them with a
+loop against rebuilding them with NumPy.
+
+Run from the `functions` directory:
+
+    python -m benchmarks.aggregates --beers 1000000 --breweries 1000
+"""
+import argparse
+import asyncio
+import random
+import sys
+import time
+import uuid
+from typing import Any
+
+import db.aggregates
+from db.aggregates import BreweryAggregates
+from db.columnar import ColumnarDatabase
+
+
+def make_beers(count: int, breweries: int) -> list[dict[str, Any]]:
+    brewery_uuids = [str(uuid.uuid4()) for _ in range(breweries)]
+    return [
+        {
+            "uuid": str(uuid.uuid4()),
+            "name": f"Beer {index}",
+            "brewery_uuid": random.choice(brewery_uuids),
+            "abv": round(random.uniform(3, 12), 1),
+        }
+        for index in range(count)
+    ]
+
+
+def aggregate(beers: list[dict[str, Any]]) -> dict[str, list[float]]:
+    """Recompute the aggregates over the beers (count, sum, min, max)."""
+    aggregates: dict[str, list[float]] = {}
+    for beer in beers:
+        abv = beer["abv"]
+        stats = aggregates.get(beer["brewery_uuid"])
+        if stats is None:
+            aggregates[beer["brewery_uuid"]] = [1, abv, abv, abv]
+            continue
+        stats[0] += 1
+        stats[1] += abv
+        stats[2] = min(stats[2], abv)
+        stats[3] = max(stats[3], abv)
+    return aggregates
+
+
+async def recompute_by_page(database: ColumnarDatabase) -> None:
+    """Recompute the aggregates like the dashboards did, by reading every
+    page of beers."""
+    beers = []
+    key = None
+    while page := await database.get_beers_after(key=key, limit=100):
+        beers += page
+        key = page[-1]["uuid"]
+    aggregate(beers)
+
+
+def timed(func: Any, *args: Any) -> float:
+    start = time.perf_counter()
+    result = func(*args)
+    if asyncio.iscoroutine(result):
+        asyncio.run(result)
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--beers", type=int, default=1_000_000)
+    parser.add_argument("--breweries", type=int, default=1000)
+    parser.add_argument("--writes", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    beers = make_beers(args.beers, args.breweries)
+    database = ColumnarDatabase()
+    asyncio.run(database.create_beers(beers))
+    brewery_uuids = [beer["brewery_uuid"] for beer in beers]
+    abvs = [beer["abv"] for beer in beers]
+    aggregates = BreweryAggregates()
+
+    print(f"{args.beers} beers, {args.breweries} breweries")
+    results = {
+        "recompute by page": timed(recompute_by_page, database),
+        "recompute in one pass": timed(aggregate, beers),
+        "read (kept up to date)": timed(database.get_brewery_aggregates),
+    }
+    min_size = db.aggregates._VECTORISE_MIN_SIZE
+    db.aggregates._VECTORISE_MIN_SIZE = sys.maxsize
+    results["rebuild with a loop"] = timed(aggregates.rebuild, brewery_uuids, abvs)
+    db.aggregates._VECTORISE_MIN_SIZE = min_size
+    if db.aggregates._import_numpy() is not None:
+        results["rebuild with NumPy"] = timed(aggregates.rebuild, brewery_uuids, abvs)
+    else:
+        print("NumPy is not installed, skipping the NumPy rebuild")
+    for name, seconds in results.items():
+        print(f"{name:<26}{seconds * 1000:12.1f} ms")
+
+    writes = [random.randrange(args.beers) for _ in range(args.writes)]
+    start = time.perf_counter()
+    for index in writes:
+        aggregates.remove(brewery_uuids[index], abvs[index])
+        aggregates.add(brewery_uuids[index], abvs[index])
+    seconds = time.perf_counter() - start
+    print(f"{'update per write':<26}{seconds / (2 * len(writes)) * 1e6:12.2f} µs")
+
+
+if __name__ == "__main__":
+    main()
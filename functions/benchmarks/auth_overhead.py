@@ -0,0 +1,83 @@
+"""Measure the overhead of authenticating a request, with reference
+tokens (a database read per request) and claims tokens (no database
+read), with and without the verified token cache.
+
+Run from the `functions` directory:
+
+    python -m benchmarks.auth_overhead --requests 5000
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+USERNAME = "benchmark-user"
+
+
+async def measure(token: str, requests: int, cached: bool) -> tuple[float, float]:
+    """Get the median and 99th percentile latency (in µs) of
+    authenticating a request with a token."""
+    from utils.authentication import get_current_user, token_cache
+
+    max_size = token_cache.max_size
+    token_cache.max_size = max_size if cached else 0
+    times = []
+    try:
+        for _ in range(requests):
+            start = time.perf_counter()
+            await get_current_user(token)
+            times.append(time.perf_counter() - start)
+    finally:
+        token_cache.max_size = max_size
+        token_cache.clear()
+    times.sort()
+    return (
+        statistics.median(times) * 1e6,
+        times[int(0.99 * (len(times) - 1))] * 1e6,
+    )
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=5000)
+    args = parser.parse_args()
+
+    # NOTE: Authenticate against a real (SQLite) database unless told otherwise
+    os.environ.setdefault("DATABASE_BACKEND", "sqlite")
+    os.environ.setdefault("SQLITE_PATH", os.path.join(tempfile.mkdtemp(), "auth.db"))
+    from models.user import UserInDB
+    from utils.authentication import (
+        create_access_token,
+        get_token_data,
+        user_versions,
+    )
+    from utils.constants import database
+
+    await database.connect()
+    if await database.get_by_username(USERNAME) is None:
+        await database.create_user(
+            UserInDB(username=USERNAME, email="user@example.com", hashed_password="")
+        )
+    user = await database.get_by_username(USERNAME)
+    assert user is not None
+
+    print(f"{os.environ['DATABASE_BACKEND']} database, {args.requests} requests")
+    print(f"{'token':<12}{'cache':<8}{'p50':>10}{'p99':>10}{'size':>8}")
+    for token_format in ("reference", "claims"):
+        data = get_token_data(
+            UserInDB(**user), user_versions.get(USERNAME), token_format
+        )
+        token = create_access_token(data)
+        for cached in (False, True):
+            p50, p99 = await measure(token, args.requests, cached)
+            print(
+                f"{token_format:<12}{'on' if cached else 'off':<8}"
+                f"{p50:8.1f}µs{p99:8.1f}µs{len(token):7}B"
+            )
+    await database.disconnect()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,103 @@
+"""Measure the cold start of the app: the time to import it and the time
+to the first response, in fresh processes.
+
+Run from the `functions` directory:
+
+    python -m benchmarks.cold_start --runs 5 --imports
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+# Runs in a fresh process: import the app and send it a first request
+_child_script = """
+import asyncio, json, time
+start = time.perf_counter()
+import function_app
+imported = time.perf_counter()
+import httpx
+
+async def first_request():
+    async with httpx.AsyncClient(
+        app=function_app.versioned_app, base_url="http://localhost"
+    ) as client:
+        response = await client.get("/v1/api/beers")
+        response.raise_for_status()
+
+asyncio.run(first_request())
+responded = time.perf_counter()
+print(json.dumps({
+    "import_ms": (imported - start) * 1000,
+    "first_response_ms": (responded - imported) * 1000,
+}))
+"""
+
+
+def run_once() -> dict[str, float]:
+    start = time.perf_counter()
+    output = subprocess.run(
+        [sys.executable, "-c", _child_script],
+        capture_output=True,
+        check=True,
+        text=True,
+    ).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    result["process_ms"] = (time.perf_counter() - start) * 1000
+    return result
+
+
+def import_breakdown(top: int) -> list[tuple[str, float]]:
+    """Get the cumulative import time of every module the app imports
+    directly, using `python -X importtime`."""
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import function_app"],
+        capture_output=True,
+        check=True,
+        text=True,
+    ).stderr
+    totals: dict[str, float] = defaultdict(float)
+    children: list[tuple[str, float]] = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        # Modules are listed after the modules they import
+        if depth == 1:
+            children.append((name.strip().split(".")[0], int(cumulative) / 1000))
+        elif depth == 0:
+            if name.strip() == "function_app":
+                for package, milliseconds in children:
+                    totals[package] += milliseconds
+            children = []
+    return sorted(totals.items(), key=lambda item: item[1], reverse=True)[:top]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument(
+        "--imports", action="store_true", help="Also print the import breakdown."
+    )
+    args = parser.parse_args()
+
+    results = [run_once() for _ in range(args.runs)]
+    for metric in ("import_ms", "first_response_ms", "process_ms"):
+        values = [result[metric] for result in results]
+        print(
+            f"{metric:<20} median {statistics.median(values):8.1f}  "
+            f"min {min(values):8.1f}  max {max(values):8.1f}"
+        )
+
+    if args.imports:
+        print("\nimport time per package imported by the app (ms):")
+        for name, milliseconds in import_breakdown(top=15):
+            print(f"  {name:<28} {milliseconds:8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""Compare the memory use and read throughput of the dict store and the
+columnar store for a large beer catalogue.
+
+Run from the `functions` directory:
+
+    python -m benchmarks.columnar --beers 200000
+"""
+import argparse
+import asyncio
+import gc
+import json
+import random
+import time
+import tracemalloc
+import uuid
+from typing import Any, Awaitable, Callable
+
+from db.columnar import ColumnarDatabase
+from db.dummy import DummyUserDatabase, _dummy_db
+
+STYLES = ("Pale Ale", "IPA", "Stout", "Porter", "Pilsner", "Saison", "Tripel")
+
+
+def make_catalogue(count: int, breweries: int) -> list[str]:
+    """Make the catalogue as JSON lines, so every store parses its own
+    copy of the beers (like an import does)."""
+    brewery_uuids = [str(uuid.uuid4()) for _ in range(breweries)]
+    return [
+        json.dumps(
+            {
+                "uuid": str(uuid.uuid4()),
+                "name": f"{random.choice(STYLES)} {index}",
+                "brewery_uuid": random.choice(brewery_uuids),
+                "abv": round(random.uniform(3, 12), 1),
+            }
+        )
+        for index in range(count)
+    ]
+
+
+async def measure(name: str, func: Callable[[], Awaitable[Any]], repeat: int) -> None:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        await func()
+    seconds = time.perf_counter() - start
+    print(f"  {name:<28}{repeat / seconds:12,.0f} ops/s")
+
+
+async def benchmark(store: str, catalogue: list[str], repeat: int) -> None:
+    _dummy_db["beers"].clear()
+    gc.collect()
+    tracemalloc.start()
+    database = ColumnarDatabase() if store == "columnar" else DummyUserDatabase()
+    await database.create_beers([json.loads(line) for line in catalogue])
+    gc.collect()
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    print(f"{store}: {memory / 2**20:.1f} MiB, {memory / len(catalogue):.0f} B/beer")
+
+    beers = await database.get_beers_after(limit=len(catalogue))
+    keys = [beer["uuid"] for beer in beers]
+    brewery_uuids = list({beer["brewery_uuid"] for beer in beers})
+    pages = len(catalogue) // 100
+
+    await measure(
+        "get_beer_by_id",
+        lambda: database.get_beer_by_id(random.choice(keys)),
+        repeat * 100,
+    )
+    await measure(
+        "get_beers_by_ids (50)",
+        lambda: database.get_beers_by_ids(random.sample(keys, 50)),
+        repeat * 10,
+    )
+    await measure(
+        "get_all_beers (100)",
+        lambda: database.get_all_beers(page=random.randrange(pages), limit=100),
+        repeat * 10,
+    )
+    await measure(
+        "search_beers brewery (100)",
+        lambda: database.search_beers(brewery_uuid=random.choice(brewery_uuids)),
+        repeat * 10,
+    )
+    await measure(
+        "search_beers abv (100)",
+        lambda: database.search_beers(min_abv=11.5, key=random.choice(keys)),
+        repeat,
+    )
+    await measure(
+        "search_beers name (100)",
+        lambda: database.search_beers(name="tripel 1", key=random.choice(keys)),
+        repeat,
+    )
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--beers", type=int, default=200000)
+    parser.add_argument("--breweries", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=100)
+    parser.add_argument(
+        "--store", choices=("dict", "columnar"), action="append", dest="stores"
+    )
+    args = parser.parse_args()
+
+    random.seed(0)
+    catalogue = make_catalogue(args.beers, args.breweries)
+    for store in args.stores or ("dict", "columnar"):
+        await benchmark(store, catalogue, args.repeat)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
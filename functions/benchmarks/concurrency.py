@@ -0,0 +1,138 @@
+"""Hammer the beer create and delete endpoints with many concurrent tasks
+racing for the same beers, check that every beer is created and deleted
+exactly once, and report the throughput.
+
+Run from the `functions` directory (exits with 1 if a write is lost or
+duplicated):
+
+    python -m benchmarks.concurrency --backend columnar --tasks 50 --beers 200
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter
+from functools import partial
+from typing import Awaitable, Callable
+
+import httpx
+
+from benchmarks.load import ADMIN_PASSWORD, ADMIN_USERNAME, make_beer, seed
+
+
+async def hammer(
+    tasks: int, requests: list[Callable[[], Awaitable[httpx.Response]]]
+) -> tuple[Counter, float]:
+    """Send every request from every task (each in its own random order),
+    and count the response statuses."""
+    statuses: Counter = Counter()
+
+    async def task() -> None:
+        for request in random.sample(requests, len(requests)):
+            statuses[(await request()).status_code] += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(task() for _ in range(tasks)))
+    return statuses, time.perf_counter() - start
+
+
+def check(name: str, statuses: Counter, expected: Counter, seconds: float) -> bool:
+    passed = statuses == expected
+    total = sum(statuses.values())
+    print(
+        f"{name:<8}{total:>8} requests {total / seconds:>10,.0f} req/s  "
+        f"{dict(sorted(statuses.items()))}{'' if passed else '  FAILED'}"
+    )
+    if not passed:
+        print(f"  expected {dict(sorted(expected.items()))}")
+    return passed
+
+
+def check_stored(stored: int, expected: int) -> bool:
+    passed = stored == expected
+    print(f"{'stored':<8}{stored:>8} beers{'' if passed else '  FAILED'}")
+    if not passed:
+        print(f"  expected {expected}")
+    return passed
+
+
+async def run(args: argparse.Namespace) -> bool:
+    import function_app
+    from utils.constants import database
+
+    await database.connect()
+    await seed(database, 0)
+    beers = [make_beer(index) for index in range(args.beers)]
+    async with httpx.AsyncClient(
+        app=function_app.versioned_app, base_url="http://localhost"
+    ) as client:
+        login = await client.post(
+            "/v1/api/auth/token",
+            data={"username": ADMIN_USERNAME, "password": ADMIN_PASSWORD},
+        )
+        login.raise_for_status()
+        headers = {"Authorization": login.json()["access_token"]}
+
+        creates: list[Callable[[], Awaitable[httpx.Response]]] = [
+            partial(
+                client.post,
+                "/v1/api/beers",
+                json={key: beer[key] for key in ("name", "brewery_uuid", "abv")},
+                headers=headers,
+            )
+            for beer in beers
+        ]
+        statuses, seconds = await hammer(args.tasks, creates)
+        created = check(
+            "create",
+            statuses,
+            Counter({200: len(beers), 400: len(beers) * (args.tasks - 1)}),
+            seconds,
+        )
+        stored = await database.get_beers_by_ids([beer["uuid"] for beer in beers])
+        created = check_stored(len(stored), len(beers)) and created
+
+        deletes: list[Callable[[], Awaitable[httpx.Response]]] = [
+            partial(client.delete, f"/v1/api/beers/{beer['uuid']}", headers=headers)
+            for beer in beers
+        ]
+        statuses, seconds = await hammer(args.tasks, deletes)
+        deleted = check(
+            "delete",
+            statuses,
+            Counter({200: len(beers), 404: len(beers) * (args.tasks - 1)}),
+            seconds,
+        )
+        stored = await database.get_beers_by_ids([beer["uuid"] for beer in beers])
+        deleted = check_stored(len(stored), 0) and deleted
+    return created and deleted
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--backend", choices=("dummy", "columnar", "sqlite"))
+    parser.add_argument("--write-behind", action="store_true")
+    parser.add_argument("--tasks", type=int, default=50)
+    parser.add_argument("--beers", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    # NOTE: Set before the app is imported, it reads them on import
+    if args.backend is not None:
+        os.environ["DATABASE_BACKEND"] = args.backend
+    if os.environ.get("DATABASE_BACKEND") == "sqlite":
+        os.environ.setdefault(
+            "SQLITE_PATH", os.path.join(tempfile.mkdtemp(), "concurrency.sqlite3")
+        )
+    if args.write_behind:
+        os.environ["WRITE_BEHIND_DIR"] = tempfile.mkdtemp()
+    if not asyncio.run(run(args)):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""A local stand-in for the parts of the Github API the app uses, so
+social logins can be benchmarked without calling Github."""
+import asyncio
+import threading
+import time
+from collections import Counter
+
+import uvicorn
+from fastapi import FastAPI, Header, HTTPException
+
+
+def create_github_stub(latency: float = 0.05) -> FastAPI:
+    """Create the stub app.
+
+    Every access token is a separate user, so `token abc` logs in as
+    `abc@example.com`. The token `invalid` is rejected, and calls with the
+    token `broken` fail. The number of calls to every path is counted in
+    `stub.state.calls`.
+
+    Args:
+        latency (float): The time (in seconds) every call takes.
+            Defaults to 0.05.
+
+    Returns:
+        FastAPI: The stub app.
+    """
+    stub = FastAPI()
+    stub.state.calls = Counter()
+
+    def get_login(path: str, authorization: str) -> str:
+        stub.state.calls[path] += 1
+        login = authorization.removeprefix("token ")
+        if login == "invalid":
+            raise HTTPException(status_code=401, detail="Bad credentials")
+        if login == "broken":
+            raise HTTPException(status_code=500, detail="Server error")
+        return login
+
+    @stub.get("/user")
+    async def user(authorization: str = Header()) -> dict:
+        login = get_login("/user", authorization)
+        await asyncio.sleep(latency)
+        return {
+            "login": login,
+            "id": abs(hash(login)) % 1_000_000,
+            "node_id": login,
+            "avatar_url": None,
+            "gravatar_id": "",
+            "url": f"https://api.github.com/users/{login}",
+            "name": login.title(),
+        }
+
+    @stub.get("/user/emails")
+    async def emails(authorization: str = Header()) -> list[dict]:
+        login = get_login("/user/emails", authorization)
+        await asyncio.sleep(latency)
+        return [
+            {
+                "email": f"{login}@example.com",
+                "primary": True,
+                "verified": True,
+                "visibility": "public",
+            }
+        ]
+
+    return stub
+
+
+def serve_in_thread(app: FastAPI, port: int) -> uvicorn.Server:
+    """Serve an app with uvicorn in a background thread.
+
+    Args:
+        app (FastAPI): The app to serve.
+        port (int): The port to serve the app on.
+
+    Returns:
+        uvicorn.Server: The server, set `should_exit` to stop it.
+    """
+    server = uvicorn.Server(
+        uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning")
+    )
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    return server
@@ -0,0 +1,350 @@
+"""Load test the API with a mixed read/write/login workload and report
+the throughput and tail latency of every endpoint.
+
+The app runs either in-process (through the ASGI interface) or under
+uvicorn in a separate process. Social logins go to a local Github stub.
+Run from the `functions` directory:
+
+    python -m benchmarks.load --mode inprocess --duration 10 --output run.json
+    python -m benchmarks.load --mode uvicorn --workers 2 --compare run.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable
+
+import httpx
+
+from benchmarks.github_stub import create_github_stub, serve_in_thread
+
+ADMIN_USERNAME = "benchmark-admin"
+ADMIN_PASSWORD = "benchmark-password"
+BREWERIES = [str(uuid.uuid4()) for _ in range(20)]
+
+# The share of every operation in the workloads
+WORKLOADS: dict[str, dict[str, int]] = {
+    "mixed": {
+        "GET /beers": 30,
+        "GET /beers/{beer_id}": 30,
+        "GET /beers?brewery_uuid": 10,
+        "GET /users": 5,
+        "GET /users/me": 10,
+        "POST /beers": 5,
+        "POST /auth/token": 5,
+        "POST /auth/github-token": 5,
+    },
+    "read": {
+        "GET /beers": 40,
+        "GET /beers/{beer_id}": 40,
+        "GET /beers?brewery_uuid": 10,
+        "GET /users/me": 10,
+    },
+    "write": {"POST /beers": 80, "GET /beers/{beer_id}": 20},
+    "login": {"POST /auth/token": 50, "GET /beers/{beer_id}": 50},
+}
+
+
+@dataclass
+class State:
+    """What the workers share: the admin token and the known beers."""
+
+    token: str = ""
+    beer_ids: list[str] = field(default_factory=list)
+    latencies: dict[str, list[float]] = field(default_factory=lambda: defaultdict(list))
+    errors: dict[str, int] = field(default_factory=lambda: defaultdict(int))
+
+
+def make_beer(index: int) -> dict[str, Any]:
+    name = f"Benchmark beer {index} {uuid.uuid4().hex[:8]}"
+    return {
+        "uuid": str(uuid.uuid5(namespace=uuid.NAMESPACE_OID, name=name)),
+        "name": name,
+        "brewery_uuid": BREWERIES[index % len(BREWERIES)],
+        "abv": round(3 + index % 90 / 10, 1),
+    }
+
+
+async def seed(database: Any, beers: int) -> list[str]:
+    """Create the admin user and the initial beers in a database."""
+    from models.user import UserInDB
+    from utils.authentication import get_password_hash
+
+    if await database.get_by_username(ADMIN_USERNAME) is None:
+        await database.create_user(
+            UserInDB(
+                username=ADMIN_USERNAME,
+                email="admin@example.com",
+                hashed_password=get_password_hash(ADMIN_PASSWORD),
+                is_admin=True,
+            )
+        )
+    created = await database.create_beers([make_beer(i) for i in range(beers)])
+    return [beer["uuid"] for beer in created]
+
+
+def operations(
+    state: State,
+) -> dict[str, Callable[[httpx.AsyncClient], Awaitable[httpx.Response]]]:
+    def auth() -> dict[str, str]:
+        return {"Authorization": state.token}
+
+    async def create_beer(client: httpx.AsyncClient) -> httpx.Response:
+        beer = make_beer(random.randrange(1_000_000))
+        response = await client.post(
+            "/v1/api/beers",
+            json={key: beer[key] for key in ("name", "brewery_uuid", "abv")},
+            headers=auth(),
+        )
+        if response.status_code == 200:
+            state.beer_ids.append(response.json()["uuid"])
+        return response
+
+    return {
+        "GET /beers": lambda client: client.get("/v1/api/beers", params={"limit": 100}),
+        "GET /beers/{beer_id}": lambda client: client.get(
+            f"/v1/api/beers/{random.choice(state.beer_ids)}"
+        ),
+        "GET /beers?brewery_uuid": lambda client: client.get(
+            "/v1/api/beers",
+            params={"brewery_uuid": random.choice(BREWERIES), "limit": 100},
+        ),
+        "GET /users": lambda client: client.get("/v1/api/users"),
+        "GET /users/me": lambda client: client.get("/v1/api/users/me", headers=auth()),
+        "POST /beers": create_beer,
+        "POST /auth/token": lambda client: client.post(
+            "/v1/api/auth/token",
+            data={"username": ADMIN_USERNAME, "password": ADMIN_PASSWORD},
+        ),
+        "POST /auth/github-token": lambda client: client.post(
+            "/v1/api/auth/github-token",
+            params={"github_access_token": f"user{random.randrange(50)}"},
+        ),
+    }
+
+
+async def worker(
+    client: httpx.AsyncClient,
+    state: State,
+    weights: dict[str, int],
+    deadline: float,
+) -> None:
+    available = operations(state)
+    names = list(weights)
+    cumulative_weights = [weights[name] for name in names]
+    while time.perf_counter() < deadline:
+        name = random.choices(names, cumulative_weights)[0]
+        start = time.perf_counter()
+        try:
+            response = await available[name](client)
+            failed = response.status_code >= 400
+        except httpx.HTTPError:
+            failed = True
+        state.latencies[name].append(time.perf_counter() - start)
+        if failed:
+            state.errors[name] += 1
+
+
+def percentile(values: list[float], percent: float) -> float:
+    """Get a percentile (nearest rank) of sorted values."""
+    if not values:
+        return 0.0
+    rank = max(0, min(len(values) - 1, round(percent / 100 * len(values) + 0.5) - 1))
+    return values[rank]
+
+
+def summarise(latencies: list[float], errors: int, duration: float) -> dict:
+    values = sorted(latencies)
+    return {
+        "count": len(values),
+        "errors": errors,
+        "requests_per_second": len(values) / duration,
+        "mean_ms": sum(values) / len(values) * 1000 if values else 0.0,
+        "p50_ms": percentile(values, 50) * 1000,
+        "p95_ms": percentile(values, 95) * 1000,
+        "p99_ms": percentile(values, 99) * 1000,
+    }
+
+
+async def run_load(
+    client: httpx.AsyncClient,
+    state: State,
+    weights: dict[str, int],
+    concurrency: int,
+    duration: float,
+) -> dict:
+    login = await client.post(
+        "/v1/api/auth/token",
+        data={"username": ADMIN_USERNAME, "password": ADMIN_PASSWORD},
+    )
+    login.raise_for_status()
+    state.token = login.json()["access_token"]
+
+    start = time.perf_counter()
+    deadline = start + duration
+    await asyncio.gather(
+        *(worker(client, state, weights, deadline) for _ in range(concurrency))
+    )
+    elapsed = time.perf_counter() - start
+    endpoints = {
+        name: summarise(state.latencies[name], state.errors[name], elapsed)
+        for name in sorted(state.latencies)
+    }
+    all_latencies = [value for values in state.latencies.values() for value in values]
+    total = summarise(all_latencies, sum(state.errors.values()), elapsed)
+    return {"endpoints": endpoints, "total": total}
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def run_inprocess(args: argparse.Namespace, state: State) -> dict:
+    import function_app
+    from utils.constants import database
+
+    state.beer_ids = await seed(database, args.beers)
+    async with httpx.AsyncClient(
+        app=function_app.versioned_app, base_url="http://localhost"
+    ) as client:
+        return await run_load(
+            client, state, WORKLOADS[args.workload], args.concurrency, args.duration
+        )
+
+
+async def run_uvicorn(args: argparse.Namespace, state: State) -> dict:
+    from db.sqlite import SQLiteDatabase
+
+    database_path = os.path.join(tempfile.mkdtemp(), "benchmark.sqlite3")
+    database = SQLiteDatabase(path=database_path)
+    state.beer_ids = await seed(database, args.beers)
+    await database.disconnect()
+
+    port = free_port()
+    server = subprocess.Popen(
+        [
+            sys.executable,
+            *("-m", "serve", "--port", str(port), "--workers", str(args.workers)),
+            *("--log-level", "warning"),
+        ],
+        env={
+            **os.environ,
+            "DATABASE_BACKEND": "sqlite",
+            "SQLITE_PATH": database_path,
+        },
+    )
+    try:
+        async with httpx.AsyncClient(
+            base_url=f"http://127.0.0.1:{port}",
+            limits=httpx.Limits(max_connections=args.concurrency),
+            timeout=30,
+        ) as client:
+            for _ in range(300):
+                try:
+                    await client.get("/v1/openapi.json")
+                    break
+                except httpx.TransportError:
+                    await asyncio.sleep(0.1)
+            return await run_load(
+                client,
+                state,
+                WORKLOADS[args.workload],
+                args.concurrency,
+                args.duration,
+            )
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def print_results(results: dict) -> None:
+    header = f"{'endpoint':<26}{'count':>8}{'errors':>8}{'req/s':>9}"
+    header += f"{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+    print(header)
+    rows = [*results["endpoints"].items(), ("total", results["total"])]
+    for name, stats in rows:
+        print(
+            f"{name:<26}{stats['count']:>8}{stats['errors']:>8}"
+            f"{stats['requests_per_second']:>9.1f}{stats['p50_ms']:>9.1f}"
+            f"{stats['p95_ms']:>9.1f}{stats['p99_ms']:>9.1f}"
+        )
+
+
+def compare(results: dict, baseline: dict, max_regression: float) -> bool:
+    """Compare a run against a baseline run.
+
+    Returns:
+        bool: True if no endpoint got slower (p95) or handled fewer
+            requests per second than allowed.
+    """
+    passed = True
+    print(f"\n{'endpoint':<26}{'p95 change':>12}{'req/s change':>14}")
+    rows = [*results["endpoints"].items(), ("total", results["total"])]
+    for name, stats in rows:
+        base = baseline["total"] if name == "total" else baseline["endpoints"].get(name)
+        if not base or not base["count"]:
+            continue
+        p95_change = stats["p95_ms"] / max(base["p95_ms"], 1e-9) - 1
+        rps_change = stats["requests_per_second"] / base["requests_per_second"] - 1
+        regressed = p95_change > max_regression or rps_change < -max_regression
+        passed = passed and not regressed
+        flag = "  REGRESSION" if regressed else ""
+        print(f"{name:<26}{p95_change:>+12.0%}{rps_change:>+14.0%}{flag}")
+    return passed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mode", choices=("inprocess", "uvicorn"), default="inprocess")
+    parser.add_argument("--workload", choices=WORKLOADS, default="mixed")
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--beers", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers")
+    parser.add_argument("--github-latency", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the results to this JSON file.")
+    parser.add_argument("--compare", help="Compare against this results file.")
+    parser.add_argument("--max-regression", type=float, default=0.2)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    github_port = free_port()
+    github_stub = serve_in_thread(create_github_stub(args.github_latency), github_port)
+    # NOTE: Set before the app is imported (or started), it reads it on import
+    os.environ["GITHUB_API_URL"] = f"http://127.0.0.1:{github_port}"
+    # All load comes from one client, lift the login rate limits unless set
+    for name in ("AUTH_RATE_LIMIT_PER_IP", "AUTH_RATE_LIMIT_PER_USERNAME"):
+        os.environ.setdefault(name, "1000000")
+    os.environ.setdefault("AUTH_RATE_LIMIT_BURST", str(args.concurrency))
+    os.environ.setdefault("AUTH_MAX_CONCURRENCY", str(args.concurrency))
+
+    run = run_inprocess if args.mode == "inprocess" else run_uvicorn
+    results = asyncio.run(run(args, State()))
+    github_stub.should_exit = True
+    results["config"] = vars(args)
+
+    print_results(results)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as file:
+            baseline = json.load(file)
+        if not compare(results, baseline, args.max_regression):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""Measure the latency of verifying a password with every hashing profile,
+and of the background rehash that upgrades a hash to the current profile.
+
+Run from the `functions` directory (argon2 profiles are skipped unless
+argon2-cffi is installed):
+
+    python -m benchmarks.password_hash --bcrypt-rounds 10 12 14 --repeat 20
+"""
+import argparse
+import statistics
+import time
+from typing import Any
+
+from passlib.context import CryptContext
+from passlib.hash import argon2
+from utils.constants import PASSWORD_HASH_PROFILE, PASSWORD_HASH_PROFILES
+
+PASSWORD = "correct horse battery staple"
+
+
+def measure(options: dict[str, Any], repeat: int) -> tuple[float, float, float]:
+    """Get the median and 95th percentile verify latency (in ms) of a
+    profile, and the median latency of hashing with it."""
+    context = CryptContext(**options, deprecated="auto")
+    hash_times = []
+    verify_times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        hashed_password = context.hash(PASSWORD)
+        hash_times.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        assert context.verify(PASSWORD, hashed_password)
+        verify_times.append(time.perf_counter() - start)
+    verify_times.sort()
+    return (
+        statistics.median(verify_times) * 1000,
+        verify_times[int(0.95 * (len(verify_times) - 1))] * 1000,
+        statistics.median(hash_times) * 1000,
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--bcrypt-rounds", type=int, nargs="+", default=[10, 12, 14])
+    parser.add_argument("--argon2-time-cost", type=int, nargs="+", default=[1, 2, 3])
+    parser.add_argument("--argon2-memory-cost", type=int, default=19456)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    profiles: dict[str, dict[str, Any]] = {
+        f"configured ({PASSWORD_HASH_PROFILE})": PASSWORD_HASH_PROFILES[
+            PASSWORD_HASH_PROFILE
+        ]
+    }
+    for rounds in args.bcrypt_rounds:
+        profiles[f"bcrypt rounds={rounds}"] = {
+            "schemes": ["bcrypt"],
+            "bcrypt__rounds": rounds,
+        }
+    if argon2.has_backend():
+        for time_cost in args.argon2_time_cost:
+            profiles[f"argon2 t={time_cost} m={args.argon2_memory_cost}"] = {
+                "schemes": ["argon2"],
+                "argon2__time_cost": time_cost,
+                "argon2__memory_cost": args.argon2_memory_cost,
+                "argon2__parallelism": 1,
+            }
+    else:
+        print("argon2-cffi is not installed, skipping the argon2 profiles")
+
+    print(f"{'profile':<32}{'verify p50':>12}{'verify p95':>12}{'rehash p50':>12}")
+    for name, options in profiles.items():
+        if options["schemes"][0] == "argon2" and not argon2.has_backend():
+            continue
+        p50, p95, rehash = measure(options, args.repeat)
+        print(f"{name:<32}{p50:10.1f}ms{p95:10.1f}ms{rehash:10.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
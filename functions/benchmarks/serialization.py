@@ -0,0 +1,74 @@
+"""Compare the default and the fast serialisation path of the list
+endpoints.
+
+Run from the `functions` directory:
+
+    python -m benchmarks.serialization --rows 100 --repeat 2000
+"""
+import argparse
+import asyncio
+import time
+import uuid
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+from models.beer import Beer
+from utils.serialization import FastJSONResponse, orjson, project
+
+# The response field FastAPI creates for a `list[Beer]` return value
+response_field = create_response_field(name="response", type_=list[Beer])
+
+
+def make_rows(count: int) -> list[dict]:
+    return [
+        {
+            "uuid": str(uuid.uuid4()),
+            "name": f"Beer {index}",
+            "brewery_uuid": str(uuid.uuid4()),
+            "abv": 4.0 + index % 60 / 10,
+        }
+        for index in range(count)
+    ]
+
+
+async def default_path(rows: list[dict]) -> bytes:
+    """Build models, re-validate them against the response model and
+    encode them, like FastAPI does for a `list[Beer]` return value."""
+    content = await serialize_response(
+        field=response_field,
+        response_content=[Beer(**row) for row in rows],
+        is_coroutine=True,
+    )
+    return JSONResponse(content).body
+
+
+async def fast_path(rows: list[dict]) -> bytes:
+    return FastJSONResponse(project(rows, Beer)).body
+
+
+async def measure(name: str, func, rows: list[dict], repeat: int) -> float:
+    await func(rows)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        await func(rows)
+    per_call = (time.perf_counter() - start) / repeat
+    print(f"{name:<8} {per_call * 1e6:10.1f} µs/request")
+    return per_call
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    rows = make_rows(args.rows)
+    print(f"{args.rows} rows, encoder: {'orjson' if orjson else 'json'}")
+    default = await measure("default", default_path, rows, args.repeat)
+    fast = await measure("fast", fast_path, rows, args.repeat)
+    print(f"speedup  {default / fast:10.1f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
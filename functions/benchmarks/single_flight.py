@@ -0,0 +1,73 @@
+"""Measure how single-flight coalescing cuts the database load of a
+thundering herd: many concurrent reads of a few popular beers.
+
+Run from the `functions` directory:
+
+    python -m benchmarks.single_flight --concurrency 500 --keys 5
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+
+from db.sqlite import SQLiteDatabase
+from utils.singleflight import SingleFlight
+
+
+async def herd(database: SQLiteDatabase, keys: list[str], concurrency: int) -> float:
+    start = time.perf_counter()
+    await asyncio.gather(
+        *(database.get_beer_by_id(random.choice(keys)) for _ in range(concurrency))
+    )
+    return time.perf_counter() - start
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", type=int, default=500)
+    parser.add_argument("--keys", type=int, default=5)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), "benchmark.sqlite3")
+    beers = [
+        {
+            "uuid": f"beer-{index}",
+            "name": f"Beer {index}",
+            "brewery_uuid": "b",
+            "abv": 5,
+        }
+        for index in range(args.keys)
+    ]
+    keys = [f"beer-{index}" for index in range(args.keys)]
+
+    for coalesce in (False, True):
+        database = SQLiteDatabase(path=path)
+        await database.create_beers(beers)
+        backend_calls = 0
+        get_beer_by_id = database.get_beer_by_id
+
+        async def counted_get_beer_by_id(key: str) -> dict | None:
+            nonlocal backend_calls
+            backend_calls += 1
+            return await get_beer_by_id(key)
+
+        database.get_beer_by_id = counted_get_beer_by_id  # type: ignore
+        if coalesce:
+            SingleFlight().wrap(database, names=["get_beer_by_id"])
+
+        seconds = [
+            await herd(database, keys, args.concurrency) for _ in range(args.rounds)
+        ]
+        await database.disconnect()
+        print(
+            f"{'single-flight' if coalesce else 'direct':<14}"
+            f"{backend_calls / args.rounds:8.0f} backend calls/round "
+            f"{sorted(seconds)[len(seconds) // 2] * 1000:8.1f} ms/round (median)"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,66 @@
+"""Compare how long a columnar database takes to warm-load a catalogue
+from a binary snapshot and from replaying its JSON write log.
+
+Run from the `functions` directory:
+
+    python -m benchmarks.snapshot --beers 1000000
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+import uuid
+
+from db.columnar import ColumnarDatabase
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--beers", type=int, default=1000000)
+    parser.add_argument("--breweries", type=int, default=1000)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    random.seed(0)
+    brewery_uuids = [str(uuid.uuid4()) for _ in range(args.breweries)]
+    data_dir = tempfile.mkdtemp()
+    database = ColumnarDatabase(data_dir=data_dir, snapshot_every=args.beers + 1)
+    for first in range(0, args.beers, args.batch_size):
+        await database.create_beers(
+            [
+                {
+                    "uuid": str(uuid.uuid4()),
+                    "name": f"Beer {index}",
+                    "brewery_uuid": random.choice(brewery_uuids),
+                    "abv": round(random.uniform(3, 12), 1),
+                }
+                for index in range(first, min(first + args.batch_size, args.beers))
+            ]
+        )
+    log_size = os.path.getsize(os.path.join(data_dir, "writes.log"))
+
+    start = time.perf_counter()
+    ColumnarDatabase(data_dir=data_dir)
+    replay_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    await database.snapshot()
+    snapshot_seconds = time.perf_counter() - start
+    snapshot_size = os.path.getsize(os.path.join(data_dir, "snapshot.bin"))
+
+    start = time.perf_counter()
+    loaded = ColumnarDatabase(data_dir=data_dir)
+    load_seconds = time.perf_counter() - start
+    assert len(loaded) == args.beers
+
+    print(f"{'replay JSON log':<20}{replay_seconds:8.2f} s {log_size / 2**20:8.1f} MiB")
+    print(f"{'write snapshot':<20}{snapshot_seconds:8.2f} s")
+    print(
+        f"{'load snapshot':<20}{load_seconds:8.2f} s {snapshot_size / 2**20:8.1f} MiB"
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
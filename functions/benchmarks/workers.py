@@ -0,0 +1,228 @@
+"""Serve the API with several workers sharing one SQLite file, check that
+the writes made through any worker are read by all of them (with the same
+ETags), and measure how the read throughput scales with the workers.
+
+Every request of the consistency check opens its own connection, so they
+are spread over the workers. The load comes from several client
+processes, so the client isn't the bottleneck. Run from the `functions`
+directory (exits with 1 if a read is stale or the ETags disagree):
+
+    python -m benchmarks.workers --workers 1 2 4 --duration 10
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any
+
+import httpx
+
+from benchmarks.load import (
+    ADMIN_PASSWORD,
+    ADMIN_USERNAME,
+    free_port,
+    make_beer,
+    percentile,
+    seed,
+)
+
+
+async def prepare(beers: int) -> tuple[str, list[str]]:
+    """Create a database file with the admin user and the beers."""
+    from db.sqlite import SQLiteDatabase
+
+    database_path = os.path.join(tempfile.mkdtemp(), "workers.sqlite3")
+    database = SQLiteDatabase(path=database_path)
+    beer_ids = await seed(database, beers)
+    await database.disconnect()
+    return database_path, beer_ids
+
+
+async def start_server(workers: int, database_path: str) -> tuple[Any, str]:
+    port = free_port()
+    server = subprocess.Popen(
+        [
+            sys.executable,
+            *("-m", "serve", "--port", str(port), "--workers", str(workers)),
+            *("--log-level", "warning"),
+        ],
+        env={**os.environ, "DATABASE_BACKEND": "sqlite", "SQLITE_PATH": database_path},
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        for _ in range(300):
+            try:
+                await client.get("/v1/openapi.json")
+                return server, base_url
+            except httpx.TransportError:
+                await asyncio.sleep(0.1)
+    server.terminate()
+    raise RuntimeError("The server didn't start")
+
+
+async def check_consistency(base_url: str, rounds: int, reads: int) -> bool:
+    """Create and delete beers, and read them back through many
+    connections (so through all workers) right after every write."""
+    # NOTE: No keep-alive, every request gets a connection (and a worker)
+    async with httpx.AsyncClient(
+        base_url=base_url,
+        limits=httpx.Limits(max_keepalive_connections=0),
+        timeout=30,
+    ) as client:
+        login = await client.post(
+            "/v1/api/auth/token",
+            data={"username": ADMIN_USERNAME, "password": ADMIN_PASSWORD},
+        )
+        login.raise_for_status()
+        headers = {"Authorization": login.json()["access_token"]}
+
+        workers = set()
+        for _ in range(reads):
+            response = await client.get("/v1/api/metrics", headers=headers)
+            match = re.search(r"^process_id (\d+)", response.text, re.MULTILINE)
+            if match is not None:
+                workers.add(match.group(1))
+
+        stale = 0
+        for _ in range(rounds):
+            before = await client.get("/v1/api/beers", params={"limit": 10})
+            beer = make_beer(random.randrange(1_000_000))
+            response = await client.post(
+                "/v1/api/beers",
+                json={key: beer[key] for key in ("name", "brewery_uuid", "abv")},
+                headers=headers,
+            )
+            response.raise_for_status()
+            beer_id = response.json()["uuid"]
+
+            etags = set()
+            for _ in range(reads):
+                read = await client.get(f"/v1/api/beers/{beer_id}")
+                listed = await client.get(
+                    "/v1/api/beers",
+                    params={"limit": 10},
+                    headers={"If-None-Match": before.headers["ETag"]},
+                )
+                stale += read.status_code != 200 or listed.status_code != 200
+                etags.add(listed.headers["ETag"])
+            stale += len(etags) != 1
+
+            response = await client.delete(f"/v1/api/beers/{beer_id}", headers=headers)
+            response.raise_for_status()
+            for _ in range(reads):
+                read = await client.get(f"/v1/api/beers/{beer_id}")
+                stale += read.status_code != 404
+
+    passed = not stale
+    print(
+        f"  consistency: {rounds} writes, {reads} reads each through "
+        f"{len(workers)} workers, {stale} stale{'' if passed else '  FAILED'}"
+    )
+    return passed
+
+
+async def load(
+    base_url: str, beer_ids: list[str], connections: int, duration: float
+) -> list[float]:
+    """Read beers (one by one and by page) over some connections for a
+    while, and get the latencies."""
+    latencies: list[float] = []
+
+    async def connection(client: httpx.AsyncClient, deadline: float) -> None:
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            if random.random() < 0.5:
+                response = await client.get(f"/v1/api/beers/{random.choice(beer_ids)}")
+            else:
+                response = await client.get("/v1/api/beers", params={"limit": 100})
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - start)
+
+    async with httpx.AsyncClient(
+        base_url=base_url,
+        limits=httpx.Limits(max_connections=connections),
+        timeout=30,
+    ) as client:
+        deadline = time.perf_counter() + duration
+        await asyncio.gather(
+            *(connection(client, deadline) for _ in range(connections))
+        )
+    return latencies
+
+
+def run_client(arguments: tuple[str, list[str], int, float]) -> list[float]:
+    return asyncio.run(load(*arguments))
+
+
+def measure_throughput(
+    base_url: str, beer_ids: list[str], args: argparse.Namespace
+) -> tuple[float, float, float]:
+    """Get the requests per second, and the median and 99th percentile
+    latency (in ms), of the load from all clients."""
+    connections = max(1, args.concurrency // args.clients)
+    with multiprocessing.Pool(args.clients) as pool:
+        results = pool.map(
+            run_client,
+            [(base_url, beer_ids, connections, args.duration)] * args.clients,
+        )
+    latencies = sorted(latency for result in results for latency in result)
+    return (
+        len(latencies) / args.duration,
+        percentile(latencies, 50) * 1000,
+        percentile(latencies, 99) * 1000,
+    )
+
+
+async def run(args: argparse.Namespace) -> bool:
+    passed = True
+    baseline = None
+    print(f"{os.cpu_count()} CPUs, {args.clients} client processes")
+    for workers in args.workers:
+        database_path, beer_ids = await prepare(args.beers)
+        server, base_url = await start_server(workers, database_path)
+        try:
+            print(f"{workers} workers")
+            consistent = await check_consistency(base_url, args.rounds, args.reads)
+            passed = consistent and passed
+            rps, p50, p99 = await asyncio.to_thread(
+                measure_throughput, base_url, beer_ids, args
+            )
+        finally:
+            server.terminate()
+            server.wait()
+        baseline = baseline or rps
+        print(
+            f"  throughput: {rps:,.0f} req/s ({rps / baseline:.2f}x), "
+            f"p50 {p50:.1f} ms, p99 {p99:.1f} ms"
+        )
+    return passed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--clients", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--beers", type=int, default=1000)
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--reads", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    # NOTE: All load comes from one host, lift the login rate limits unless set
+    for name in ("AUTH_RATE_LIMIT_PER_IP", "AUTH_RATE_LIMIT_PER_USERNAME"):
+        os.environ.setdefault(name, "1000000")
+    if not asyncio.run(run(args)):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+from typing import Any, Sequence
+
+# The number of beers from which a batch is aggregated with NumPy (when it is
+# installed). Smaller batches have about as many distinct brewery and ABV
+# pairs as beers, so merging them costs as much as a loop
+_VECTORISE_MIN_SIZE = 100_000
+
+
+def _import_numpy() -> Any:
+    """Import NumPy on the first large batch rather than with the module, as
+    importing it takes longer than a cold start otherwise does.
+
+    Returns:
+        Any: The `numpy` module, or None if it is not installed.
+    """
+    try:
+        import numpy
+    except ImportError:  # pragma: no cover
+        return None
+    return numpy
+
+
+class _BreweryAggregate:
+    __slots__ = ("count", "abv_sum", "abv_counts", "min_abv", "max_abv")
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.abv_sum = 0.0
+        # The number of beers of every ABV, to find the next lowest (or
+        # highest) ABV when the last beer with the lowest one is removed
+        self.abv_counts: dict[float, int] = {}
+        # None once the beer(s) with it are removed, until the next read
+        self.min_abv: float | None = None
+        self.max_abv: float | None = None
+
+
+class BreweryAggregates:
+    """Keep the number of beers and the average, lowest and highest ABV of
+    every brewery up to date as beers are added and removed, so they are
+    read without going over the beers.
+
+    Adding and removing a beer costs O(1). Removing the last beer with the
+    lowest (or highest) ABV of a brewery leaves it to the next read to
+    find the new one, among the distinct ABVs of the brewery (ABVs have
+    few distinct values, so that's also what the memory grows with).
+
+    Args:
+        brewery_uuids (Sequence[str]): The brewery UUIDs of the initial
+            beers.
+        abvs (Sequence[float]): The ABVs of the initial beers.
+    """
+
+    def __init__(
+        self, brewery_uuids: Sequence[str] = (), abvs: Sequence[float] = ()
+    ) -> None:
+        self._breweries: dict[str, _BreweryAggregate] = {}
+        self.add_many(brewery_uuids, abvs)
+
+    def __len__(self) -> int:
+        return len(self._breweries)
+
+    def add(self, brewery_uuid: str, abv: float) -> None:
+        """Add a beer.
+
+        Args:
+            brewery_uuid (str): The UUID of the brewery of the beer.
+            abv (float): The ABV of the beer.
+        """
+        aggregate = self._breweries.get(brewery_uuid)
+        if aggregate is None:
+            aggregate = self._breweries[brewery_uuid] = _BreweryAggregate()
+            aggregate.min_abv = aggregate.max_abv = abv
+        elif aggregate.min_abv is not None and aggregate.max_abv is not None:
+            aggregate.min_abv = min(aggregate.min_abv, abv)
+            aggregate.max_abv = max(aggregate.max_abv, abv)
+        aggregate.count += 1
+        aggregate.abv_sum += abv
+        aggregate.abv_counts[abv] = aggregate.abv_counts.get(abv, 0) + 1
+
+    def remove(self, brewery_uuid: str, abv: float) -> None:
+        """Remove a beer that was added.
+
+        Args:
+            brewery_uuid (str): The UUID of the brewery of the beer.
+            abv (float): The ABV of the beer.
+        """
+        aggregate = self._breweries[brewery_uuid]
+        if aggregate.count == 1:
+            del self._breweries[brewery_uuid]
+            return
+        aggregate.count -= 1
+        aggregate.abv_sum -= abv
+        if aggregate.abv_counts[abv] > 1:
+            aggregate.abv_counts[abv] -= 1
+            return
+        del aggregate.abv_counts[abv]
+        if abv == aggregate.min_abv or abv == aggregate.max_abv:
+            aggregate.min_abv = aggregate.max_abv = None
+
+    def add_many(self, brewery_uuids: Sequence[str], abvs: Sequence[float]) -> None:
+        """Add many beers, like when loading a catalogue. Large batches are
+        aggregated with NumPy (when it is installed) and then merged.
+
+        Args:
+            brewery_uuids (Sequence[str]): The brewery UUIDs of the beers.
+            abvs (Sequence[float]): The ABVs of the beers, in the same
+                order.
+        """
+        np = _import_numpy() if len(brewery_uuids) >= _VECTORISE_MIN_SIZE else None
+        if np is None:
+            for brewery_uuid, abv in zip(brewery_uuids, abvs):
+                self.add(brewery_uuid, abv)
+            return
+
+        # Number the breweries, then group the beers by brewery and ABV
+        numbers: dict[str, int] = {}
+        codes = np.fromiter(
+            (numbers.setdefault(uuid, len(numbers)) for uuid in brewery_uuids),
+            dtype=np.intp,
+            count=len(brewery_uuids),
+        )
+        values = np.asarray(abvs, dtype=np.float64)
+        order = np.lexsort((values, codes))
+        codes, values = codes[order], values[order]
+        starts = np.flatnonzero(
+            np.concatenate(
+                ([True], (codes[1:] != codes[:-1]) | (values[1:] != values[:-1]))
+            )
+        )
+        pair_counts = np.diff(np.append(starts, len(codes)))
+        counts = np.bincount(codes, minlength=len(numbers))
+        sums = np.bincount(codes, weights=values, minlength=len(numbers))
+
+        batch = []
+        for count, abv_sum in zip(counts.tolist(), sums.tolist()):
+            aggregate = _BreweryAggregate()
+            aggregate.count = count
+            aggregate.abv_sum = abv_sum
+            batch.append(aggregate)
+        pairs = zip(codes[starts].tolist(), values[starts].tolist(), pair_counts)
+        for code, abv, count in pairs:
+            batch[code].abv_counts[abv] = int(count)
+
+        for brewery_uuid, aggregate in zip(numbers, batch):
+            self._merge(brewery_uuid, aggregate)
+
+    def _merge(self, brewery_uuid: str, batch: _BreweryAggregate) -> None:
+        aggregate = self._breweries.get(brewery_uuid)
+        if aggregate is None:
+            # NOTE: The ABVs of a batch are added in order
+            batch.min_abv = next(iter(batch.abv_counts))
+            batch.max_abv = next(reversed(batch.abv_counts))
+            self._breweries[brewery_uuid] = batch
+            return
+        aggregate.count += batch.count
+        aggregate.abv_sum += batch.abv_sum
+        for abv, count in batch.abv_counts.items():
+            aggregate.abv_counts[abv] = aggregate.abv_counts.get(abv, 0) + count
+        if aggregate.min_abv is not None and aggregate.max_abv is not None:
+            aggregate.min_abv = min(aggregate.min_abv, next(iter(batch.abv_counts)))
+            aggregate.max_abv = max(aggregate.max_abv, next(reversed(batch.abv_counts)))
+
+    def rebuild(self, brewery_uuids: Sequence[str], abvs: Sequence[float]) -> None:
+        """Replace all aggregates with those of a catalogue.
+
+        Args:
+            brewery_uuids (Sequence[str]): The brewery UUIDs of the beers.
+            abvs (Sequence[float]): The ABVs of the beers, in the same
+                order.
+        """
+        self._breweries = {}
+        self.add_many(brewery_uuids, abvs)
+
+    def get(self, brewery_uuid: str | None = None) -> list[dict[str, Any]]:
+        """Get the aggregates of all breweries, or of one brewery.
+
+        Args:
+            brewery_uuid (str | None): The UUID of the brewery. Defaults to
+                None, for all breweries.
+
+        Returns:
+            list[dict[str, Any]]: The aggregates, ordered by brewery UUID
+                (empty if the brewery has no beers).
+        """
+        if brewery_uuid is None:
+            brewery_uuids = sorted(self._breweries)
+        elif brewery_uuid in self._breweries:
+            brewery_uuids = [brewery_uuid]
+        else:
+            brewery_uuids = []
+        aggregates = []
+        for uuid in brewery_uuids:
+            aggregate = self._breweries[uuid]
+            if aggregate.min_abv is None or aggregate.max_abv is None:
+                aggregate.min_abv = min(aggregate.abv_counts)
+                aggregate.max_abv = max(aggregate.abv_counts)
+            aggregates.append(
+                {
+                    "brewery_uuid": uuid,
+                    "beer_count": aggregate.count,
+                    "average_abv": aggregate.abv_sum / aggregate.count,
+                    "min_abv": aggregate.min_abv,
+                    "max_abv": aggregate.max_abv,
+                }
+            )
+        return aggregates
@@ -1,10 +1,27 @@
 from abc import ABC, abstractmethod
-from typing import Any
+from typing import Any, AsyncIterator
 
 from models.user import User, UserInDB
 
+from db.events import ChangeEvents
+from db.locks import KeyLocks
+
+
+class UserAlreadyExistsError(Exception):
+    """Raised when creating a user with a username that is taken."""
+
 
 class Database(ABC):
+    """The interface of the databases.
+
+    The methods that change records publish a change event for every
+    changed record to `changes`.
+    """
+
+    def __init__(self) -> None:
+        self.changes = ChangeEvents()
+        self._beer_locks = KeyLocks()
+
     @abstractmethod
     async def get_by_username(self, key: str) -> dict[str, Any] | None:
         ...
@@ -15,6 +32,24 @@ class Database(ABC):
     ) -> list[dict[str, Any]]:
         ...
 
+    @abstractmethod
+    async def get_users_after(
+        self, key: str | None = None, limit: int = 100
+    ) -> list[dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    async def get_all_beers(
+        self, page: int = 0, limit: int = 100
+    ) -> list[dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    async def get_beers_after(
+        self, key: str | None = None, limit: int = 100
+    ) -> list[dict[str, Any]]:
+        ...
+
     @abstractmethod
     async def connect(self) -> None:
         ...
@@ -25,4 +60,194 @@ class Database(ABC):
 
     @abstractmethod
     async def create_user(self, user: UserInDB) -> User:
+        """Create a user.
+
+        Args:
+            user (UserInDB): The user.
+
+        Raises:
+            UserAlreadyExistsError: Raised if the username is taken.
+
+        Returns:
+            User: The created user.
+        """
+
+    @abstractmethod
+    async def update_user_password(self, key: str, hashed_password: str) -> None:
+        """Replace the hashed password of a user (if the user exists).
+
+        Args:
+            key (str): The username of the user.
+            hashed_password (str): The new hashed password.
+        """
+
+    @abstractmethod
+    async def search_beers(
+        self,
+        brewery_uuid: str | None = None,
+        min_abv: float | None = None,
+        max_abv: float | None = None,
+        name: str | None = None,
+        key: str | None = None,
+        limit: int = 100,
+    ) -> list[dict[str, Any]]:
+        """Get the beers that match all given filters, ordered by UUID.
+
+        Args:
+            brewery_uuid (str | None): The UUID of the brewery.
+            min_abv (float | None): The lowest ABV.
+            max_abv (float | None): The highest ABV.
+            name (str | None): A (case insensitive) part of the name.
+            key (str | None): The UUID to start after.
+            limit (int): The maximum number of beers. Defaults to 100.
+
+        Returns:
+            list[dict[str, Any]]: The matching beers.
+        """
+
+    @abstractmethod
+    async def get_brewery_aggregates(
+        self, brewery_uuid: str | None = None
+    ) -> list[dict[str, Any]]:
+        """Get the number of beers and the average, lowest and highest ABV
+        of every brewery, from aggregates that the writes keep up to date.
+
+        Args:
+            brewery_uuid (str | None): The UUID of a brewery, to only get
+                its aggregates. Defaults to None, for all breweries.
+
+        Returns:
+            list[dict[str, Any]]: The aggregates, ordered by brewery UUID.
+        """
+
+    @abstractmethod
+    async def get_beer_by_id(self, key: str) -> dict[str, Any] | None:
+        ...
+
+    @abstractmethod
+    async def get_beers_by_ids(self, keys: list[str]) -> list[dict[str, Any]]:
+        """Get many beers by their UUIDs at once.
+
+        Args:
+            keys (list[str]): The UUIDs of the beers.
+
+        Returns:
+            list[dict[str, Any]]: The beers that exist, in the order of
+                their (first) UUID in keys.
+        """
+
+    @abstractmethod
+    async def create_beer(self, beer: dict[str, Any]) -> dict[str, Any]:
         ...
+
+    @abstractmethod
+    async def create_beers(self, beers: list[dict[str, Any]]) -> list[dict[str, Any]]:
+        """Create a batch of beers, skipping beers that already exist.
+
+        Args:
+            beers (list[dict[str, Any]]): The beers to create.
+
+        Returns:
+            list[dict[str, Any]]: The beers that were created.
+        """
+
+    @abstractmethod
+    async def delete_beer_by_id(self, key: str) -> None:
+        ...
+
+    async def create_beer_if_absent(
+        self, beer: dict[str, Any]
+    ) -> dict[str, Any] | None:
+        """Create a beer unless a beer with its UUID exists, atomically.
+
+        The check and the write hold the lock of the UUID, so concurrent
+        calls for the same beer create it once. Databases that can do this
+        in one statement override it.
+
+        Args:
+            beer (dict[str, Any]): The beer to create.
+
+        Returns:
+            dict[str, Any] | None: The created beer, or None if it exists.
+        """
+        async with self._beer_locks.lock(beer["uuid"]):
+            if await self._get_stored_beer(beer["uuid"]) is not None:
+                return None
+            return await self.create_beer(beer)
+
+    async def delete_beer_if_present(self, key: str) -> bool:
+        """Delete a beer if it exists, atomically.
+
+        Args:
+            key (str): The UUID of the beer.
+
+        Returns:
+            bool: True if the beer was deleted, False if it didn't exist.
+        """
+        async with self._beer_locks.lock(key):
+            if await self._get_stored_beer(key) is None:
+                return False
+            await self.delete_beer_by_id(key)
+            return True
+
+    async def _get_stored_beer(self, key: str) -> dict[str, Any] | None:
+        """Read a beer past the wrappers of `get_beer_by_id`.
+
+        A coalesced read could have started before the last write, so the
+        checks under the lock of a beer read it themselves.
+        """
+        return await type(self).get_beer_by_id(self, key)
+
+    async def get_collection_version(self, collection: str) -> tuple[str, int] | None:
+        """Get the version of a collection, if the database keeps track of
+        it. Databases that several processes share do, so they all agree
+        on it.
+
+        Args:
+            collection (str): The name of the collection.
+
+        Returns:
+            tuple[str, int] | None: The epoch of the database and the
+                number of changes to the collection, or None if the
+                database doesn't keep track (the changes of this process
+                are then counted from its change events).
+        """
+        return None
+
+    async def iter_users(self, batch_size: int = 500) -> AsyncIterator[dict[str, Any]]:
+        """Iterate over all users, fetching them in batches by key.
+
+        Args:
+            batch_size (int): The number of users to fetch per batch.
+                Defaults to 500.
+
+        Yields:
+            dict[str, Any]: The users, ordered by username.
+        """
+        key = None
+        while True:
+            users = await self.get_users_after(key=key, limit=batch_size)
+            for user in users:
+                yield user
+            if len(users) < batch_size:
+                return
+            key = users[-1]["username"]
+
+    async def iter_beers(self, batch_size: int = 500) -> AsyncIterator[dict[str, Any]]:
+        """Iterate over all beers, fetching them in batches by key.
+
+        Args:
+            batch_size (int): The number of beers to fetch per batch.
+                Defaults to 500.
+
+        Yields:
+            dict[str, Any]: The beers, ordered by UUID.
+        """
+        key = None
+        while True:
+            beers = await self.get_beers_after(key=key, limit=batch_size)
+            for beer in beers:
+                yield beer
+            if len(beers) < batch_size:
+                return
+            key = beers[-1]["uuid"]
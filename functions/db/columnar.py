@@ -0,0 +1,384 @@
+import asyncio
+import gc
+import os
+import sys
+from array import array
+from bisect import bisect_right, insort
+from typing import Any, Iterator
+
+from models.user import User, UserInDB
+
+from db.aggregates import BreweryAggregates
+from db.dummy import DummyUserDatabase, _dummy_db
+from db.indexes import OrderedKeyIndex
+from db.snapshot import Snapshot, WriteLog, load_snapshot, write_snapshot
+
+
+class ColumnarDatabase(DummyUserDatabase):
+    """An in-process database that keeps the beers in columns instead of
+    one dict per beer, for large read-mostly catalogues.
+
+    Names and brewery UUIDs are interned, so repeated values are stored
+    once, and ABVs are packed in an array of doubles. Beers are looked up
+    through a UUID to row index. Searches use the brewery index and scan
+    the columns for the other filters, instead of keeping the (large)
+    ABV and name indexes of the dict store. Users are kept as dicts, like
+    in the dict store.
+
+    With a data directory, the database survives restarts: every write is
+    appended to a log, and the log is folded into a (binary) snapshot every
+    `snapshot_every` writes. On start, the snapshot is loaded and the log
+    replayed on top of it.
+
+    Args:
+        data_dir (str | None): The directory of the snapshot and log.
+            Defaults to None, to keep everything in memory only.
+        snapshot_every (int): The number of writes between snapshots.
+            Defaults to 10000.
+    """
+
+    def __init__(
+        self, data_dir: str | None = None, snapshot_every: int = 10000
+    ) -> None:
+        super().__init__()
+        self.snapshot_every = snapshot_every
+        self._uuids: list[str] = []
+        self._names: list[str] = []
+        self._brewery_uuids: list[str] = []
+        self._abvs = array("d")
+        self._rows: dict[str, int] = {}
+        # The (sorted) rows of the deleted beers, until they are compacted
+        self._deleted_rows: list[int] = []
+        self._keys = OrderedKeyIndex()
+        self._brewery_keys: dict[str, OrderedKeyIndex] = {}
+        self._loaded_brewery_rows: dict[str, array] = {}
+        self._brewery_aggregates = BreweryAggregates()
+        self._log: WriteLog | None = None
+        self._snapshot_task: asyncio.Task | None = None
+
+        if data_dir is None:
+            self._add_many(list(_dummy_db["beers"].values()))
+            return
+
+        os.makedirs(data_dir, exist_ok=True)
+        self._snapshot_path = os.path.join(data_dir, "snapshot.bin")
+        self._log = WriteLog(os.path.join(data_dir, "writes.log"))
+        # NOTE: Pause the garbage collector while millions of objects are
+        # created, and move them out of its way once they are loaded
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            if os.path.exists(self._snapshot_path):
+                self._load(load_snapshot(self._snapshot_path))
+            else:
+                self._add_many(list(_dummy_db["beers"].values()))
+            for entry in self._log.replay():
+                self._apply(entry)
+        finally:
+            if gc_enabled:
+                gc.enable()
+        gc.freeze()
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def _beer(self, row: int) -> dict[str, Any]:
+        return {
+            "uuid": self._uuids[row],
+            "name": self._names[row],
+            "brewery_uuid": self._brewery_uuids[row],
+            "abv": self._abvs[row],
+        }
+
+    def _live_row(self, offset: int) -> int:
+        """Get the row of the beer at an offset, skipping the rows of the
+        deleted beers."""
+        # NOTE: The row is the offset plus the deleted rows up to it
+        row = offset
+        while (next_row := offset + bisect_right(self._deleted_rows, row)) != row:
+            row = next_row
+        return row
+
+    def _add(self, beer: dict[str, Any]) -> None:
+        key = sys.intern(beer["uuid"])
+        brewery_uuid = sys.intern(beer["brewery_uuid"])
+        row = self._rows.get(key)
+        if row is None:
+            self._rows[key] = len(self._uuids)
+            self._uuids.append(key)
+            self._names.append(sys.intern(beer["name"]))
+            self._brewery_uuids.append(brewery_uuid)
+            self._abvs.append(beer["abv"])
+            self._keys.add(key)
+        else:
+            self._remove_brewery_key(self._brewery_uuids[row], key)
+            self._brewery_aggregates.remove(self._brewery_uuids[row], self._abvs[row])
+            self._names[row] = sys.intern(beer["name"])
+            self._brewery_uuids[row] = brewery_uuid
+            self._abvs[row] = beer["abv"]
+        self._brewery_index(brewery_uuid).add(key)
+        self._brewery_aggregates.add(brewery_uuid, beer["abv"])
+
+    def _add_many(self, beers: list[dict[str, Any]]) -> None:
+        """Add (or replace) many beers, sorting the new keys into the
+        indexes at once instead of one by one."""
+        start = len(self._uuids)
+        new_keys: list[str] = []
+        new_brewery_keys: dict[str, list[str]] = {}
+        for beer in {beer["uuid"]: beer for beer in beers}.values():
+            if beer["uuid"] in self._rows:
+                self._add(beer)
+                continue
+            key = sys.intern(beer["uuid"])
+            brewery_uuid = sys.intern(beer["brewery_uuid"])
+            self._rows[key] = len(self._uuids)
+            self._uuids.append(key)
+            self._names.append(sys.intern(beer["name"]))
+            self._brewery_uuids.append(brewery_uuid)
+            self._abvs.append(beer["abv"])
+            new_keys.append(key)
+            new_brewery_keys.setdefault(brewery_uuid, []).append(key)
+        self._keys.add_many(new_keys)
+        for brewery_uuid, keys in new_brewery_keys.items():
+            self._brewery_index(brewery_uuid).add_many(keys)
+        self._brewery_aggregates.add_many(
+            self._brewery_uuids[start:], self._abvs[start:]
+        )
+
+    def _brewery_index(self, brewery_uuid: str) -> OrderedKeyIndex:
+        """Get (or create) the UUID index of the beers of a brewery. The
+        indexes of a loaded snapshot are built on first use."""
+        rows = self._loaded_brewery_rows.pop(brewery_uuid, None)
+        if rows is not None:
+            self._brewery_keys[brewery_uuid] = OrderedKeyIndex.from_sorted(
+                list(map(self._uuids.__getitem__, rows))
+            )
+        return self._brewery_keys.setdefault(brewery_uuid, OrderedKeyIndex())
+
+    def _remove_brewery_key(self, brewery_uuid: str, key: str) -> None:
+        keys = self._brewery_index(brewery_uuid)
+        keys.remove(key)
+        if not len(keys):
+            del self._brewery_keys[brewery_uuid]
+
+    def _delete(self, key: str) -> None:
+        row = self._rows.pop(key)
+        self._keys.remove(key)
+        self._remove_brewery_key(self._brewery_uuids[row], key)
+        self._brewery_aggregates.remove(self._brewery_uuids[row], self._abvs[row])
+        insort(self._deleted_rows, row)
+        if len(self._deleted_rows) > len(self._rows):
+            self._compact()
+
+    def _compact(self) -> None:
+        """Drop the rows of deleted beers from the columns."""
+        # NOTE: The rows of the unused brewery indexes are about to change
+        for brewery_uuid in list(self._loaded_brewery_rows):
+            self._brewery_index(brewery_uuid)
+        rows = sorted(self._rows.values())
+        self._uuids = [self._uuids[row] for row in rows]
+        self._names = [self._names[row] for row in rows]
+        self._brewery_uuids = [self._brewery_uuids[row] for row in rows]
+        self._abvs = array("d", (self._abvs[row] for row in rows))
+        self._rows = {key: row for row, key in enumerate(self._uuids)}
+        self._deleted_rows = []
+
+    # Persistence
+
+    def _load(self, snapshot: Snapshot) -> None:
+        """Replace the contents of the database with a snapshot."""
+        # NOTE: Names are interned as they are added, not when loaded: they
+        # are nearly all unique, so it would slow down loading for little
+        self._uuids = snapshot.uuids
+        self._names = snapshot.names
+        self._brewery_uuids = snapshot.brewery_uuids
+        self._abvs = snapshot.abvs
+        self._rows = dict(zip(self._uuids, range(len(self._uuids))))
+        self._keys = OrderedKeyIndex.from_sorted(
+            list(map(self._uuids.__getitem__, snapshot.keys))
+        )
+        self._brewery_keys = {}
+        self._loaded_brewery_rows = snapshot.brewery_keys
+        # NOTE: A snapshot has no deleted rows, aggregate all of them at once
+        self._brewery_aggregates.rebuild(self._brewery_uuids, self._abvs)
+        _dummy_db["users"].clear()
+        _dummy_db["users"].update(snapshot.users)
+        self._key_indexes["users"] = OrderedKeyIndex(snapshot.users)
+
+    def _apply(self, entry: dict[str, Any]) -> None:
+        """Apply a write from the log (again)."""
+        if entry["operation"] == "create_beers":
+            self._add_many(entry["beers"])
+        elif entry["operation"] == "delete_beer":
+            if entry["uuid"] in self._rows:
+                self._delete(entry["uuid"])
+        elif entry["operation"] == "create_user":
+            _dummy_db["users"].setdefault(entry["user"]["username"], entry["user"])
+            self._key_indexes["users"].add(entry["user"]["username"])
+        elif entry["operation"] == "update_user_password":
+            user = _dummy_db["users"].get(entry["username"])
+            if user is not None:
+                user["hashed_password"] = entry["hashed_password"]
+
+    def _logged(self, operation: str, **data: Any) -> None:
+        """Log a write, and start a snapshot once enough writes are logged."""
+        if self._log is None:
+            return
+        self._log.append(operation, **data)
+        if self._log.entries >= self.snapshot_every and self._snapshot_task is None:
+            self._snapshot_task = asyncio.create_task(self.snapshot())
+
+    async def snapshot(self) -> None:
+        """Write a snapshot of the database and start a new log.
+
+        The contents are copied and the log rotated at once, so writes can
+        go on while the snapshot is written (in a thread).
+        """
+        if self._log is None:
+            return
+        if self._deleted_rows:
+            self._compact()
+        keys = self._keys.after(None, len(self._keys))
+        snapshot = Snapshot(
+            uuids=list(self._uuids),
+            names=list(self._names),
+            brewery_uuids=list(self._brewery_uuids),
+            abvs=array("d", self._abvs),
+            keys=array("I", map(self._rows.__getitem__, keys)),
+            brewery_keys={
+                **{
+                    brewery_uuid: array("I", rows)
+                    for brewery_uuid, rows in self._loaded_brewery_rows.items()
+                },
+                **{
+                    brewery_uuid: array(
+                        "I", map(self._rows.__getitem__, index.after(None, len(index)))
+                    )
+                    for brewery_uuid, index in self._brewery_keys.items()
+                },
+            },
+            users=dict(_dummy_db["users"]),
+        )
+        self._log.rotate()
+        try:
+            await asyncio.to_thread(write_snapshot, self._snapshot_path, snapshot)
+            self._log.drop_rotated()
+        finally:
+            self._snapshot_task = None
+
+    async def disconnect(self) -> None:
+        if self._log is None:
+            return
+        if self._snapshot_task is not None:
+            await self._snapshot_task
+        if self._log.entries:
+            await self.snapshot()
+        self._log.close()
+
+    # Beers
+
+    async def get_all_beers(
+        self, page: int = 0, limit: int = 100
+    ) -> list[dict[str, Any]]:
+        if not self._deleted_rows:
+            end = min(page * limit + limit, len(self._uuids))
+            return [self._beer(row) for row in range(page * limit, end)]
+        # NOTE: Skip the rows of deleted beers rather than compacting, which
+        # only pays off once they are many
+        beers: list[dict[str, Any]] = []
+        for row in range(self._live_row(page * limit), len(self._uuids)):
+            if len(beers) == limit:
+                break
+            if self._rows.get(self._uuids[row]) == row:
+                beers.append(self._beer(row))
+        return beers
+
+    async def get_beers_after(
+        self, key: str | None = None, limit: int = 100
+    ) -> list[dict[str, Any]]:
+        return [self._beer(self._rows[key]) for key in self._keys.after(key, limit)]
+
+    def _keys_after(self, brewery_uuid: str | None, key: str | None) -> Iterator[str]:
+        """Iterate over the (sorted) UUIDs after a UUID, of all beers or of
+        the beers of a brewery."""
+        if brewery_uuid is None:
+            while keys := self._keys.after(key, 1000):
+                yield from keys
+                key = keys[-1]
+            return
+        if (
+            brewery_uuid in self._brewery_keys
+            or brewery_uuid in self._loaded_brewery_rows
+        ):
+            brewery_keys = self._brewery_index(brewery_uuid)
+            yield from brewery_keys.after(key, len(brewery_keys))
+
+    async def search_beers(
+        self,
+        brewery_uuid: str | None = None,
+        min_abv: float | None = None,
+        max_abv: float | None = None,
+        name: str | None = None,
+        key: str | None = None,
+        limit: int = 100,
+    ) -> list[dict[str, Any]]:
+        name = name.lower() if name else None
+        beers = []
+        for beer_key in self._keys_after(brewery_uuid, key):
+            row = self._rows[beer_key]
+            abv = self._abvs[row]
+            if min_abv is not None and abv < min_abv:
+                continue
+            if max_abv is not None and abv > max_abv:
+                continue
+            if name is not None and name not in self._names[row].lower():
+                continue
+            beers.append(self._beer(row))
+            if len(beers) == limit:
+                break
+        return beers
+
+    async def get_beer_by_id(self, key: str) -> dict[str, Any] | None:
+        row = self._rows.get(key)
+        return self._beer(row) if row is not None else None
+
+    async def get_beers_by_ids(self, keys: list[str]) -> list[dict[str, Any]]:
+        rows = (self._rows.get(key) for key in dict.fromkeys(keys))
+        return [self._beer(row) for row in rows if row is not None]
+
+    async def create_beer(self, beer: dict[str, Any]) -> dict[str, Any]:
+        self._add(beer)
+        self._logged("create_beers", beers=[beer])
+        self.changes.publish("beers", beer["uuid"], "create")
+        return beer
+
+    async def create_beers(self, beers: list[dict[str, Any]]) -> list[dict[str, Any]]:
+        new_beers: dict[str, dict[str, Any]] = {}
+        for beer in beers:
+            if beer["uuid"] not in self._rows:
+                new_beers.setdefault(beer["uuid"], beer)
+        created = list(new_beers.values())
+        self._add_many(created)
+        if created:
+            self._logged("create_beers", beers=created)
+        for beer in created:
+            self.changes.publish("beers", beer["uuid"], "create")
+        return created
+
+    async def delete_beer_by_id(self, key: str) -> None:
+        self._delete(key)
+        self._logged("delete_beer", uuid=key)
+        self.changes.publish("beers", key, "delete")
+
+    # Users
+
+    async def create_user(self, user: UserInDB) -> User:
+        created_user = await super().create_user(user)
+        self._logged("create_user", user=_dummy_db["users"][user.username])
+        return created_user
+
+    async def update_user_password(self, key: str, hashed_password: str) -> None:
+        await super().update_user_password(key, hashed_password)
+        self._logged(
+            "update_user_password", username=key, hashed_password=hashed_password
+        )
@@ -2,7 +2,9 @@ from typing import Any
 
 from models.user import User, UserInDB
 
-from db.base import Database
+from db.aggregates import BreweryAggregates
+from db.base import Database, UserAlreadyExistsError
+from db.indexes import BeerSearchIndex, OrderedKeyIndex
 
 _dummy_db: dict[str, dict[str, Any]] = {
     "users": {
@@ -20,6 +22,18 @@ _dummy_db: dict[str, dict[str, Any]] = {
 
 
 class DummyUserDatabase(Database):
+    def __init__(self) -> None:
+        super().__init__()
+        self._key_indexes = {
+            collection: OrderedKeyIndex(records.keys())
+            for collection, records in _dummy_db.items()
+        }
+        self._beer_search_index = BeerSearchIndex(_dummy_db["beers"].values())
+        self._brewery_aggregates = BreweryAggregates(
+            [beer["brewery_uuid"] for beer in _dummy_db["beers"].values()],
+            [beer["abv"] for beer in _dummy_db["beers"].values()],
+        )
+
     async def connect(self) -> None:
         pass
 
@@ -32,6 +46,12 @@ class DummyUserDatabase(Database):
         all = list(_dummy_db[collection].values())
         return all[page * limit : page * limit + limit]
 
+    async def _get_after(
+        self, collection: str, key: str | None = None, limit: int = 100
+    ) -> list[dict[str, Any]]:
+        keys = self._key_indexes[collection].after(key, limit)
+        return [_dummy_db[collection][key] for key in keys]
+
     # Beers
 
     async def get_all_beers(
@@ -39,15 +59,75 @@ class DummyUserDatabase(Database):
     ) -> list[dict[str, Any]]:
         return await self._get_all("beers", page, limit)
 
+    async def get_beers_after(
+        self, key: str | None = None, limit: int = 100
+    ) -> list[dict[str, Any]]:
+        return await self._get_after("beers", key, limit)
+
+    async def search_beers(
+        self,
+        brewery_uuid: str | None = None,
+        min_abv: float | None = None,
+        max_abv: float | None = None,
+        name: str | None = None,
+        key: str | None = None,
+        limit: int = 100,
+    ) -> list[dict[str, Any]]:
+        if brewery_uuid is None and min_abv is None and max_abv is None and not name:
+            return await self.get_beers_after(key, limit)
+        keys = self._beer_search_index.search(
+            self._key_indexes["beers"],
+            brewery_uuid=brewery_uuid,
+            min_abv=min_abv,
+            max_abv=max_abv,
+            name=name or None,
+            key=key,
+            limit=limit,
+        )
+        return [_dummy_db["beers"][key] for key in keys]
+
+    async def get_brewery_aggregates(
+        self, brewery_uuid: str | None = None
+    ) -> list[dict[str, Any]]:
+        return self._brewery_aggregates.get(brewery_uuid)
+
     async def get_beer_by_id(self, key: str) -> dict[str, Any] | None:
         return _dummy_db["beers"].get(key, None)
 
+    async def get_beers_by_ids(self, keys: list[str]) -> list[dict[str, Any]]:
+        beers = _dummy_db["beers"]
+        return [beers[key] for key in dict.fromkeys(keys) if key in beers]
+
     async def create_beer(self, beer: dict[str, Any]) -> dict[str, Any]:
+        return self._create_beer(beer)
+
+    def _create_beer(self, beer: dict[str, Any]) -> dict[str, Any]:
+        existing_beer = _dummy_db["beers"].get(beer["uuid"])
+        if existing_beer is not None:
+            self._beer_search_index.remove(existing_beer)
+            self._brewery_aggregates.remove(
+                existing_beer["brewery_uuid"], existing_beer["abv"]
+            )
         _dummy_db["beers"][beer["uuid"]] = beer
+        self._key_indexes["beers"].add(beer["uuid"])
+        self._beer_search_index.add(beer)
+        self._brewery_aggregates.add(beer["brewery_uuid"], beer["abv"])
+        self.changes.publish("beers", beer["uuid"], "create")
         return beer
 
+    async def create_beers(self, beers: list[dict[str, Any]]) -> list[dict[str, Any]]:
+        created = []
+        for beer in beers:
+            if beer["uuid"] not in _dummy_db["beers"]:
+                created.append(self._create_beer(beer))
+        return created
+
     async def delete_beer_by_id(self, key: str) -> None:
-        del _dummy_db["beers"][key]
+        beer = _dummy_db["beers"].pop(key)
+        self._key_indexes["beers"].remove(key)
+        self._beer_search_index.remove(beer)
+        self._brewery_aggregates.remove(beer["brewery_uuid"], beer["abv"])
+        self.changes.publish("beers", key, "delete")
 
     # Users
 
@@ -56,12 +136,27 @@ class DummyUserDatabase(Database):
     ) -> list[dict[str, Any]]:
         return await self._get_all("users", page, limit)
 
+    async def get_users_after(
+        self, key: str | None = None, limit: int = 100
+    ) -> list[dict[str, Any]]:
+        return await self._get_after("users", key, limit)
+
     async def get_by_username(self, key: str) -> dict[str, Any] | None:
         return _dummy_db["users"].get(key, None)
 
     async def create_user(self, user: UserInDB) -> User:
-        existing_user = await self.get_by_username(user.username)
-        if existing_user is not None:
-            raise Exception("User already exists")
+        # NOTE: Check without awaiting, so no other task can create the same
+        # user in between
+        if user.username in _dummy_db["users"]:
+            raise UserAlreadyExistsError(user.username)
         _dummy_db["users"][user.username] = user.dict()
+        self._key_indexes["users"].add(user.username)
+        self.changes.publish("users", user.username, "create")
         return User(**user.dict())
+
+    async def update_user_password(self, key: str, hashed_password: str) -> None:
+        user = _dummy_db["users"].get(key)
+        if user is None:
+            return
+        user["hashed_password"] = hashed_password
+        self.changes.publish("users", key, "update")
@@ -0,0 +1,69 @@
+from dataclasses import dataclass
+from typing import Callable
+
+
+@dataclass(frozen=True)
+class ChangeEvent:
+    """A change to a record of a collection.
+
+    `operation` is "create", "update" or "delete", and `version` the
+    version of the collection after the change.
+    """
+
+    collection: str
+    key: str
+    operation: str
+    version: int
+
+
+class ChangeEvents:
+    """Tell subscribers (caches, ETag counters, indexes...) about the
+    changes made to a database.
+
+    Every change bumps the version of its collection. Subscribers are
+    called right after the change, in the order they subscribed.
+    """
+
+    def __init__(self) -> None:
+        self._versions: dict[str, int] = {}
+        self._subscribers: list[Callable[[ChangeEvent], None]] = []
+
+    def version(self, collection: str) -> int:
+        """Get the current version of a collection."""
+        return self._versions.get(collection, 0)
+
+    def subscribe(self, callback: Callable[[ChangeEvent], None]) -> None:
+        """Call a function with every change from now on.
+
+        Args:
+            callback (Callable[[ChangeEvent], None]): The function to call.
+        """
+        self._subscribers.append(callback)
+
+    def unsubscribe(self, callback: Callable[[ChangeEvent], None]) -> None:
+        """Stop calling a function with the changes (if it is subscribed).
+
+        Args:
+            callback (Callable[[ChangeEvent], None]): The function to stop
+                calling.
+        """
+        if callback in self._subscribers:
+            self._subscribers.remove(callback)
+
+    def publish(self, collection: str, key: str, operation: str) -> ChangeEvent:
+        """Record a change and tell the subscribers about it.
+
+        Args:
+            collection (str): The collection of the changed record.
+            key (str): The key of the changed record.
+            operation (str): What changed, "create", "update" or "delete".
+
+        Returns:
+            ChangeEvent: The published event.
+        """
+        version = self.version(collection) + 1
+        self._versions[collection] = version
+        event = ChangeEvent(collection, key, operation, version)
+        for callback in list(self._subscribers):
+            callback(event)
+        return event
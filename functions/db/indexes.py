@@ -0,0 +1,349 @@
+from bisect import bisect_left, bisect_right, insort
+from typing import Any, Hashable, Iterable, Iterator
+
+
+class OrderedKeyIndex:
+    """Keep the keys of a collection sorted, so pages can be fetched
+    after a given key at a cost that depends only on the page size.
+
+    Args:
+        keys (Iterable[str]): The initial keys of the collection.
+    """
+
+    def __init__(self, keys: Iterable[str] = ()) -> None:
+        self._keys = sorted(set(keys))
+        self._sorted = True
+
+    @classmethod
+    def from_sorted(cls, keys: list[str]) -> "OrderedKeyIndex":
+        """Create an index from keys that are already sorted and unique.
+
+        Args:
+            keys (list[str]): The sorted keys, used as is.
+        """
+        index = cls()
+        index._keys = keys
+        return index
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def _sort(self) -> None:
+        if not self._sorted:
+            self._keys.sort()
+            self._sorted = True
+
+    def add(self, key: str) -> None:
+        """Add a key to the index (if it isn't in the index yet).
+
+        Args:
+            key (str): The key to add.
+        """
+        self._sort()
+        position = bisect_left(self._keys, key)
+        if position == len(self._keys) or self._keys[position] != key:
+            self._keys.insert(position, key)
+
+    def add_many(self, keys: list[str]) -> None:
+        """Add many keys that aren't in the index yet. The keys are sorted
+        on the next use of the index, so adding many batches in a row
+        (like when loading) costs one sort.
+
+        Args:
+            keys (list[str]): The keys to add.
+        """
+        if keys:
+            self._keys.extend(keys)
+            self._sorted = False
+
+    def remove(self, key: str) -> None:
+        """Remove a key from the index (if it is in the index).
+
+        Args:
+            key (str): The key to remove.
+        """
+        self._sort()
+        position = bisect_left(self._keys, key)
+        if position < len(self._keys) and self._keys[position] == key:
+            del self._keys[position]
+
+    def after(self, key: str | None = None, limit: int = 100) -> list[str]:
+        """Get the keys that come after a key.
+
+        Args:
+            key (str | None): The key to start after. Defaults to None, in
+                which case the first keys are returned.
+            limit (int): The maximum number of keys. Defaults to 100.
+
+        Returns:
+            list[str]: The (at most `limit`) keys after `key`.
+        """
+        self._sort()
+        start = 0 if key is None else bisect_right(self._keys, key)
+        return self._keys[start : start + limit]
+
+    def iter_after(
+        self, key: str | None = None, batch_size: int = 1000
+    ) -> Iterator[str]:
+        """Iterate over the keys that come after a key, fetching them in
+        batches (so the index can change between two batches).
+
+        Args:
+            key (str | None): The key to start after. Defaults to None, in
+                which case all keys are iterated over.
+            batch_size (int): The number of keys per batch. Defaults to
+                1000.
+
+        Yields:
+            str: The keys after `key`, in order.
+        """
+        while batch := self.after(key, batch_size):
+            yield from batch
+            key = batch[-1]
+
+
+class HashIndex:
+    """Map the values of a field to the (sorted) keys of the records that
+    have that value."""
+
+    def __init__(self) -> None:
+        self._keys: dict[Hashable, OrderedKeyIndex] = {}
+
+    def add(self, value: Hashable, key: str) -> None:
+        self._keys.setdefault(value, OrderedKeyIndex()).add(key)
+
+    def remove(self, value: Hashable, key: str) -> None:
+        keys = self._keys.get(value)
+        if keys is not None:
+            keys.remove(key)
+            if not len(keys):
+                del self._keys[value]
+
+    def get(self, value: Hashable) -> OrderedKeyIndex:
+        """Get the keys of the records with a value."""
+        return self._keys.get(value, OrderedKeyIndex())
+
+
+class SortedIndex:
+    """Keep the (value, key) pairs of a numeric field sorted, to find the
+    records in a range of values."""
+
+    def __init__(self) -> None:
+        self._entries: list[tuple[float, str]] = []
+
+    def add(self, value: float, key: str) -> None:
+        insort(self._entries, (value, key))
+
+    def remove(self, value: float, key: str) -> None:
+        position = bisect_left(self._entries, (value, key))
+        if position < len(self._entries) and self._entries[position] == (value, key):
+            del self._entries[position]
+
+    def _bounds(self, minimum: float | None, maximum: float | None) -> tuple[int, int]:
+        start = 0 if minimum is None else bisect_left(self._entries, (minimum, ""))
+        end = (
+            len(self._entries)
+            if maximum is None
+            else bisect_right(self._entries, (maximum, "\U0010ffff"))
+        )
+        return start, end
+
+    def count(self, minimum: float | None = None, maximum: float | None = None) -> int:
+        """Count the records with a value in a (closed) range."""
+        start, end = self._bounds(minimum, maximum)
+        return max(0, end - start)
+
+    def range(
+        self, minimum: float | None = None, maximum: float | None = None
+    ) -> set[str]:
+        """Get the keys of the records with a value in a (closed) range.
+
+        Args:
+            minimum (float | None): The lowest value. Defaults to None,
+                for no lower bound.
+            maximum (float | None): The highest value. Defaults to None,
+                for no upper bound.
+
+        Returns:
+            set[str]: The keys of the records in the range.
+        """
+        start, end = self._bounds(minimum, maximum)
+        return {key for _, key in self._entries[start:end]}
+
+
+class NGramIndex:
+    """Index the (case insensitive) 1, 2 and 3-grams of a text field, to
+    find the records that contain a substring without scanning them all.
+
+    Args:
+        size (int): The longest n-gram to index. Defaults to 3.
+    """
+
+    def __init__(self, size: int = 3) -> None:
+        self.size = size
+        self._keys: dict[str, set[str]] = {}
+        self._texts: dict[str, str] = {}
+
+    def _ngrams(self, text: str, size: int) -> set[str]:
+        return {text[i : i + size] for i in range(len(text) - size + 1)}
+
+    def add(self, text: str, key: str) -> None:
+        text = text.lower()
+        self._texts[key] = text
+        for size in range(1, self.size + 1):
+            for ngram in self._ngrams(text, size):
+                self._keys.setdefault(ngram, set()).add(key)
+
+    def remove(self, text: str, key: str) -> None:
+        text = text.lower()
+        self._texts.pop(key, None)
+        for size in range(1, self.size + 1):
+            for ngram in self._ngrams(text, size):
+                keys = self._keys.get(ngram)
+                if keys is not None:
+                    keys.discard(key)
+                    if not keys:
+                        del self._keys[ngram]
+
+    def estimate(self, substring: str) -> int:
+        """Get the number of records that contain the rarest n-gram of a
+        substring, an upper bound of the records that contain it."""
+        substring = substring.lower()
+        ngrams = self._ngrams(substring, min(self.size, len(substring)))
+        if not ngrams:
+            return len(self._texts)
+        return min(len(self._keys.get(ngram, ())) for ngram in ngrams)
+
+    def contains(self, key: str, substring: str) -> bool:
+        """Check if the record of a key contains a (case insensitive)
+        substring."""
+        return substring.lower() in self._texts.get(key, "")
+
+    def search(self, substring: str) -> set[str]:
+        """Get the keys of the records that contain a substring.
+
+        Args:
+            substring (str): The (case insensitive) substring.
+
+        Returns:
+            set[str]: The keys of the records that contain the substring.
+        """
+        substring = substring.lower()
+        ngrams = sorted(
+            self._ngrams(substring, min(self.size, len(substring))),
+            key=lambda ngram: len(self._keys.get(ngram, ())),
+        )
+        if not ngrams:
+            return set(self._texts)
+        keys = set(self._keys.get(ngrams[0], ()))
+        for ngram in ngrams[1:]:
+            if not keys:
+                break
+            keys &= self._keys.get(ngram, set())
+        if len(substring) <= self.size:
+            return keys
+        return {key for key in keys if substring in self._texts[key]}
+
+
+class BeerSearchIndex:
+    """The secondary indexes to search beers by brewery, ABV and name."""
+
+    def __init__(self, beers: Iterable[dict[str, Any]] = ()) -> None:
+        self.brewery_uuid = HashIndex()
+        self.abv = SortedIndex()
+        self.name = NGramIndex()
+        self._beers: dict[str, dict[str, Any]] = {}
+        for beer in beers:
+            self.add(beer)
+
+    def add(self, beer: dict[str, Any]) -> None:
+        self.brewery_uuid.add(beer["brewery_uuid"], beer["uuid"])
+        self.abv.add(beer["abv"], beer["uuid"])
+        self.name.add(beer["name"], beer["uuid"])
+        self._beers[beer["uuid"]] = beer
+
+    def remove(self, beer: dict[str, Any]) -> None:
+        self.brewery_uuid.remove(beer["brewery_uuid"], beer["uuid"])
+        self.abv.remove(beer["abv"], beer["uuid"])
+        self.name.remove(beer["name"], beer["uuid"])
+        self._beers.pop(beer["uuid"], None)
+
+    def _matches(
+        self,
+        key: str,
+        brewery_uuid: str | None,
+        min_abv: float | None,
+        max_abv: float | None,
+        name: str | None,
+    ) -> bool:
+        beer = self._beers[key]
+        return (
+            (brewery_uuid is None or beer["brewery_uuid"] == brewery_uuid)
+            and (min_abv is None or beer["abv"] >= min_abv)
+            and (max_abv is None or beer["abv"] <= max_abv)
+            and (name is None or self.name.contains(key, name))
+        )
+
+    def search(
+        self,
+        keys: OrderedKeyIndex,
+        brewery_uuid: str | None = None,
+        min_abv: float | None = None,
+        max_abv: float | None = None,
+        name: str | None = None,
+        key: str | None = None,
+        limit: int = 100,
+    ) -> list[str]:
+        """Get the keys of a page of the beers that match all given filters,
+        in order.
+
+        The keys (of all beers, or of the brewery) are walked in order from
+        the cursor, checking the other filters beer by beer, until the page
+        is full. When the ABV or name filter matches so few beers that
+        sorting them costs less than the walk, those are sorted instead.
+
+        Args:
+            keys (OrderedKeyIndex): The keys of all beers.
+            brewery_uuid (str | None): The UUID of the brewery.
+            min_abv (float | None): The lowest ABV.
+            max_abv (float | None): The highest ABV.
+            name (str | None): A (case insensitive) part of the name.
+            key (str | None): The key to start after.
+            limit (int): The maximum number of keys. Defaults to 100.
+
+        Returns:
+            list[str]: The (at most `limit`) keys of the matching beers.
+        """
+        if brewery_uuid is not None:
+            keys = self.brewery_uuid.get(brewery_uuid)
+        candidates: list[tuple[int, str]] = []
+        if min_abv is not None or max_abv is not None:
+            candidates.append((self.abv.count(min_abv, max_abv), "abv"))
+        if name is not None:
+            candidates.append((self.name.estimate(name), "name"))
+        matches = min([len(keys), *(count for count, _ in candidates)])
+        # The matches are spread over the keys, a page walks about this many
+        walk = (
+            len(keys) if not matches else min(len(keys), limit * len(keys) // matches)
+        )
+
+        ordered: Iterator[str]
+        if candidates and min(candidates)[0] < walk:
+            if min(candidates)[1] == "abv":
+                subset = self.abv.range(min_abv, max_abv)
+            else:
+                assert name is not None
+                subset = self.name.search(name)
+            sorted_keys = sorted(subset)
+            start = 0 if key is None else bisect_right(sorted_keys, key)
+            ordered = iter(sorted_keys[start:])
+        else:
+            ordered = keys.iter_after(key)
+
+        page: list[str] = []
+        for beer_key in ordered:
+            if self._matches(beer_key, brewery_uuid, min_abv, max_abv, name):
+                page.append(beer_key)
+                if len(page) == limit:
+                    break
+        return page
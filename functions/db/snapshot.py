@@ -0,0 +1,234 @@
+import json
+import mmap
+import os
+import struct
+from array import array
+from dataclasses import dataclass, field
+from itertools import accumulate
+from typing import IO, Any, Iterator
+
+# The header of a snapshot: the magic bytes, the number of beers and
+# breweries, and the sizes (in bytes) of the UUID, name, brewery UUID and
+# user blobs
+_header = struct.Struct("<8sQQQQQQ")
+_magic = b"BEERCOL2"
+
+# Strings are joined by this separator, so they can be split in one go
+_separator = "\0"
+
+
+@dataclass
+class Snapshot:
+    """The beer columns and users of an in-process database.
+
+    `keys` lists the rows in the order of their UUIDs and `brewery_keys`
+    the rows of every brewery in that order, so loading doesn't have to
+    sort them again.
+    """
+
+    uuids: list[str] = field(default_factory=list)
+    names: list[str] = field(default_factory=list)
+    brewery_uuids: list[str] = field(default_factory=list)
+    abvs: array = field(default_factory=lambda: array("d"))
+    keys: array = field(default_factory=lambda: array("I"))
+    brewery_keys: dict[str, array] = field(default_factory=dict)
+    users: dict[str, dict[str, Any]] = field(default_factory=dict)
+
+
+def _join(strings: list[str]) -> bytes:
+    return _separator.join(strings).encode()
+
+
+def _split(blob: str, lengths: array) -> list[str]:
+    strings = blob.split(_separator)
+    if len(strings) == len(lengths) or not lengths and strings == [""]:
+        return strings if lengths else []
+    # Some strings contain the separator, fall back to their lengths
+    ends = list(accumulate(length + 1 for length in lengths))
+    starts = [0, *ends[:-1]]
+    return [blob[start : end - 1] for start, end in zip(starts, ends)]
+
+
+def write_snapshot(path: str, snapshot: Snapshot) -> None:
+    """Write a snapshot to a file, atomically.
+
+    Every string column is stored as one UTF-8 blob plus the length of
+    every string, and the brewery UUIDs as a table of unique UUIDs plus an
+    index into it per beer, so loading takes a few bulk copies.
+
+    Args:
+        path (str): The path of the snapshot file.
+        snapshot (Snapshot): The snapshot to write.
+    """
+    breweries = {
+        brewery_uuid: index for index, brewery_uuid in enumerate(snapshot.brewery_keys)
+    }
+    brewery_rows = array("I", map(breweries.__getitem__, snapshot.brewery_uuids))
+    blobs = [
+        _join(snapshot.uuids),
+        _join(snapshot.names),
+        _join(list(breweries)),
+        json.dumps(snapshot.users).encode(),
+    ]
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, "wb") as file:
+        file.write(
+            _header.pack(_magic, len(snapshot.uuids), len(breweries), *map(len, blobs))
+        )
+        snapshot.abvs.tofile(file)
+        snapshot.keys.tofile(file)
+        brewery_rows.tofile(file)
+        array("I", map(len, snapshot.brewery_keys.values())).tofile(file)
+        for rows in snapshot.brewery_keys.values():
+            rows.tofile(file)
+        for strings in (snapshot.uuids, snapshot.names, breweries):
+            array("I", map(len, strings)).tofile(file)
+        for blob in blobs:
+            file.write(blob)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temporary_path, path)
+
+
+def load_snapshot(path: str) -> Snapshot:
+    """Load a snapshot from a (memory-mapped) file.
+
+    Args:
+        path (str): The path of the snapshot file.
+
+    Raises:
+        ValueError: Raised if the file isn't a snapshot.
+
+    Returns:
+        Snapshot: The loaded snapshot.
+    """
+    with open(path, "rb") as file, mmap.mmap(
+        file.fileno(), 0, access=mmap.ACCESS_READ
+    ) as data:
+        magic, count, brewery_count, *blob_sizes = _header.unpack_from(data)
+        if magic != _magic:
+            raise ValueError(f"{path} is not a snapshot")
+        offset = _header.size
+
+        def read(typecode: str, length: int) -> array:
+            nonlocal offset
+            values = array(typecode)
+            size = values.itemsize * length
+            values.frombytes(data[offset : offset + size])
+            offset += size
+            return values
+
+        abvs = read("d", count)
+        keys = read("I", count)
+        brewery_rows = read("I", count)
+        brewery_counts = read("I", brewery_count)
+        brewery_keys = [read("I", brewery_count) for brewery_count in brewery_counts]
+        uuid_lengths = read("I", count)
+        name_lengths = read("I", count)
+        brewery_lengths = read("I", brewery_count)
+        blobs = []
+        for size in blob_sizes:
+            blobs.append(data[offset : offset + size].decode())
+            offset += size
+
+    breweries = _split(blobs[2], brewery_lengths)
+    return Snapshot(
+        uuids=_split(blobs[0], uuid_lengths),
+        names=_split(blobs[1], name_lengths),
+        brewery_uuids=list(map(breweries.__getitem__, brewery_rows)),
+        abvs=abvs,
+        keys=keys,
+        brewery_keys=dict(zip(breweries, brewery_keys)),
+        users=json.loads(blobs[3]),
+    )
+
+
+def _sync(file: IO[str]) -> None:
+    file.flush()
+    os.fsync(file.fileno())
+
+
+def _ends_with_newline(path: str) -> bool:
+    with open(path, "rb") as file:
+        file.seek(-1, os.SEEK_END)
+        return file.read(1) == b"\n"
+
+
+class WriteLog:
+    """An append-only log of the writes made since the last snapshot, one
+    JSON object per line.
+
+    While a snapshot is written, the log is rotated: the writes it covers
+    move to `<path>.old`, which is dropped once the snapshot is safely
+    written.
+
+    Every write is flushed to the OS, so it survives the process crashing,
+    but the log is only synced to disk when it is rotated or closed: a
+    machine crash loses the writes logged since the last snapshot started.
+
+    Args:
+        path (str): The path of the log file.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.rotated_path = f"{path}.old"
+        self.entries = 0
+        self._file = open(path, "a", encoding="utf-8")
+        # NOTE: End a line torn by a crash, so the next write isn't lost too
+        if self._file.tell() and not _ends_with_newline(path):
+            self._file.write("\n")
+
+    def append(self, operation: str, **data: Any) -> None:
+        """Append a write to the log (and flush it to the OS)."""
+        self._file.write(json.dumps({"operation": operation, **data}) + "\n")
+        self._file.flush()
+        self.entries += 1
+
+    def replay(self) -> Iterator[dict[str, Any]]:
+        """Iterate over the logged writes (including those of a snapshot
+        that didn't finish), skipping torn lines."""
+        for path in (self.rotated_path, self.path):
+            if not os.path.exists(path):
+                continue
+            with open(path, encoding="utf-8") as file:
+                for line in file:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    self.entries += 1
+                    yield entry
+
+    def rotate(self) -> None:
+        """Move the logged writes aside and start an empty log.
+
+        If an earlier snapshot failed, its writes are kept and the new
+        writes are added to them. Either way, they are synced to disk.
+        """
+        _sync(self._file)
+        self._file.close()
+        if os.path.exists(self.rotated_path):
+            with open(self.path, encoding="utf-8") as source, open(
+                self.rotated_path, "a", encoding="utf-8"
+            ) as target:
+                target.write(source.read())
+                _sync(target)
+            os.remove(self.path)
+        else:
+            os.replace(self.path, self.rotated_path)
+        self._file = open(self.path, "a", encoding="utf-8")
+        self.entries = 0
+
+    def drop_rotated(self) -> None:
+        """Remove the writes that were moved aside, once a snapshot that
+        covers them is written."""
+        if os.path.exists(self.rotated_path):
+            os.remove(self.rotated_path)
+
+    def close(self) -> None:
+        """Sync the log to disk and close it."""
+        if self._file.closed:
+            return
+        _sync(self._file)
+        self._file.close()
@@ -0,0 +1,537 @@
+import asyncio
+import json
+import re
+import sqlite3
+import time
+from typing import Any, Callable, TypeVar
+
+from models.user import User, UserInDB
+
+from db.base import Database, UserAlreadyExistsError
+
+T = TypeVar("T")
+
+# NOTE: The primary keys double as the (unique) indexes on username and uuid
+_schema = """
+CREATE TABLE IF NOT EXISTS users (
+    username TEXT PRIMARY KEY,
+    full_name TEXT,
+    profile_picture_url TEXT,
+    email TEXT NOT NULL,
+    disabled INTEGER NOT NULL DEFAULT 0,
+    email_verified INTEGER NOT NULL DEFAULT 0,
+    hashed_password TEXT,
+    is_admin INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS beers (
+    uuid TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    brewery_uuid TEXT NOT NULL,
+    abv REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS beers_brewery_uuid ON beers (brewery_uuid, uuid);
+CREATE INDEX IF NOT EXISTS beers_abv ON beers (abv);
+"""
+
+# The versions of the collections, counted by triggers, so every process that
+# shares the file derives the same ETags. The epoch keeps the versions of a
+# recreated file apart from those of the old one
+_versions_schema = """
+CREATE TABLE IF NOT EXISTS collection_versions (
+    collection TEXT PRIMARY KEY,
+    epoch TEXT NOT NULL,
+    version INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO collection_versions (collection, epoch, version)
+VALUES ('beers', lower(hex(randomblob(8))), 0);
+CREATE TRIGGER IF NOT EXISTS beers_version_insert AFTER INSERT ON beers BEGIN
+    UPDATE collection_versions SET version = version + 1 WHERE collection = 'beers';
+END;
+CREATE TRIGGER IF NOT EXISTS beers_version_delete AFTER DELETE ON beers BEGIN
+    UPDATE collection_versions SET version = version + 1 WHERE collection = 'beers';
+END;
+"""
+
+# A log of the changes to the users, kept by triggers, so every process that
+# shares the file can invalidate what it cached of them. Beers don't need it,
+# their ETags are read from the versions above
+_changes_schema = """
+CREATE TABLE IF NOT EXISTS changes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    collection TEXT NOT NULL,
+    key TEXT NOT NULL,
+    operation TEXT NOT NULL,
+    changed_at REAL NOT NULL DEFAULT (julianday('now'))
+);
+CREATE TRIGGER IF NOT EXISTS users_change_insert AFTER INSERT ON users BEGIN
+    INSERT INTO changes (collection, key, operation)
+    VALUES ('users', new.username, 'create');
+END;
+CREATE TRIGGER IF NOT EXISTS users_change_update AFTER UPDATE ON users BEGIN
+    INSERT INTO changes (collection, key, operation)
+    VALUES ('users', new.username, 'update');
+END;
+CREATE TRIGGER IF NOT EXISTS users_change_delete AFTER DELETE ON users BEGIN
+    INSERT INTO changes (collection, key, operation)
+    VALUES ('users', old.username, 'delete');
+END;
+"""
+
+# A trigram index on the beer names, kept up to date by triggers. This needs
+# SQLite 3.34+ with FTS5, without it name searches fall back to LIKE
+_name_index_schema = """
+CREATE VIRTUAL TABLE beer_names USING fts5(uuid UNINDEXED, name, tokenize='trigram');
+INSERT INTO beer_names (uuid, name) SELECT uuid, name FROM beers;
+CREATE TRIGGER beer_names_insert AFTER INSERT ON beers BEGIN
+    INSERT INTO beer_names (uuid, name) VALUES (new.uuid, new.name);
+END;
+CREATE TRIGGER beer_names_delete AFTER DELETE ON beers BEGIN
+    DELETE FROM beer_names WHERE uuid = old.uuid;
+END;
+"""
+
+# The number of beers and the ABV sum, lowest and highest ABV of every
+# brewery, kept up to date by triggers. Deleting the beer with the lowest (or
+# highest) ABV looks the next one up in the (brewery, ABV) index. Created
+# from the beers when missing
+_aggregates_schema = """
+CREATE INDEX beers_brewery_abv ON beers (brewery_uuid, abv);
+CREATE TABLE brewery_aggregates (
+    brewery_uuid TEXT PRIMARY KEY,
+    beer_count INTEGER NOT NULL,
+    abv_sum REAL NOT NULL,
+    min_abv REAL NOT NULL,
+    max_abv REAL NOT NULL
+);
+INSERT INTO brewery_aggregates
+SELECT brewery_uuid, count(*), sum(abv), min(abv), max(abv)
+FROM beers GROUP BY brewery_uuid;
+CREATE TRIGGER brewery_aggregates_insert AFTER INSERT ON beers BEGIN
+    INSERT INTO brewery_aggregates
+    VALUES (new.brewery_uuid, 1, new.abv, new.abv, new.abv)
+    ON CONFLICT (brewery_uuid) DO UPDATE SET
+        beer_count = beer_count + 1,
+        abv_sum = abv_sum + excluded.abv_sum,
+        min_abv = min(min_abv, excluded.min_abv),
+        max_abv = max(max_abv, excluded.max_abv);
+END;
+CREATE TRIGGER brewery_aggregates_delete AFTER DELETE ON beers BEGIN
+    DELETE FROM brewery_aggregates
+    WHERE brewery_uuid = old.brewery_uuid AND beer_count = 1;
+    UPDATE brewery_aggregates SET
+        beer_count = beer_count - 1,
+        abv_sum = abv_sum - old.abv,
+        min_abv = CASE WHEN old.abv > min_abv THEN min_abv ELSE (
+            SELECT min(abv) FROM beers WHERE brewery_uuid = old.brewery_uuid
+        ) END,
+        max_abv = CASE WHEN old.abv < max_abv THEN max_abv ELSE (
+            SELECT max(abv) FROM beers WHERE brewery_uuid = old.brewery_uuid
+        ) END
+    WHERE brewery_uuid = old.brewery_uuid;
+END;
+"""
+
+# The user columns that hold booleans (SQLite stores them as integers)
+_user_flags = ("disabled", "email_verified", "is_admin")
+
+
+def _user_from_row(row: sqlite3.Row) -> dict[str, Any]:
+    user = dict(row)
+    for flag in _user_flags:
+        user[flag] = bool(user[flag])
+    return user
+
+
+class SQLiteDatabase(Database):
+    """A database backed by a local SQLite file.
+
+    Blocking SQLite calls run in threads, on a bounded pool of
+    connections. The statements are constant, so every connection
+    compiles them once and reuses them from its statement cache.
+
+    Several processes can share the file (in WAL mode). The versions of
+    the collections are kept in the file, and with a `watch_interval`
+    the changes to the users made by the other processes are published
+    to `changes` too.
+
+    Args:
+        path (str): The path of the database file.
+        pool_size (int): The number of connections in the pool.
+            Defaults to 4.
+        watch_interval (float | None): The interval (in seconds) between
+            two reads of the changes made by other processes. Defaults to
+            None, to not read them.
+        changes_retention (float): How long (in seconds) to keep the log
+            of changes. Defaults to an hour.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        pool_size: int = 4,
+        watch_interval: float | None = None,
+        changes_retention: float = 3600,
+    ) -> None:
+        super().__init__()
+        self.path = path
+        self.pool_size = pool_size
+        self.watch_interval = watch_interval
+        self.changes_retention = changes_retention
+        self._pool: asyncio.Queue[sqlite3.Connection] | None = None
+        self._connections: list[sqlite3.Connection] = []
+        self._connect_lock = asyncio.Lock()
+        self._has_name_index = False
+        self._last_change = 0
+        self._watch_task: asyncio.Task | None = None
+
+    def _open_connection(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(
+            self.path, check_same_thread=False, cached_statements=64
+        )
+        connection.row_factory = sqlite3.Row
+        connection.execute("PRAGMA busy_timeout=5000")
+        connection.execute("PRAGMA journal_mode=WAL")
+        return connection
+
+    async def connect(self) -> None:
+        async with self._connect_lock:
+            if self._pool is not None:
+                return
+            pool: asyncio.Queue[sqlite3.Connection] = asyncio.Queue()
+            for _ in range(self.pool_size):
+                connection = await asyncio.to_thread(self._open_connection)
+                self._connections.append(connection)
+                pool.put_nowait(connection)
+            await asyncio.to_thread(self._create_schema, self._connections[0])
+            self._pool = pool
+            if self.watch_interval is not None:
+                self._watch_task = asyncio.create_task(self._watch())
+
+    def _create_schema(self, connection: sqlite3.Connection) -> None:
+        # NOTE: Take the write lock up front, workers starting together
+        # create the schema one after the other
+        connection.executescript(
+            f"BEGIN IMMEDIATE; {_schema}{_versions_schema}{_changes_schema} COMMIT;"
+        )
+        if not self._exists(connection, "beer_names"):
+            try:
+                connection.executescript(
+                    f"BEGIN IMMEDIATE; {_name_index_schema} COMMIT;"
+                )
+            except sqlite3.OperationalError:
+                # NOTE: No FTS5, or another worker created it first
+                connection.rollback()
+        self._has_name_index = self._exists(connection, "beer_names")
+        if not self._exists(connection, "brewery_aggregates"):
+            try:
+                connection.executescript(
+                    f"BEGIN IMMEDIATE; {_aggregates_schema} COMMIT;"
+                )
+            except sqlite3.OperationalError:
+                # NOTE: Another worker created them first
+                connection.rollback()
+        self._prune_changes(connection)
+        # Only the changes from now on can invalidate what this process reads
+        self._last_change = connection.execute(
+            "SELECT coalesce(max(id), 0) FROM changes"
+        ).fetchone()[0]
+
+    def _exists(self, connection: sqlite3.Connection, name: str) -> bool:
+        return (
+            connection.execute(
+                "SELECT 1 FROM sqlite_master WHERE name = ?", (name,)
+            ).fetchone()
+            is not None
+        )
+
+    def _prune_changes(self, connection: sqlite3.Connection) -> None:
+        with connection:
+            connection.execute(
+                "DELETE FROM changes WHERE changed_at < julianday('now') - ?",
+                (self.changes_retention / 86400,),
+            )
+
+    async def _watch(self) -> None:
+        assert self.watch_interval is not None
+        pruned_at = time.monotonic()
+        while True:
+            await asyncio.sleep(self.watch_interval)
+            try:
+                await self.publish_changes()
+                if time.monotonic() - pruned_at > self.changes_retention:
+                    await self._run(self._prune_changes)
+                    pruned_at = time.monotonic()
+            except sqlite3.Error:
+                # NOTE: The changes stay in the log, try again next time
+                continue
+
+    async def publish_changes(self) -> int:
+        """Publish the changes logged since the last call (or since
+        connecting) to `changes`.
+
+        The changes made by this process come back through the log too, so
+        they are published twice. The subscribers only invalidate what
+        they hold, so that's harmless.
+
+        Returns:
+            int: The number of changes published.
+        """
+        rows = await self._fetch_all(
+            "SELECT id, collection, key, operation FROM changes "
+            "WHERE id > ? ORDER BY id",
+            (self._last_change,),
+        )
+        for row in rows:
+            self.changes.publish(row["collection"], row["key"], row["operation"])
+        if rows:
+            self._last_change = rows[-1]["id"]
+        return len(rows)
+
+    async def disconnect(self) -> None:
+        if self._watch_task is not None:
+            self._watch_task.cancel()
+            self._watch_task = None
+        async with self._connect_lock:
+            for connection in self._connections:
+                await asyncio.to_thread(connection.close)
+            self._connections.clear()
+            self._pool = None
+
+    async def _run(self, func: Callable[[sqlite3.Connection], T]) -> T:
+        # Connect on first use, for hosts that don't run startup events
+        if self._pool is None:
+            await self.connect()
+        pool = self._pool
+        assert pool is not None
+        connection = await pool.get()
+        work = asyncio.ensure_future(asyncio.to_thread(func, connection))
+        # NOTE: Return the connection once the thread is done with it, not
+        # when the caller stops waiting (a cancelled call keeps running)
+        work.add_done_callback(lambda _: pool.put_nowait(connection))
+        return await asyncio.shield(work)
+
+    async def _fetch_all(
+        self, query: str, parameters: tuple[Any, ...]
+    ) -> list[sqlite3.Row]:
+        return await self._run(
+            lambda connection: connection.execute(query, parameters).fetchall()
+        )
+
+    async def _fetch_one(
+        self, query: str, parameters: tuple[Any, ...]
+    ) -> sqlite3.Row | None:
+        return await self._run(
+            lambda connection: connection.execute(query, parameters).fetchone()
+        )
+
+    async def _write(self, query: str, parameters: tuple[Any, ...]) -> int:
+        def write(connection: sqlite3.Connection) -> int:
+            with connection:
+                return connection.execute(query, parameters).rowcount
+
+        return await self._run(write)
+
+    # Beers
+
+    async def get_all_beers(
+        self, page: int = 0, limit: int = 100
+    ) -> list[dict[str, Any]]:
+        rows = await self._fetch_all(
+            "SELECT uuid, name, brewery_uuid, abv FROM beers "
+            "ORDER BY rowid LIMIT ? OFFSET ?",
+            (limit, page * limit),
+        )
+        return [dict(row) for row in rows]
+
+    async def get_beers_after(
+        self, key: str | None = None, limit: int = 100
+    ) -> list[dict[str, Any]]:
+        rows = await self._fetch_all(
+            "SELECT uuid, name, brewery_uuid, abv FROM beers "
+            "WHERE uuid > ? ORDER BY uuid LIMIT ?",
+            (key or "", limit),
+        )
+        return [dict(row) for row in rows]
+
+    async def search_beers(
+        self,
+        brewery_uuid: str | None = None,
+        min_abv: float | None = None,
+        max_abv: float | None = None,
+        name: str | None = None,
+        key: str | None = None,
+        limit: int = 100,
+    ) -> list[dict[str, Any]]:
+        conditions = ["uuid > ?"]
+        parameters: list[Any] = [key or ""]
+        if brewery_uuid is not None:
+            conditions.append("brewery_uuid = ?")
+            parameters.append(brewery_uuid)
+        if min_abv is not None:
+            conditions.append("abv >= ?")
+            parameters.append(min_abv)
+        if max_abv is not None:
+            conditions.append("abv <= ?")
+            parameters.append(max_abv)
+        if name and self._has_name_index and len(name) >= 3:
+            conditions.append(
+                "uuid IN (SELECT uuid FROM beer_names WHERE name MATCH ?)"
+            )
+            parameters.append('"' + name.replace('"', '""') + '"')
+        elif name:
+            conditions.append("name LIKE ? ESCAPE '\\'")
+            escaped_name = re.sub(r"([%_\\])", r"\\\1", name)
+            parameters.append(f"%{escaped_name}%")
+        rows = await self._fetch_all(
+            "SELECT uuid, name, brewery_uuid, abv FROM beers "
+            f"WHERE {' AND '.join(conditions)} ORDER BY uuid LIMIT ?",
+            (*parameters, limit),
+        )
+        return [dict(row) for row in rows]
+
+    async def get_brewery_aggregates(
+        self, brewery_uuid: str | None = None
+    ) -> list[dict[str, Any]]:
+        query = (
+            "SELECT brewery_uuid, beer_count, abv_sum / beer_count AS average_abv, "
+            "min_abv, max_abv FROM brewery_aggregates"
+        )
+        if brewery_uuid is None:
+            rows = await self._fetch_all(f"{query} ORDER BY brewery_uuid", ())
+        else:
+            rows = await self._fetch_all(
+                f"{query} WHERE brewery_uuid = ?", (brewery_uuid,)
+            )
+        return [dict(row) for row in rows]
+
+    async def get_beer_by_id(self, key: str) -> dict[str, Any] | None:
+        row = await self._fetch_one(
+            "SELECT uuid, name, brewery_uuid, abv FROM beers WHERE uuid = ?", (key,)
+        )
+        return dict(row) if row is not None else None
+
+    async def get_beers_by_ids(self, keys: list[str]) -> list[dict[str, Any]]:
+        # NOTE: Pass the keys as one JSON array, so the statement is the same
+        # for any number of keys
+        rows = await self._fetch_all(
+            "SELECT uuid, name, brewery_uuid, abv FROM beers "
+            "WHERE uuid IN (SELECT value FROM json_each(?))",
+            (json.dumps(keys),),
+        )
+        beers = {row["uuid"]: dict(row) for row in rows}
+        return [beers[key] for key in dict.fromkeys(keys) if key in beers]
+
+    async def create_beer(self, beer: dict[str, Any]) -> dict[str, Any]:
+        await self._write(
+            "INSERT INTO beers (uuid, name, brewery_uuid, abv) VALUES (?, ?, ?, ?)",
+            (beer["uuid"], beer["name"], beer["brewery_uuid"], beer["abv"]),
+        )
+        self.changes.publish("beers", beer["uuid"], "create")
+        return beer
+
+    async def create_beers(self, beers: list[dict[str, Any]]) -> list[dict[str, Any]]:
+        def write(connection: sqlite3.Connection) -> list[dict[str, Any]]:
+            created = []
+            with connection:
+                for beer in beers:
+                    cursor = connection.execute(
+                        "INSERT OR IGNORE INTO beers (uuid, name, brewery_uuid, abv) "
+                        "VALUES (?, ?, ?, ?)",
+                        (beer["uuid"], beer["name"], beer["brewery_uuid"], beer["abv"]),
+                    )
+                    if cursor.rowcount:
+                        created.append(beer)
+            return created
+
+        created = await self._run(write)
+        for beer in created:
+            self.changes.publish("beers", beer["uuid"], "create")
+        return created
+
+    async def delete_beer_by_id(self, key: str) -> None:
+        await self._write("DELETE FROM beers WHERE uuid = ?", (key,))
+        self.changes.publish("beers", key, "delete")
+
+    async def create_beer_if_absent(
+        self, beer: dict[str, Any]
+    ) -> dict[str, Any] | None:
+        rowcount = await self._write(
+            "INSERT OR IGNORE INTO beers (uuid, name, brewery_uuid, abv) "
+            "VALUES (?, ?, ?, ?)",
+            (beer["uuid"], beer["name"], beer["brewery_uuid"], beer["abv"]),
+        )
+        if not rowcount:
+            return None
+        self.changes.publish("beers", beer["uuid"], "create")
+        return beer
+
+    async def delete_beer_if_present(self, key: str) -> bool:
+        rowcount = await self._write("DELETE FROM beers WHERE uuid = ?", (key,))
+        if not rowcount:
+            return False
+        self.changes.publish("beers", key, "delete")
+        return True
+
+    async def get_collection_version(self, collection: str) -> tuple[str, int] | None:
+        row = await self._fetch_one(
+            "SELECT epoch, version FROM collection_versions WHERE collection = ?",
+            (collection,),
+        )
+        return (row["epoch"], row["version"]) if row is not None else None
+
+    # Users
+
+    async def get_all_users(
+        self, page: int = 0, limit: int = 100
+    ) -> list[dict[str, Any]]:
+        rows = await self._fetch_all(
+            "SELECT * FROM users ORDER BY rowid LIMIT ? OFFSET ?",
+            (limit, page * limit),
+        )
+        return [_user_from_row(row) for row in rows]
+
+    async def get_users_after(
+        self, key: str | None = None, limit: int = 100
+    ) -> list[dict[str, Any]]:
+        rows = await self._fetch_all(
+            "SELECT * FROM users WHERE username > ? ORDER BY username LIMIT ?",
+            (key or "", limit),
+        )
+        return [_user_from_row(row) for row in rows]
+
+    async def get_by_username(self, key: str) -> dict[str, Any] | None:
+        row = await self._fetch_one("SELECT * FROM users WHERE username = ?", (key,))
+        return _user_from_row(row) if row is not None else None
+
+    async def create_user(self, user: UserInDB) -> User:
+        try:
+            await self._write(
+                "INSERT INTO users (username, full_name, profile_picture_url, "
+                "email, disabled, email_verified, hashed_password, is_admin) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    user.username,
+                    user.full_name,
+                    (
+                        str(user.profile_picture_url)
+                        if user.profile_picture_url is not None
+                        else None
+                    ),
+                    user.email,
+                    user.disabled,
+                    user.email_verified,
+                    user.hashed_password,
+                    user.is_admin,
+                ),
+            )
+        except sqlite3.IntegrityError as error:
+            raise UserAlreadyExistsError(user.username) from error
+        self.changes.publish("users", user.username, "create")
+        return User(**user.dict())
+
+    async def update_user_password(self, key: str, hashed_password: str) -> None:
+        await self._write(
+            "UPDATE users SET hashed_password = ? WHERE username = ?",
+            (hashed_password, key),
+        )
+        self.changes.publish("users", key, "update")
@@ -0,0 +1,287 @@
+import asyncio
+import contextlib
+import functools
+import os
+from typing import Any, Awaitable, Callable
+
+from db.base import Database
+from db.locks import KeyLocks
+from db.snapshot import WriteLog
+
+
+class WriteBehind:
+    """Acknowledge beer writes as soon as they are queued, and write them
+    to the database in batches in the background.
+
+    The queue is a write log on local disk. Queued writes are flushed to
+    the OS, so they survive a restart of the process (they are written when
+    the queue is next used), but they are only synced to disk once their
+    batch is written: a machine crash loses the writes acknowledged since.
+    Disconnecting the database writes the queue first. Until a write
+    reaches the database, reads of beers by ID see it, but lists and
+    searches don't yet. Writing is idempotent (existing beers are skipped
+    and missing beers aren't deleted), so a failed batch is retried as a
+    whole.
+
+    Args:
+        data_dir (str): The directory of the queue.
+        batch_size (int): The number of queued beers that starts a write
+            right away. Defaults to 500.
+        interval (float): The maximum time (in seconds) a write is queued
+            for. Defaults to 1.
+    """
+
+    def __init__(
+        self, data_dir: str, batch_size: int = 500, interval: float = 1
+    ) -> None:
+        self.batch_size = batch_size
+        self.interval = interval
+        self.written = 0
+        self.failures = 0
+        os.makedirs(data_dir, exist_ok=True)
+        self._log = WriteLog(os.path.join(data_dir, "write_behind.log"))
+        self._queue: list[dict[str, Any]] = []
+        self._queued_beers = 0
+        # The queued state of every beer: the number of its last write and
+        # the beer (or None if it is deleted)
+        self._pending: dict[str, tuple[int, dict[str, Any] | None]] = {}
+        self._writes = 0
+        self._lock = asyncio.Lock()
+        self._full = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self._closing = False
+        self._locks = KeyLocks()
+        # The wrapped database and its own beer methods, set by `wrap`
+        self._database: Database | None = None
+        self._create_beers: Callable[..., Awaitable[Any]] | None = None
+        self._delete_beer_by_id: Callable[..., Awaitable[Any]] | None = None
+        self._get_beer_by_id: Callable[..., Awaitable[Any]] | None = None
+        self._get_stored_beer: Callable[..., Awaitable[Any]] | None = None
+        self._get_beers_by_ids: Callable[..., Awaitable[Any]] | None = None
+        self._disconnect: Callable[..., Awaitable[Any]] | None = None
+        for entry in self._log.replay():
+            self._push(entry)
+
+    def wrap(self, database: Database) -> Database:
+        """Queue the beer writes of a database, and read the beers by ID
+        through the queue.
+
+        Args:
+            database (Database): The database to wrap the methods of.
+
+        Returns:
+            Database: The same database.
+        """
+        self._database = database
+        self._create_beers = database.create_beers
+        self._delete_beer_by_id = database.delete_beer_by_id
+        self._get_beer_by_id = database.get_beer_by_id
+        # NOTE: Past the coalescing of reads, which could share a read that
+        # started before the last write
+        self._get_stored_beer = functools.partial(
+            type(database).get_beer_by_id, database
+        )
+        self._get_beers_by_ids = database.get_beers_by_ids
+        self._disconnect = database.disconnect
+        setattr(database, "disconnect", self.disconnect)
+        for name in (
+            "create_beer",
+            "create_beers",
+            "delete_beer_by_id",
+            "create_beer_if_absent",
+            "delete_beer_if_present",
+            "get_beer_by_id",
+            "get_beers_by_ids",
+        ):
+            setattr(database, name, self._scheduling(getattr(self, name)))
+        return database
+
+    def _publish(self, key: str, operation: str) -> None:
+        assert self._database is not None
+        self._database.changes.publish("beers", key, operation)
+
+    def _scheduling(
+        self, method: Callable[..., Awaitable[Any]]
+    ) -> Callable[..., Awaitable[Any]]:
+        @functools.wraps(method)
+        async def wrapper(*args: Any, **kwargs: Any) -> Any:
+            result = await method(*args, **kwargs)
+            self._schedule()
+            return result
+
+        return wrapper
+
+    def _push(self, entry: dict[str, Any]) -> None:
+        self._writes += 1
+        self._queue.append(entry)
+        if entry["operation"] == "create_beers":
+            for beer in entry["beers"]:
+                self._pending[beer["uuid"]] = (self._writes, beer)
+            self._queued_beers += len(entry["beers"])
+        else:
+            self._pending[entry["uuid"]] = (self._writes, None)
+            self._queued_beers += 1
+
+    def _enqueue(self, operation: str, **data: Any) -> None:
+        self._log.append(operation, **data)
+        self._push({"operation": operation, **data})
+
+    def _schedule(self) -> None:
+        """Start writing the queue in the background (if it isn't empty)."""
+        if self._closing:
+            return
+        if self._queued_beers >= self.batch_size:
+            self._full.set()
+        if self._queue and self._task is None:
+            self._task = asyncio.create_task(self._write_later())
+
+    async def _write_later(self) -> None:
+        try:
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._full.wait(), self.interval)
+            self._full.clear()
+            try:
+                await self.flush()
+            except Exception:
+                # NOTE: The writes stay queued, and are retried after a pause
+                self.failures += 1
+                await asyncio.sleep(self.interval)
+        finally:
+            self._task = None
+        self._schedule()
+
+    async def flush(self) -> None:
+        """Write the queued writes to the database."""
+        async with self._lock:
+            if not self._queue:
+                return
+            queue, self._queue = self._queue, []
+            queued_beers, self._queued_beers = self._queued_beers, 0
+            writes = self._writes
+            self._log.rotate()
+            try:
+                await self._write(queue)
+            except Exception:
+                self._queue = queue + self._queue
+                self._queued_beers += queued_beers
+                raise
+            self._log.drop_rotated()
+            self.written += queued_beers
+            self._pending = {
+                key: pending
+                for key, pending in self._pending.items()
+                if pending[0] > writes
+            }
+
+    async def _write(self, queue: list[dict[str, Any]]) -> None:
+        assert self._create_beers is not None
+        assert self._delete_beer_by_id is not None
+        assert self._get_stored_beer is not None
+        beers: list[dict[str, Any]] = []
+        for entry in queue:
+            if entry["operation"] == "create_beers":
+                beers.extend(entry["beers"])
+                continue
+            if beers:
+                await self._create_beers(beers)
+                beers = []
+            if await self._get_stored_beer(entry["uuid"]) is not None:
+                await self._delete_beer_by_id(entry["uuid"])
+        if beers:
+            await self._create_beers(beers)
+
+    # The wrapped methods
+
+    async def disconnect(self) -> None:
+        """Write the queue, close its log and disconnect the database. The
+        writes that fail stay in the log, for the next start."""
+        assert self._disconnect is not None
+        self._closing = True
+        # NOTE: Let a write in progress finish rather than cancelling it
+        if self._task is not None:
+            self._full.set()
+            await self._task
+        try:
+            await self.flush()
+        finally:
+            self._log.close()
+            await self._disconnect()
+
+    async def get_beer_by_id(self, key: str) -> dict[str, Any] | None:
+        pending = self._pending.get(key)
+        if pending is not None:
+            return pending[1]
+        assert self._get_beer_by_id is not None
+        return await self._get_beer_by_id(key)
+
+    async def get_beers_by_ids(self, keys: list[str]) -> list[dict[str, Any]]:
+        assert self._get_beers_by_ids is not None
+        keys = list(dict.fromkeys(keys))
+        stored_keys = [key for key in keys if key not in self._pending]
+        beers = {
+            beer["uuid"]: beer
+            for beer in (
+                await self._get_beers_by_ids(stored_keys) if stored_keys else []
+            )
+        }
+        for key in keys:
+            pending = self._pending.get(key)
+            if pending is not None and pending[1] is not None:
+                beers[key] = pending[1]
+        return [beers[key] for key in keys if key in beers]
+
+    async def create_beer(self, beer: dict[str, Any]) -> dict[str, Any]:
+        self._enqueue("create_beers", beers=[beer])
+        self._publish(beer["uuid"], "create")
+        return beer
+
+    async def create_beers(self, beers: list[dict[str, Any]]) -> list[dict[str, Any]]:
+        existing = {
+            beer["uuid"]
+            for beer in await self.get_beers_by_ids([beer["uuid"] for beer in beers])
+        }
+        new_beers: dict[str, dict[str, Any]] = {}
+        for beer in beers:
+            if beer["uuid"] not in existing:
+                new_beers.setdefault(beer["uuid"], beer)
+        created = list(new_beers.values())
+        if created:
+            self._enqueue("create_beers", beers=created)
+        for beer in created:
+            self._publish(beer["uuid"], "create")
+        return created
+
+    async def delete_beer_by_id(self, key: str) -> None:
+        self._enqueue("delete_beer", uuid=key)
+        self._publish(key, "delete")
+
+    async def create_beer_if_absent(
+        self, beer: dict[str, Any]
+    ) -> dict[str, Any] | None:
+        async with self._locks.lock(beer["uuid"]):
+            if await self._get_current_beer(beer["uuid"]) is not None:
+                return None
+            return await self.create_beer(beer)
+
+    async def delete_beer_if_present(self, key: str) -> bool:
+        async with self._locks.lock(key):
+            if await self._get_current_beer(key) is None:
+                return False
+            await self.delete_beer_by_id(key)
+            return True
+
+    async def _get_current_beer(self, key: str) -> dict[str, Any] | None:
+        pending = self._pending.get(key)
+        if pending is not None:
+            return pending[1]
+        assert self._get_stored_beer is not None
+        return await self._get_stored_beer(key)
+
+    def metrics(self) -> dict[str, float]:
+        """Get the number of queued and written beer writes, and the number
+        of failed batches."""
+        return {
+            "queued": self._queued_beers,
+            "written": self.written,
+            "failures": self.failures,
+        }
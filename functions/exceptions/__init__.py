@@ -12,8 +12,28 @@ admin_required_exception = HTTPException(
 )
 
 inactive_user_exception = HTTPException(status_code=400, detail="Inactive user")
+user_already_exists_exception = HTTPException(
+    status_code=400, detail="User already exists"
+)
 
 beer_not_found_exception = HTTPException(status_code=404, detail="Beer not found")
 beer_already_exists_exception = HTTPException(
     status_code=400, detail="Beer already exists"
 )
+too_many_beer_ids_exception = HTTPException(status_code=400, detail="Too many beer IDs")
+
+too_many_requests_exception = HTTPException(
+    status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail="Too many requests"
+)
+
+service_busy_exception = HTTPException(
+    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+    detail="Service busy, please try again later",
+    headers={"Retry-After": "1"},
+)
+
+github_unavailable_exception = HTTPException(
+    status_code=status.HTTP_502_BAD_GATEWAY, detail="Github is unavailable"
+)
+
+invalid_cursor_exception = HTTPException(status_code=400, detail="Invalid cursor")
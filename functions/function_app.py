@@ -5,11 +5,49 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import RedirectResponse
 from fastapi_versioning import VersionedFastAPI
-from routers import authentication, beers, users
+from routers import authentication, beers, metrics, users
 from starlette.middleware import Middleware
 from starlette.middleware.sessions import SessionMiddleware
+from utils.authentication import password_hash_pool
+from utils.cache import TTLCache
+from utils.compression import CompressionMiddleware
+from utils.constants import (
+    COMPRESSION_BROTLI_QUALITY,
+    COMPRESSION_CACHE_SIZE,
+    COMPRESSION_CACHE_TTL,
+    COMPRESSION_GZIP_LEVEL,
+    COMPRESSION_MINIMUM_SIZE,
+    SERVER_TIMING,
+    database,
+)
+from utils.metrics import MetricsMiddleware
+from utils.metrics import metrics as metrics_registry
+from utils.pagination import NEXT_CURSOR_HEADER
+from utils.profiling import StartupProfiler
+
+# Print a breakdown of the cold start with STARTUP_PROFILE=true
+startup_profiler = StartupProfiler(
+    enabled=os.environ.get("STARTUP_PROFILE", "false").lower() == "true"
+)
 
 # Create all the middleware for the app
+metrics_middleware = Middleware(
+    MetricsMiddleware, registry=metrics_registry, server_timing=SERVER_TIMING
+)
+# Cache the compressed bodies of hot, unchanged pages (keyed by ETag)
+compression_cache: TTLCache[tuple[str, str, int], bytes] = TTLCache(
+    max_size=COMPRESSION_CACHE_SIZE, ttl=COMPRESSION_CACHE_TTL
+)
+metrics_registry.add_collector("compression_cache", compression_cache.metrics)
+# Tell the workers apart, every one of them has its own metrics
+metrics_registry.add_collector("process", lambda: {"id": os.getpid()})
+compression_middleware = Middleware(
+    CompressionMiddleware,
+    minimum_size=COMPRESSION_MINIMUM_SIZE,
+    cache=compression_cache,
+    gzip_level=COMPRESSION_GZIP_LEVEL,
+    brotli_quality=COMPRESSION_BROTLI_QUALITY,
+)
 session_middleware = Middleware(
     SessionMiddleware,
     secret_key=os.environ.get("SECRET_KEY", "secret"),
@@ -20,37 +58,55 @@ cors_middleware = Middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "Server-Timing", NEXT_CURSOR_HEADER],
 )
-middleware: list[Middleware] = [session_middleware, cors_middleware]
+middleware: list[Middleware] = [
+    metrics_middleware,
+    compression_middleware,
+    session_middleware,
+    cors_middleware,
+]
 
 # Create the app
-fastapi_app = FastAPI(
-    title="FastAPI Azure Functions",
-    description="This is a sample FastAPI app for Azure Functions.",
-    version="0.1.0",
-    middleware=middleware,
-)
+with startup_profiler.stage("create app"):
+    fastapi_app = FastAPI(
+        title="FastAPI Azure Functions",
+        description="This is a sample FastAPI app for Azure Functions.",
+        version="0.1.0",
+        middleware=middleware,
+    )
 
-
-@fastapi_app.get("/", include_in_schema=False)
-async def docs_redirect() -> RedirectResponse:
-    """Redirect root to FastAPI docs page."""
-    return RedirectResponse(url="/docs")
+    @fastapi_app.get("/", include_in_schema=False)
+    async def docs_redirect() -> RedirectResponse:
+        """Redirect root to FastAPI docs page."""
+        return RedirectResponse(url="/docs")
 
 
 # Add the routers
-fastapi_app.include_router(authentication.router, prefix="/api")
-fastapi_app.include_router(users.router, prefix="/api")
-fastapi_app.include_router(beers.router, prefix="/api")
+with startup_profiler.stage("include routers"):
+    fastapi_app.include_router(authentication.router, prefix="/api")
+    fastapi_app.include_router(users.router, prefix="/api")
+    fastapi_app.include_router(beers.router, prefix="/api")
+    fastapi_app.include_router(metrics.router, prefix="/api")
 
-# Define the app
-app = AsgiFunctionApp(
-    app=VersionedFastAPI(
+# Copy the routes into an app per API version
+with startup_profiler.stage("create versioned app"):
+    versioned_app = VersionedFastAPI(
         fastapi_app,
         enable_latest=True,
         version_format="v{major}",
         prefix_format="/v{major}",
         middleware=middleware,  # NOTE: Redefine the middleware here
-    ),
-    http_auth_level=AuthLevel.ANONYMOUS,
-)
+        on_startup=[database.connect],
+        on_shutdown=[
+            database.disconnect,
+            password_hash_pool.shutdown,
+            authentication.github_client.close,
+        ],
+    )
+
+# Define the app
+with startup_profiler.stage("create function app"):
+    app = AsgiFunctionApp(app=versioned_app, http_auth_level=AuthLevel.ANONYMOUS)
+
+startup_profiler.print_report()
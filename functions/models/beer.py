@@ -17,3 +17,39 @@ class NewBeer(BaseModel):
     name: str = name_field
     brewery_uuid: str = brewery_uuid_field
     abv: float = abv_field
+
+
+class BreweryAggregate(BaseModel):
+    brewery_uuid: str = brewery_uuid_field
+    beer_count: int = Field(
+        title="Beer Count", description="The number of beers of the brewery."
+    )
+    average_abv: float = Field(
+        title="Average ABV", description="The average ABV of the beers."
+    )
+    min_abv: float = Field(title="Lowest ABV", description="The lowest ABV.")
+    max_abv: float = Field(title="Highest ABV", description="The highest ABV.")
+
+
+class BeerBatch(BaseModel):
+    beers: list[Beer] = Field(title="Beers", description="The beers that exist.")
+    missing: list[str] = Field(
+        title="Missing UUIDs", description="The UUIDs of the beers that don't exist."
+    )
+
+
+class BeerImportResult(BaseModel):
+    row: int = Field(title="Row", description="The row number in the upload.")
+    uuid: str | None = Field(
+        default=None, title="Beer UUID", description="The UUID of the beer."
+    )
+    status: str = Field(
+        title="Status",
+        description=(
+            "The result of the row: created, exists (already in the database), "
+            "duplicate (earlier in the upload) or invalid."
+        ),
+    )
+    detail: str | None = Field(
+        default=None, title="Detail", description="Why the row is invalid."
+    )
@@ -1,24 +1,79 @@
 from datetime import timedelta
 from typing import Annotated
 
-import requests
+from db.base import UserAlreadyExistsError
 from exceptions import unauthorized_exception
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Request
 from fastapi.security import OAuth2PasswordRequestForm
 from models import Token
-from models.providers.github import GithubEmailData, GithubUserData
 from models.user import UserInDB
-from utils.authentication import authenticate_user, create_access_token, get_user
-from utils.constants import ACCESS_TOKEN_EXPIRE_MINUTES, database
+from utils.authentication import (
+    authenticate_user,
+    create_access_token,
+    get_token_data,
+    get_user,
+    user_versions,
+)
+from utils.constants import (
+    ACCESS_TOKEN_EXPIRE_MINUTES,
+    AUTH_MAX_CONCURRENCY,
+    AUTH_RATE_LIMIT_BURST,
+    AUTH_RATE_LIMIT_PER_IP,
+    AUTH_RATE_LIMIT_PER_USERNAME,
+    GITHUB_API_URL,
+    GITHUB_MAX_CONNECTIONS,
+    GITHUB_TIMEOUT,
+    GITHUB_USER_CACHE_TTL,
+    TRUSTED_PROXY_HOPS,
+    database,
+)
+from utils.github import GithubClient
+from utils.metrics import metrics
+from utils.rate_limit import MemoryRateLimitStore, RateLimiter, get_client_ip
 
 # Create a router for authentication related endpoints
 router = APIRouter(prefix="/auth", tags=["Authentication"])
 
+# Share one Github client (and its connection pool) between requests
+github_client = GithubClient(
+    base_url=GITHUB_API_URL,
+    timeout=GITHUB_TIMEOUT,
+    max_connections=GITHUB_MAX_CONNECTIONS,
+    cache_ttl=GITHUB_USER_CACHE_TTL,
+)
+metrics.add_collector("github_user_cache", github_client.user_data_cache.metrics)
+
+# Logging in is cheap to ask for and expensive to serve (hashing passwords,
+# calling Github), so limit how often and how much it's done
+rate_limiter = RateLimiter(
+    store=MemoryRateLimitStore(),
+    ip_rate=AUTH_RATE_LIMIT_PER_IP,
+    username_rate=AUTH_RATE_LIMIT_PER_USERNAME,
+    burst=AUTH_RATE_LIMIT_BURST,
+    max_concurrency=AUTH_MAX_CONCURRENCY,
+)
+metrics.add_collector("auth_rate_limiter", rate_limiter.metrics)
+
+
+async def limit_login(
+    request: Request, form_data: Annotated[OAuth2PasswordRequestForm, Depends()]
+) -> None:
+    """Rate limit logins by client IP and username."""
+    await rate_limiter.check(
+        get_client_ip(request, TRUSTED_PROXY_HOPS), form_data.username
+    )
+
+
+async def limit_token_swap(request: Request) -> None:
+    """Rate limit token swaps by client IP."""
+    await rate_limiter.check(get_client_ip(request, TRUSTED_PROXY_HOPS))
+
 
 @router.post(
     "/token",
     summary="Get an access token.",
     description="Log in to get an access token.",
+    dependencies=[Depends(limit_login), Depends(rate_limiter.guard)],
 )
 async def login_for_access_token(
     form_data: Annotated[OAuth2PasswordRequestForm, Depends()]
@@ -34,7 +89,9 @@ async def login_for_access_token(
         Token: The access token.
     """
 
-    # Authenticate the user with the username and password
+    # Authenticate the user with the username and password (reading its
+    # version first, so a change in between makes the token's user stale)
+    user_version = user_versions.get(form_data.username)
     user = await authenticate_user(database, form_data.username, form_data.password)
 
     # Handle the case where the user is not authenticated
@@ -44,59 +101,49 @@ async def login_for_access_token(
     # Create an access token
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": user.username}, expires_delta=access_token_expires
+        data=get_token_data(user, user_version), expires_delta=access_token_expires
     )
     return Token(access_token=access_token, token_type="bearer")
 
 
 @router.post(
-    "/github-token", summary="Swap a social login access token for a custom one."
+    "/github-token",
+    summary="Swap a social login access token for a custom one.",
+    dependencies=[Depends(limit_token_swap), Depends(rate_limiter.guard)],
 )
 async def swap_token(github_access_token: str) -> Token:
     if not github_access_token:
         raise unauthorized_exception
 
-    # Get the profile from Github
-    profile_response = requests.get(
-        "https://api.github.com/user",
-        headers={"Authorization": f"token {github_access_token}"},
-    )
-    profile_response.raise_for_status()
-
-    # Get the email addresses from Github
-    email_response = requests.get(
-        "https://api.github.com/user/emails",
-        headers={"Authorization": f"token {github_access_token}"},
-    )
-    email_response.raise_for_status()
-    email_addresses = [GithubEmailData(**email) for email in email_response.json()]
-
-    # Create a user data object
-    user_data = GithubUserData(
-        **profile_response.json(), email_addresses=email_addresses
-    )
+    # Get the profile and email addresses from Github
+    user_data = await github_client.get_user_data(github_access_token)
 
     # Create a new user if the user doesn't exist
+    user_version = user_versions.get(user_data.primary_email.email)
     user = await get_user(database, user_data.primary_email.email)
     if user is None:
-        user_in_db = await database.create_user(
-            user=UserInDB(
-                username=user_data.primary_email.email,
-                full_name=user_data.name,
-                profile_picture_url=user_data.avatar_url,
-                email=user_data.primary_email.email,
-                disabled=False,
-                email_verified=user_data.primary_email.verified,
-                hashed_password=None,
+        try:
+            await database.create_user(
+                user=UserInDB(
+                    username=user_data.primary_email.email,
+                    full_name=user_data.name,
+                    profile_picture_url=user_data.avatar_url,
+                    email=user_data.primary_email.email,
+                    disabled=False,
+                    email_verified=user_data.primary_email.verified,
+                    hashed_password=None,
+                )
             )
-        )
-        user = await get_user(database, user_in_db.username)
+        except UserAlreadyExistsError:
+            # NOTE: Another login of the same user created it in between
+            pass
+        user = await get_user(database, user_data.primary_email.email)
         if user is None:
             raise unauthorized_exception
 
     # Create an access token
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     new_access_token = create_access_token(
-        data={"sub": user.username}, expires_delta=access_token_expires
+        data=get_token_data(user, user_version), expires_delta=access_token_expires
     )
     return Token(access_token=new_access_token, token_type="bearer")
@@ -5,42 +5,203 @@ from exceptions import (
     admin_required_exception,
     beer_already_exists_exception,
     beer_not_found_exception,
+    too_many_beer_ids_exception,
 )
-from fastapi import APIRouter
+from fastapi import APIRouter, Query, Request, Response
 from fastapi.params import Depends
+from fastapi.responses import StreamingResponse
 from fastapi_versioning import version
-from models.beer import Beer, NewBeer
+from models.beer import (
+    Beer,
+    BeerBatch,
+    BeerImportResult,
+    BreweryAggregate,
+    NewBeer,
+)
 from models.user import User
+from pydantic import ValidationError
 from utils.authentication import get_current_active_user
-from utils.constants import database
+from utils.constants import (
+    BEER_BATCH_MAX_IDS,
+    BEER_CACHE_CONTROL,
+    BEER_IMPORT_BATCH_SIZE,
+    FAST_SERIALIZATION,
+    database,
+)
+from utils.http_cache import check_not_modified
+from utils.pagination import NEXT_CURSOR_HEADER, decode_cursor, encode_cursor
+from utils.serialization import FastJSONResponse, project
+from utils.streaming import (
+    NDJSON_MEDIA_TYPE,
+    gzip_stream,
+    iter_lines,
+    iter_records,
+    ndjson_stream,
+)
 
 router = APIRouter(prefix="/beers", tags=["Beers"])
 
 
+def get_beer_uuid(name: str) -> str:
+    """Get the (deterministic) UUID of a beer from its name."""
+    return str(uuid.uuid5(namespace=uuid.NAMESPACE_OID, name=name))
+
+
 @router.get(
     "",
     summary="Get all beers.",
-    description="Get all beers from the database.",
+    description=(
+        "Get all beers from the database, optionally filtered by brewery, ABV "
+        "range and (part of the) name. Pass an (empty) `cursor` to page by "
+        "cursor instead of by page number, the cursor of the next page is "
+        f"returned in the `{NEXT_CURSOR_HEADER}` header. Filtered results are "
+        "always paged by cursor."
+    ),
+    response_model=list[Beer],
+)
+@version(1)
+async def read_beers(
+    request: Request,
+    response: Response,
+    page: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: str | None = None,
+    brewery_uuid: str | None = None,
+    min_abv: float | None = None,
+    max_abv: float | None = None,
+    name: str | None = None,
+) -> list[Beer] | Response:
+    """Get all beers from the database, by page number or by cursor."""
+    not_modified = await check_not_modified(
+        request, response, "beers", BEER_CACHE_CONTROL
+    )
+    if not_modified is not None:
+        return not_modified
+    filtered = any(
+        value is not None for value in (brewery_uuid, min_abv, max_abv, name)
+    )
+    if cursor is None and not filtered:
+        beers = await database.get_all_beers(page=page, limit=limit)
+    else:
+        beers = await database.search_beers(
+            brewery_uuid=brewery_uuid,
+            min_abv=min_abv,
+            max_abv=max_abv,
+            name=name,
+            key=decode_cursor(cursor or ""),
+            limit=limit,
+        )
+        if len(beers) == limit:
+            response.headers[NEXT_CURSOR_HEADER] = encode_cursor(beers[-1]["uuid"])
+    if FAST_SERIALIZATION:
+        return FastJSONResponse(project(beers, Beer), headers=response.headers)
+    return [Beer(**beer) for beer in beers]
+
+
+@router.get(
+    "/export",
+    summary="Export all beers.",
+    description=(
+        "Stream all beers from the database as newline delimited JSON, "
+        "optionally compressed with gzip."
+    ),
+    response_class=StreamingResponse,
+)
+@version(1)
+async def export_beers(compress: bool = False) -> StreamingResponse:
+    """Stream all beers from the database as newline delimited JSON."""
+    content = ndjson_stream(database.iter_beers(), Beer)
+    if not compress:
+        return StreamingResponse(content, media_type=NDJSON_MEDIA_TYPE)
+    return StreamingResponse(
+        gzip_stream(content),
+        media_type=NDJSON_MEDIA_TYPE,
+        headers={"Content-Encoding": "gzip"},
+    )
+
+
+@router.get(
+    "/batch",
+    summary="Get many beers by ID.",
+    description=(
+        f"Get up to {BEER_BATCH_MAX_IDS} beers from the database at once, by "
+        "repeating the `ids` parameter. Returns the beers that exist and the "
+        "IDs of the beers that don't."
+    ),
+    response_model=BeerBatch,
 )
 @version(1)
-async def read_beers(page: int = 0, limit: int = 100) -> list[Beer]:
-    """Get all beers from the database."""
-    return [
-        Beer(**beer) for beer in await database.get_all_beers(page=page, limit=limit)
-    ]
+async def read_beer_batch(
+    request: Request, response: Response, ids: list[str] = Query()
+) -> BeerBatch | Response:
+    """Get many beers from the database by their IDs."""
+    if len(ids) > BEER_BATCH_MAX_IDS:
+        raise too_many_beer_ids_exception
+    not_modified = await check_not_modified(
+        request, response, "beers", BEER_CACHE_CONTROL
+    )
+    if not_modified is not None:
+        return not_modified
+    beers = await database.get_beers_by_ids(ids)
+    found = {beer["uuid"] for beer in beers}
+    missing = [beer_id for beer_id in dict.fromkeys(ids) if beer_id not in found]
+    if FAST_SERIALIZATION:
+        return FastJSONResponse(
+            {"beers": project(beers, Beer), "missing": missing},
+            headers=response.headers,
+        )
+    return BeerBatch(beers=[Beer(**beer) for beer in beers], missing=missing)
+
+
+@router.get(
+    "/aggregates",
+    summary="Get the aggregates of the breweries.",
+    description=(
+        "Get the number of beers and the average, lowest and highest ABV of "
+        "every brewery, or of one brewery. The aggregates are kept up to date "
+        "as beers are created and deleted, so this doesn't go over the beers."
+    ),
+    response_model=list[BreweryAggregate],
+)
+@version(1)
+async def read_brewery_aggregates(
+    request: Request, response: Response, brewery_uuid: str | None = None
+) -> list[BreweryAggregate] | Response:
+    """Get the aggregates of the breweries from the database."""
+    not_modified = await check_not_modified(
+        request, response, "beers", BEER_CACHE_CONTROL
+    )
+    if not_modified is not None:
+        return not_modified
+    aggregates = await database.get_brewery_aggregates(brewery_uuid)
+    if FAST_SERIALIZATION:
+        return FastJSONResponse(
+            project(aggregates, BreweryAggregate), headers=response.headers
+        )
+    return [BreweryAggregate(**aggregate) for aggregate in aggregates]
 
 
 @router.get(
     "/{beer_id}",
     summary="Get a beer by ID.",
     description="Get a beer from the database by its ID.",
+    response_model=Beer,
 )
 @version(1)
-async def read_beer(beer_id: str) -> Beer:
+async def read_beer(
+    request: Request, response: Response, beer_id: str
+) -> Beer | Response:
     """Get a beer from the database by its ID."""
+    not_modified = await check_not_modified(
+        request, response, "beers", BEER_CACHE_CONTROL
+    )
+    if not_modified is not None:
+        return not_modified
     beer = await database.get_beer_by_id(beer_id)
     if beer is None:
         raise beer_not_found_exception
+    if FAST_SERIALIZATION:
+        return FastJSONResponse(project([beer], Beer)[0], headers=response.headers)
     return Beer(**beer)
 
 
@@ -56,10 +217,76 @@ async def create_beer(
     """Create a beer in the database."""
     if not current_user.is_admin:
         raise admin_required_exception
-    beer_uuid = str(uuid.uuid5(namespace=uuid.NAMESPACE_OID, name=beer.name))
-    if await database.get_beer_by_id(beer_uuid) is not None:
+    beer_uuid = get_beer_uuid(beer.name)
+    created_beer = await database.create_beer_if_absent(
+        {**beer.dict(), "uuid": beer_uuid}
+    )
+    if created_beer is None:
         raise beer_already_exists_exception
-    return Beer(**(await database.create_beer({**beer.dict(), "uuid": beer_uuid})))
+    return Beer(**created_beer)
+
+
+@router.post(
+    "/import",
+    summary="Import beers in bulk.",
+    description=(
+        "Import beers from an NDJSON upload (or a CSV upload with a header row "
+        "when the content type is `text/csv`). Beers are deduplicated by name "
+        "and written in batches. Returns the result of every row."
+    ),
+)
+@version(1)
+async def import_beers(
+    request: Request,
+    current_user: Annotated[User, Depends(get_current_active_user)],
+    batch_size: int = BEER_IMPORT_BATCH_SIZE,
+) -> list[BeerImportResult]:
+    """Import beers in bulk from a streamed NDJSON or CSV upload."""
+    if not current_user.is_admin:
+        raise admin_required_exception
+
+    results: list[BeerImportResult] = []
+    seen: set[str] = set()
+    batch: list[tuple[int, dict]] = []
+
+    async def write_batch() -> None:
+        created = await database.create_beers([beer for _, beer in batch])
+        created_uuids = {beer["uuid"] for beer in created}
+        for row, beer in batch:
+            status = "created" if beer["uuid"] in created_uuids else "exists"
+            results.append(BeerImportResult(row=row, uuid=beer["uuid"], status=status))
+        batch.clear()
+
+    csv_format = request.headers.get("content-type", "").startswith("text/csv")
+    records = iter_records(iter_lines(request.stream()), csv_format=csv_format)
+    async for row, record in records:
+        if record is None:
+            results.append(
+                BeerImportResult(row=row, status="invalid", detail="Malformed row")
+            )
+            continue
+        try:
+            beer = NewBeer(**record)
+        except ValidationError as error:
+            detail = "; ".join(
+                f"{'.'.join(map(str, e['loc']))}: {e['msg']}" for e in error.errors()
+            )
+            results.append(BeerImportResult(row=row, status="invalid", detail=detail))
+            continue
+        beer_uuid = get_beer_uuid(beer.name)
+        if beer_uuid in seen:
+            results.append(
+                BeerImportResult(row=row, uuid=beer_uuid, status="duplicate")
+            )
+            continue
+        seen.add(beer_uuid)
+        batch.append((row, {**beer.dict(), "uuid": beer_uuid}))
+        if len(batch) >= batch_size:
+            await write_batch()
+    if batch:
+        await write_batch()
+
+    return sorted(results, key=lambda result: result.row)
 
 
 @router.delete(
@@ -74,6 +301,5 @@ async def delete_beer(
     """Delete a beer from the database by its ID."""
     if not current_user.is_admin:
         raise admin_required_exception
-    if await database.get_beer_by_id(beer_id) is None:
+    if not await database.delete_beer_if_present(beer_id):
         raise beer_not_found_exception
-    await database.delete_beer_by_id(beer_id)
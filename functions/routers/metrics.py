@@ -0,0 +1,32 @@
+from typing import Annotated
+
+from exceptions import admin_required_exception
+from fastapi import APIRouter, Depends
+from fastapi.responses import PlainTextResponse
+from fastapi_versioning import version
+from models import User
+from utils.authentication import get_current_active_user
+from utils.metrics import PROMETHEUS_MEDIA_TYPE, metrics
+
+router = APIRouter(prefix="/metrics", tags=["Metrics"])
+
+
+@router.get(
+    "",
+    summary="Get the metrics of the app.",
+    description=(
+        "Get the request latencies by route, the requests in flight, the "
+        "latencies of the steps inside requests (database, password hashing, "
+        "Github calls) and the state of the worker pool and caches, in the "
+        "Prometheus text format. This endpoint requires admin privileges."
+    ),
+    response_class=PlainTextResponse,
+)
+@version(1)
+async def read_metrics(
+    current_user: Annotated[User, Depends(get_current_active_user)]
+) -> PlainTextResponse:
+    """Get the metrics of the app in the Prometheus text format."""
+    if not current_user.is_admin:
+        raise admin_required_exception
+    return PlainTextResponse(metrics.render(), media_type=PROMETHEUS_MEDIA_TYPE)
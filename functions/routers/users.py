@@ -1,10 +1,20 @@
 from typing import Annotated
 
-from fastapi import APIRouter, Depends
+from db.base import UserAlreadyExistsError
+from exceptions import user_already_exists_exception
+from fastapi import APIRouter, Depends, Query, Response
+from fastapi.responses import StreamingResponse
 from fastapi_versioning import version
 from models import NewUser, PublicUser, User, UserInDB
-from utils.authentication import get_current_active_user, get_password_hash
-from utils.constants import database
+from utils.authentication import (
+    get_current_active_user,
+    get_password_hash,
+    password_hash_pool,
+)
+from utils.constants import FAST_SERIALIZATION, database
+from utils.pagination import NEXT_CURSOR_HEADER, decode_cursor, encode_cursor
+from utils.serialization import FastJSONResponse, project
+from utils.streaming import NDJSON_MEDIA_TYPE, gzip_stream, ndjson_stream
 
 router = APIRouter(prefix="/users", tags=["Users"])
 
@@ -25,15 +35,54 @@ async def read_users_me(
 
 
 @router.get(
-    "", summary="Get all users.", description="Get all users from the database."
+    "",
+    summary="Get all users.",
+    description=(
+        "Get all users from the database. Pass an (empty) `cursor` to page "
+        "by cursor instead of by page number, the cursor of the next page is "
+        f"returned in the `{NEXT_CURSOR_HEADER}` header."
+    ),
+    response_model=list[PublicUser],
+)
+@version(1)
+async def read_users(
+    response: Response,
+    page: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: str | None = None,
+) -> list[PublicUser] | Response:
+    """Get all users from the database, by page number or by cursor."""
+    if cursor is None:
+        users = await database.get_all_users(page=page, limit=limit)
+    else:
+        users = await database.get_users_after(key=decode_cursor(cursor), limit=limit)
+        if len(users) == limit:
+            response.headers[NEXT_CURSOR_HEADER] = encode_cursor(users[-1]["username"])
+    if FAST_SERIALIZATION:
+        return FastJSONResponse(project(users, PublicUser), headers=response.headers)
+    return [PublicUser(**user) for user in users]
+
+
+@router.get(
+    "/export",
+    summary="Export all users.",
+    description=(
+        "Stream all users from the database as newline delimited JSON, "
+        "optionally compressed with gzip."
+    ),
+    response_class=StreamingResponse,
 )
 @version(1)
-async def read_users(page: int = 0, limit: int = 100) -> list[PublicUser]:
-    """Get all users from the database."""
-    return [
-        PublicUser(**user)
-        for user in await database.get_all_users(page=page, limit=limit)
-    ]
+async def export_users(compress: bool = False) -> StreamingResponse:
+    """Stream all users from the database as newline delimited JSON."""
+    content = ndjson_stream(database.iter_users(), PublicUser)
+    if not compress:
+        return StreamingResponse(content, media_type=NDJSON_MEDIA_TYPE)
+    return StreamingResponse(
+        gzip_stream(content),
+        media_type=NDJSON_MEDIA_TYPE,
+        headers={"Content-Encoding": "gzip"},
+    )
 
 
 @router.post(
@@ -44,5 +93,9 @@ async def read_users(page: int = 0, limit: int = 100) -> list[PublicUser]:
 @version(1)
 async def register_user(data: NewUser) -> User:
     """Register a new user."""
-    user = UserInDB(**data.dict(), hashed_password=get_password_hash(data.password))
-    return await database.create_user(user)
+    hashed_password = await password_hash_pool.run(get_password_hash, data.password)
+    user = UserInDB(**data.dict(), hashed_password=hashed_password)
+    try:
+        return await database.create_user(user)
+    except UserAlreadyExistsError as error:
+        raise user_already_exists_exception from error
@@ -0,0 +1,73 @@
+"""Serve the API with uvicorn, with one or more worker processes.
+
+Workers are separate processes, so all they share is the database: with
+more than one worker only the SQLite backend (one file in WAL mode) can be
+used, and the write-behind queue can't. The launcher defaults to SQLite,
+and has every worker read the changes to the users made by the others,
+to invalidate its cached tokens. The ETags are derived from the versions
+kept in the file, so all workers agree on them.
+
+The login rate limits, the password hashing pool and the metrics are per
+worker.
+
+Run from the `functions` directory:
+
+    python -m serve --workers 4 --port 8000
+"""
+import argparse
+import os
+
+try:
+    import uvicorn
+except ImportError:  # pragma: no cover
+    uvicorn = None  # type: ignore[assignment]
+
+
+def configure(workers: int) -> str | None:
+    """Set the environment of the workers up (before the app is imported).
+
+    Args:
+        workers (int): The number of worker processes.
+
+    Returns:
+        str | None: Why the configuration can't be served by that many
+            workers, or None if it can.
+    """
+    backend = os.environ.setdefault("DATABASE_BACKEND", "sqlite")
+    if workers == 1:
+        return None
+    if backend != "sqlite":
+        return (
+            f"the {backend} database lives in the memory of one process, use "
+            "DATABASE_BACKEND=sqlite to run several workers"
+        )
+    if os.environ.get("WRITE_BEHIND_DIR"):
+        return "the write-behind queue can't be shared by several workers"
+    os.environ.setdefault("SQLITE_WATCH_INTERVAL", "1")
+    return None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+
+    if uvicorn is None:
+        parser.error("uvicorn is not installed")
+    error = configure(args.workers)
+    if error is not None:
+        parser.error(error)
+    uvicorn.run(
+        "function_app:versioned_app",
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        log_level=args.log_level,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+import os
+import uuid
+from contextlib import asynccontextmanager
+from typing import Any, AsyncContextManager, AsyncIterator, Callable, Iterator
+
+import pytest
+from db.base import Database
+from db.columnar import ColumnarDatabase
+from db.dummy import DummyUserDatabase, _dummy_db
+from db.sqlite import SQLiteDatabase
+
+BACKENDS = ["dummy", "columnar", "sqlite"]
+
+
+def make_beer(
+    name: str, brewery_uuid: str | None = None, abv: float = 5.0
+) -> dict[str, Any]:
+    return {
+        "uuid": str(uuid.uuid4()),
+        "name": name,
+        "brewery_uuid": brewery_uuid or str(uuid.uuid4()),
+        "abv": abv,
+    }
+
+
+@pytest.fixture(autouse=True)
+def dummy_beers() -> Iterator[None]:
+    """Start every test without beers in the dummy database (that the
+    dummy and columnar databases start from)."""
+    beers = dict(_dummy_db["beers"])
+    _dummy_db["beers"].clear()
+    yield
+    _dummy_db["beers"].clear()
+    _dummy_db["beers"].update(beers)
+
+
+@pytest.fixture(params=BACKENDS)
+def open_database(
+    request: pytest.FixtureRequest, tmp_path: Any
+) -> Callable[[], AsyncContextManager[Database]]:
+    """Open an empty database of every backend (within the event loop of
+    the test)."""
+
+    @asynccontextmanager
+    async def open_database() -> AsyncIterator[Database]:
+        database: Database
+        if request.param == "sqlite":
+            database = SQLiteDatabase(path=os.path.join(tmp_path, "test.sqlite3"))
+        elif request.param == "columnar":
+            database = ColumnarDatabase()
+        else:
+            database = DummyUserDatabase()
+        await database.connect()
+        try:
+            yield database
+        finally:
+            await database.disconnect()
+
+    return open_database
@@ -0,0 +1,140 @@
+import asyncio
+from typing import Any, AsyncContextManager, Awaitable, Callable
+
+import pytest
+from conftest import make_beer
+from db.base import Database, UserAlreadyExistsError
+from db.dummy import DummyUserDatabase, _dummy_db
+from db.write_behind import WriteBehind
+from models.user import User, UserInDB
+from utils.singleflight import SingleFlight
+
+
+async def race(database: Database, beer: dict[str, Any], callers: int = 50) -> None:
+    """Create and then delete the same beer from many callers at once."""
+    created = await asyncio.gather(
+        *(database.create_beer_if_absent(dict(beer)) for _ in range(callers))
+    )
+    assert [result for result in created if result is not None] == [beer]
+    assert await database.get_beer_by_id(beer["uuid"]) == beer
+
+    deleted = await asyncio.gather(
+        *(database.delete_beer_if_present(beer["uuid"]) for _ in range(callers))
+    )
+    assert deleted.count(True) == 1
+    assert await database.get_beer_by_id(beer["uuid"]) is None
+
+
+def test_concurrent_writes_apply_once(
+    open_database: Callable[[], AsyncContextManager[Database]]
+) -> None:
+    async def run() -> None:
+        async with open_database() as database:
+            # NOTE: Coalesce the reads, like the app does
+            SingleFlight().wrap(database, names=["get_beer_by_id"])
+            for index in range(5):
+                await race(database, make_beer(f"Beer {index}"))
+
+    asyncio.run(run())
+
+
+def test_concurrent_writes_apply_once_behind_the_queue(
+    open_database: Callable[[], AsyncContextManager[Database]], tmp_path: Any
+) -> None:
+    async def run() -> None:
+        async with open_database() as database:
+            SingleFlight().wrap(database, names=["get_beer_by_id"])
+            write_behind = WriteBehind(data_dir=str(tmp_path), interval=0.01)
+            write_behind.wrap(database)
+            await race(database, make_beer("Queued"))
+            await write_behind.flush()
+            beer = make_beer("Written")
+            await database.create_beer(beer)
+            await write_behind.flush()
+            assert not await database.create_beer_if_absent(beer)
+            assert await database.delete_beer_if_present(beer["uuid"])
+            await write_behind.flush()
+            assert await database.get_beer_by_id(beer["uuid"]) is None
+
+    asyncio.run(run())
+
+
+class SlowReadDatabase(DummyUserDatabase):
+    """Read beers at once, but return them only once `reads` is set, like
+    a read that spans a write."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.read = asyncio.Event()
+        self.reads = asyncio.Event()
+
+    async def get_beer_by_id(self, key: str) -> dict[str, Any] | None:
+        beer = await super().get_beer_by_id(key)
+        self.read.set()
+        await self.reads.wait()
+        return beer
+
+
+@pytest.mark.parametrize("exists", [False, True])
+def test_checks_ignore_coalesced_reads(exists: bool) -> None:
+    async def run() -> None:
+        database = SlowReadDatabase()
+        SingleFlight().wrap(database, names=["get_beer_by_id"])
+        beer = make_beer("Beer")
+        if exists:
+            await database.create_beer(beer)
+        # A read that started before the write, and is still in flight
+        read = asyncio.create_task(database.get_beer_by_id(beer["uuid"]))
+        await database.read.wait()
+        write: Awaitable[Any]
+        if exists:
+            await database.delete_beer_by_id(beer["uuid"])
+            write = database.create_beer_if_absent(beer)
+        else:
+            await database.create_beer(beer)
+            write = database.delete_beer_if_present(beer["uuid"])
+        asyncio.get_running_loop().call_later(0.01, database.reads.set)
+        assert await write
+        assert (await read is not None) is exists
+
+    asyncio.run(run())
+
+
+def test_concurrent_user_creation_applies_once(
+    open_database: Callable[[], AsyncContextManager[Database]]
+) -> None:
+    async def run() -> None:
+        async with open_database() as database:
+            user = UserInDB(username="janedoe", email="janedoe@example.com")
+            created = await asyncio.gather(
+                *(database.create_user(user) for _ in range(10)),
+                return_exceptions=True,
+            )
+            assert created.count(User(**user.dict())) == 1
+            assert all(
+                isinstance(result, UserAlreadyExistsError)
+                for result in created
+                if not isinstance(result, User)
+            )
+
+    try:
+        asyncio.run(run())
+    finally:
+        _dummy_db["users"].pop("janedoe", None)
+
+
+def test_disconnecting_writes_the_queue(tmp_path: Any) -> None:
+    async def run() -> None:
+        database = DummyUserDatabase()
+        write_behind = WriteBehind(data_dir=str(tmp_path), interval=60)
+        write_behind.wrap(database)
+        beer = make_beer("Queued")
+        await database.create_beer(beer)
+        assert write_behind.metrics()["queued"] == 1
+        await database.disconnect()
+        assert write_behind.metrics()["written"] == 1
+        assert await DummyUserDatabase().get_beer_by_id(beer["uuid"]) == beer
+        # Nothing is left to replay
+        assert WriteBehind(data_dir=str(tmp_path)).metrics()["queued"] == 0
+
+    asyncio.run(run())
@@ -0,0 +1,65 @@
+import asyncio
+import os
+import random
+from typing import Any
+
+import pytest
+from conftest import make_beer
+from db.columnar import ColumnarDatabase
+
+
+def test_pages_skip_deleted_beers_until_compacted() -> None:
+    random.seed(0)
+
+    async def run() -> None:
+        database = ColumnarDatabase()
+        beers = {}
+        for index in range(300):
+            beer = make_beer(f"Beer {index}")
+            beers[beer["uuid"]] = beer
+        await database.create_beers(list(beers.values()))
+        for step in range(400):
+            if random.random() < 0.6 and beers:
+                key = random.choice(list(beers))
+                await database.delete_beer_by_id(key)
+                del beers[key]
+            else:
+                beer = make_beer(f"New beer {step}")
+                beers[beer["uuid"]] = beer
+                await database.create_beer(beer)
+            expected = list(beers.values())
+            for page, limit in ((0, 10), (3, 7), (len(expected) // 10, 10), (99, 10)):
+                assert await database.get_all_beers(page, limit) == (
+                    expected[page * limit : page * limit + limit]
+                )
+
+    asyncio.run(run())
+
+
+def test_writes_survive_a_restart(
+    tmp_path: Any, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    synced = []
+    fsync = os.fsync
+
+    def record_fsync(fd: int) -> None:
+        synced.append(fd)
+        fsync(fd)
+
+    monkeypatch.setattr(os, "fsync", record_fsync)
+
+    async def run() -> list[dict[str, Any]]:
+        database = ColumnarDatabase(data_dir=str(tmp_path), snapshot_every=5)
+        beers = [make_beer(f"Beer {index}") for index in range(8)]
+        for beer in beers:
+            await database.create_beer(beer)
+        await database.delete_beer_by_id(beers[0]["uuid"])
+        synced.clear()
+        await database.disconnect()
+        # The last snapshot and the log it rotated are synced
+        assert len(synced) >= 2
+        return beers[1:]
+
+    beers = asyncio.run(run())
+    database = ColumnarDatabase(data_dir=str(tmp_path))
+    assert asyncio.run(database.get_all_beers(limit=100)) == beers
@@ -0,0 +1,140 @@
+import asyncio
+import time
+from typing import Any, Iterator
+
+import pytest
+from benchmarks.github_stub import create_github_stub, serve_in_thread
+from benchmarks.load import free_port
+from fastapi import HTTPException
+from utils.github import GithubClient
+
+LATENCY = 0.2
+
+
+@pytest.fixture(scope="module")
+def github_stub() -> Iterator[tuple[Any, str]]:
+    """Serve the stub of the Github API on a local port."""
+    stub = create_github_stub(latency=LATENCY)
+    port = free_port()
+    server = serve_in_thread(stub, port)
+    yield stub, f"http://127.0.0.1:{port}"
+    server.should_exit = True
+
+
+@pytest.fixture
+def stub_calls(github_stub: tuple[Any, str]) -> Any:
+    stub, _ = github_stub
+    stub.state.calls.clear()
+    return stub.state.calls
+
+
+def make_client(base_url: str, cache_ttl: float = 30) -> GithubClient:
+    return GithubClient(
+        base_url=base_url, timeout=5, max_connections=20, cache_ttl=cache_ttl
+    )
+
+
+def test_gets_profile_and_emails_concurrently(
+    github_stub: tuple[Any, str], stub_calls: Any
+) -> None:
+    async def run() -> None:
+        client = make_client(github_stub[1])
+        try:
+            start = time.perf_counter()
+            user_data = await client.get_user_data("alice")
+            elapsed = time.perf_counter() - start
+        finally:
+            await client.close()
+        assert user_data.login == "alice"
+        assert user_data.primary_email.email == "alice@example.com"
+        assert stub_calls == {"/user": 1, "/user/emails": 1}
+        # Both calls at once take one latency, not two
+        assert elapsed < 1.75 * LATENCY
+
+    asyncio.run(run())
+
+
+def test_verifies_many_tokens_concurrently(
+    github_stub: tuple[Any, str], stub_calls: Any
+) -> None:
+    tokens = [f"user{index}" for index in range(20)]
+
+    async def run() -> None:
+        client = make_client(github_stub[1])
+        try:
+            start = time.perf_counter()
+            users = await asyncio.gather(*map(client.get_user_data, tokens))
+            elapsed = time.perf_counter() - start
+        finally:
+            await client.close()
+        assert [user.login for user in users] == tokens
+        assert stub_calls == {"/user": 20, "/user/emails": 20}
+        # One after the other, they would take 40 latencies
+        assert elapsed < 5 * LATENCY
+
+    asyncio.run(run())
+
+
+def test_caches_user_data_by_token(
+    github_stub: tuple[Any, str], stub_calls: Any
+) -> None:
+    async def run() -> None:
+        client = make_client(github_stub[1])
+        try:
+            first = await client.get_user_data("bob")
+            assert await client.get_user_data("bob") is first
+            assert stub_calls == {"/user": 1, "/user/emails": 1}
+            await client.get_user_data("carol")
+            assert stub_calls == {"/user": 2, "/user/emails": 2}
+        finally:
+            await client.close()
+
+    asyncio.run(run())
+
+
+def test_cached_user_data_expires(
+    github_stub: tuple[Any, str], stub_calls: Any
+) -> None:
+    async def run() -> None:
+        client = make_client(github_stub[1], cache_ttl=0.1)
+        try:
+            await client.get_user_data("dave")
+            await asyncio.sleep(0.15)
+            await client.get_user_data("dave")
+        finally:
+            await client.close()
+        assert stub_calls == {"/user": 2, "/user/emails": 2}
+
+    asyncio.run(run())
+
+
+@pytest.mark.parametrize(("token", "status_code"), [("invalid", 401), ("broken", 502)])
+def test_maps_github_errors(
+    github_stub: tuple[Any, str], stub_calls: Any, token: str, status_code: int
+) -> None:
+    async def run() -> None:
+        client = make_client(github_stub[1])
+        try:
+            for _ in range(2):
+                with pytest.raises(HTTPException) as error:
+                    await client.get_user_data(token)
+                assert error.value.status_code == status_code
+        finally:
+            await client.close()
+        # Failures aren't cached
+        assert stub_calls["/user"] == 2
+
+    asyncio.run(run())
+
+
+def test_unreachable_github_is_a_502() -> None:
+    async def run() -> None:
+        client = make_client(f"http://127.0.0.1:{free_port()}")
+        try:
+            with pytest.raises(HTTPException) as error:
+                await client.get_user_data("erin")
+            assert error.value.status_code == 502
+        finally:
+            await client.close()
+
+    asyncio.run(run())
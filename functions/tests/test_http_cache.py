@@ -0,0 +1,122 @@
+import asyncio
+
+import pytest
+from fastapi import Request, Response
+from utils import http_cache
+from utils.compression import decode_etag, encode_etag
+from utils.http_cache import CollectionVersions, check_not_modified
+
+CACHE_CONTROL = "public, no-cache"
+
+
+@pytest.fixture(autouse=True)
+def versions(monkeypatch: pytest.MonkeyPatch) -> CollectionVersions:
+    versions = CollectionVersions()
+    monkeypatch.setattr(http_cache, "collection_versions", versions)
+    return versions
+
+
+def make_request(
+    path: str = "/v1/api/beers", query: str = "", if_none_match: str | None = None
+) -> Request:
+    headers = []
+    if if_none_match is not None:
+        headers.append((b"if-none-match", if_none_match.encode()))
+    return Request(
+        {
+            "type": "http",
+            "method": "GET",
+            "path": path,
+            "query_string": query.encode(),
+            "headers": headers,
+        }
+    )
+
+
+def check(request: Request) -> tuple[Response, Response | None]:
+    response = Response()
+    not_modified = asyncio.run(
+        check_not_modified(request, response, "beers", CACHE_CONTROL)
+    )
+    return response, not_modified
+
+
+def current_etag(path: str = "/v1/api/beers", query: str = "") -> str:
+    response, _ = check(make_request(path, query))
+    return response.headers["ETag"]
+
+
+def test_sets_caching_headers_without_if_none_match() -> None:
+    response, not_modified = check(make_request())
+    assert not_modified is None
+    assert response.headers["ETag"].startswith('"')
+    assert response.headers["Cache-Control"] == CACHE_CONTROL
+
+
+def test_etag_depends_on_path_and_query() -> None:
+    etags = {
+        current_etag(),
+        current_etag(query="limit=10"),
+        current_etag(path="/v1/api/beers/some-beer"),
+    }
+    assert len(etags) == 3
+    assert current_etag(query="limit=10") == current_etag(query="limit=10")
+
+
+def test_current_etag_is_not_modified() -> None:
+    etag = current_etag()
+    _, not_modified = check(make_request(if_none_match=etag))
+    assert not_modified is not None
+    assert not_modified.status_code == 304
+    assert not_modified.headers["ETag"] == etag
+    assert not_modified.headers["Cache-Control"] == CACHE_CONTROL
+
+
+def test_any_listed_etag_is_not_modified() -> None:
+    etag = current_etag()
+    _, not_modified = check(make_request(if_none_match=f'"other", {etag}'))
+    assert not_modified is not None and not_modified.status_code == 304
+
+
+def test_etag_of_compressed_response_is_not_modified() -> None:
+    etag = encode_etag(current_etag(), "gzip")
+    _, not_modified = check(make_request(if_none_match=etag))
+    assert not_modified is not None
+    assert not_modified.status_code == 304
+    # The client keeps the ETag of the encoding it has
+    assert not_modified.headers["ETag"] == etag
+
+
+def test_changed_collection_is_modified(versions: CollectionVersions) -> None:
+    etag = current_etag()
+    versions.bump("beers")
+    response, not_modified = check(make_request(if_none_match=etag))
+    assert not_modified is None
+    assert response.headers["ETag"] != etag
+
+
+def test_other_collection_changes_are_ignored(versions: CollectionVersions) -> None:
+    etag = current_etag()
+    versions.bump("users")
+    _, not_modified = check(make_request(if_none_match=etag))
+    assert not_modified is not None
+
+
+def test_wildcard_is_not_special_cased() -> None:
+    _, not_modified = check(
+        make_request(path="/v1/api/beers/missing", if_none_match="*")
+    )
+    assert not_modified is None
+
+
+def test_unknown_etag_is_modified() -> None:
+    _, not_modified = check(make_request(if_none_match='"0-unknown"'))
+    assert not_modified is None
+
+
+@pytest.mark.parametrize("encoding", ["gzip", "br"])
+def test_encoded_etags_decode(encoding: str) -> None:
+    etag = '"3-abcdef"'
+    assert encode_etag(etag, encoding) == f'"3-abcdef-{encoding}"'
+    assert decode_etag(encode_etag(etag, encoding)) == etag
+    assert decode_etag(etag) == etag
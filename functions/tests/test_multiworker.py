@@ -0,0 +1,103 @@
+import asyncio
+import re
+from pathlib import Path
+from typing import Any
+
+import httpx
+import pytest
+from benchmarks.load import ADMIN_PASSWORD, ADMIN_USERNAME, make_beer, seed
+from benchmarks.workers import start_server
+from db.sqlite import SQLiteDatabase
+
+WORKERS = 2
+READS = 20
+
+
+async def read_through_workers(
+    client: httpx.AsyncClient, path: str, **kwargs: Any
+) -> set[tuple[int, str | None, bytes]]:
+    """Read a path through many connections, so through all workers."""
+    responses = [await client.get(path, **kwargs) for _ in range(READS)]
+    return {
+        (response.status_code, response.headers.get("ETag"), response.content)
+        for response in responses
+    }
+
+
+def test_workers_agree_on_writes(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    # NOTE: The workers import the app from the `functions` directory
+    monkeypatch.chdir(Path(__file__).parents[1])
+    database_path = str(tmp_path / "workers.sqlite3")
+
+    async def run() -> None:
+        database = SQLiteDatabase(path=database_path)
+        await seed(database, 20)
+        await database.disconnect()
+
+        server, base_url = await start_server(WORKERS, database_path)
+        try:
+            # NOTE: No keep-alive, every request gets a connection (and a worker)
+            async with httpx.AsyncClient(
+                base_url=base_url,
+                limits=httpx.Limits(max_keepalive_connections=0),
+                timeout=30,
+            ) as client:
+                login = await client.post(
+                    "/v1/api/auth/token",
+                    data={"username": ADMIN_USERNAME, "password": ADMIN_PASSWORD},
+                )
+                headers = {"Authorization": login.json()["access_token"]}
+
+                process_ids = set()
+                for _ in range(5 * READS):
+                    metrics = await client.get("/v1/api/metrics", headers=headers)
+                    match = re.search(r"^process_id (\d+)", metrics.text, re.MULTILINE)
+                    assert match is not None
+                    process_ids.add(match.group(1))
+                    if len(process_ids) == WORKERS:
+                        break
+                assert len(process_ids) == WORKERS
+
+                before = await read_through_workers(
+                    client, "/v1/api/beers", params={"limit": 10}
+                )
+                assert len(before) == 1
+
+                beer = make_beer(0)
+                response = await client.post(
+                    "/v1/api/beers",
+                    json={key: beer[key] for key in ("name", "brewery_uuid", "abv")},
+                    headers=headers,
+                )
+                assert response.status_code == 200
+                beer_id = response.json()["uuid"]
+
+                reads = await read_through_workers(client, f"/v1/api/beers/{beer_id}")
+                assert len(reads) == 1
+                [(status_code, _, body)] = reads
+                assert status_code == 200
+                assert body == response.content
+
+                pages = await read_through_workers(
+                    client, "/v1/api/beers", params={"limit": 10}
+                )
+                assert len(pages) == 1
+                assert pages != before
+
+                response = await client.delete(
+                    f"/v1/api/beers/{beer_id}", headers=headers
+                )
+                assert response.status_code == 200
+                reads = await read_through_workers(client, f"/v1/api/beers/{beer_id}")
+                assert {status_code for status_code, _, _ in reads} == {404}
+                pages = await read_through_workers(
+                    client, "/v1/api/beers", params={"limit": 10}
+                )
+                assert len(pages) == 1
+        finally:
+            server.terminate()
+            server.wait()
+
+    asyncio.run(run())
@@ -0,0 +1,42 @@
+import asyncio
+from typing import AsyncContextManager, Callable
+
+from conftest import make_beer
+from db.base import Database
+
+
+def test_get_beers_after_pages_in_key_order(
+    open_database: Callable[[], AsyncContextManager[Database]]
+) -> None:
+    beers = [make_beer(f"Beer {index}") for index in range(250)]
+
+    async def run() -> None:
+        async with open_database() as database:
+            await database.create_beers(beers)
+            keys = []
+            key = None
+            while page := await database.get_beers_after(key=key, limit=40):
+                assert len(page) <= 40
+                keys += [beer["uuid"] for beer in page]
+                key = page[-1]["uuid"]
+            assert keys == sorted(beer["uuid"] for beer in beers)
+            assert [beer async for beer in database.iter_beers(batch_size=16)] == [
+                await database.get_beer_by_id(key) for key in keys
+            ]
+
+    asyncio.run(run())
+
+
+def test_get_beers_after_last_key_is_empty(
+    open_database: Callable[[], AsyncContextManager[Database]]
+) -> None:
+    beers = [make_beer(f"Beer {index}") for index in range(3)]
+
+    async def run() -> None:
+        async with open_database() as database:
+            assert await database.get_beers_after(limit=10) == []
+            await database.create_beers(beers)
+            last = max(beer["uuid"] for beer in beers)
+            assert await database.get_beers_after(key=last, limit=10) == []
+
+    asyncio.run(run())
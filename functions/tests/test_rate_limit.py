@@ -0,0 +1,143 @@
+import asyncio
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException, Request
+from utils import rate_limit
+from utils.rate_limit import MemoryRateLimitStore, RateLimiter, get_client_ip
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch: pytest.MonkeyPatch) -> Clock:
+    clock = Clock()
+    monkeypatch.setattr(rate_limit, "time", SimpleNamespace(monotonic=clock))
+    return clock
+
+
+def make_limiter(
+    ip_rate: float = 60, username_rate: float = 60, burst: float = 3
+) -> RateLimiter:
+    return RateLimiter(
+        store=MemoryRateLimitStore(),
+        ip_rate=ip_rate,
+        username_rate=username_rate,
+        burst=burst,
+        max_concurrency=2,
+    )
+
+
+def is_limited(limiter: RateLimiter, ip: str, username: str | None = None) -> bool:
+    try:
+        asyncio.run(limiter.check(ip, username))
+    except HTTPException as error:
+        assert error.status_code == 429
+        return True
+    return False
+
+
+def test_allows_a_burst_then_limits(clock: Clock) -> None:
+    limiter = make_limiter(burst=3)
+    assert [is_limited(limiter, "1.1.1.1") for _ in range(4)] == [
+        False,
+        False,
+        False,
+        True,
+    ]
+    assert limiter.metrics()["rate_limited"] == 1
+
+
+def test_refills_at_the_rate(clock: Clock) -> None:
+    limiter = make_limiter(ip_rate=60, burst=1)
+    assert not is_limited(limiter, "1.1.1.1")
+    assert is_limited(limiter, "1.1.1.1")
+    clock.now += 0.5
+    assert is_limited(limiter, "1.1.1.1")
+    clock.now += 1
+    assert not is_limited(limiter, "1.1.1.1")
+
+
+def test_refills_up_to_the_burst(clock: Clock) -> None:
+    limiter = make_limiter(burst=2)
+    clock.now += 3600
+    assert [is_limited(limiter, "1.1.1.1") for _ in range(3)] == [False, False, True]
+
+
+def test_retry_after_is_the_wait_for_a_token(clock: Clock) -> None:
+    limiter = make_limiter(ip_rate=6, burst=1)
+    asyncio.run(limiter.check("1.1.1.1"))
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(limiter.check("1.1.1.1"))
+    assert error.value.headers == {"Retry-After": "11"}
+
+
+def test_limits_every_ip_on_its_own(clock: Clock) -> None:
+    limiter = make_limiter(burst=1)
+    assert not is_limited(limiter, "1.1.1.1")
+    assert is_limited(limiter, "1.1.1.1")
+    assert not is_limited(limiter, "2.2.2.2")
+
+
+def test_limits_usernames_over_all_ips(clock: Clock) -> None:
+    limiter = make_limiter(ip_rate=60, username_rate=60, burst=2)
+    assert not is_limited(limiter, "1.1.1.1", "JohnDoe")
+    assert not is_limited(limiter, "2.2.2.2", "johndoe")
+    assert is_limited(limiter, "3.3.3.3", "johndoe")
+    assert not is_limited(limiter, "3.3.3.3", "janedoe")
+
+
+def test_store_drops_least_recently_used_buckets(clock: Clock) -> None:
+    store = MemoryRateLimitStore(max_keys=2)
+    assert asyncio.run(store.take("a", rate=1, capacity=1)) == 0
+    assert asyncio.run(store.take("a", rate=1, capacity=1)) > 0
+    asyncio.run(store.take("b", rate=1, capacity=1))
+    asyncio.run(store.take("c", rate=1, capacity=1))
+    # "a" was dropped, so its bucket is full again
+    assert asyncio.run(store.take("a", rate=1, capacity=1)) == 0
+
+
+def test_guard_caps_concurrent_requests() -> None:
+    limiter = make_limiter()
+    guard = asynccontextmanager(limiter.guard)
+
+    async def run() -> None:
+        async with guard(), guard():
+            assert limiter.metrics()["in_flight"] == 2
+            with pytest.raises(HTTPException) as error:
+                async with guard():
+                    pass
+            assert error.value.status_code == 503
+        assert limiter.metrics()["in_flight"] == 0
+        assert limiter.metrics()["concurrency_rejected"] == 1
+
+    asyncio.run(run())
+
+
+def make_request(forwarded_for: str | None) -> Request:
+    headers = []
+    if forwarded_for is not None:
+        headers.append((b"x-forwarded-for", forwarded_for.encode()))
+    return Request({"type": "http", "headers": headers, "client": ("10.0.0.1", 1234)})
+
+
+def test_client_ip_ignores_forwarded_for_without_proxies() -> None:
+    assert get_client_ip(make_request("6.6.6.6")) == "10.0.0.1"
+    assert get_client_ip(make_request(None), trusted_proxy_hops=1) == "10.0.0.1"
+
+
+@pytest.mark.parametrize(
+    ("hops", "expected"), [(1, "1.2.3.4"), (2, "5.6.7.8"), (5, "6.6.6.6")]
+)
+def test_client_ip_is_added_by_the_first_trusted_proxy(
+    hops: int, expected: str
+) -> None:
+    request = make_request("6.6.6.6, 5.6.7.8, 1.2.3.4")
+    assert get_client_ip(request, trusted_proxy_hops=hops) == expected
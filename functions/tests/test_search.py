@@ -0,0 +1,103 @@
+import asyncio
+import random
+from typing import Any, AsyncContextManager, Callable
+
+import pytest
+from conftest import make_beer
+from db.base import Database
+
+BREWERIES = [f"00000000-0000-0000-0000-00000000000{index}" for index in range(5)]
+WORDS = ["Pale", "Stout", "Porter", "Lager", "Sour", "Zwickel", "Tripel"]
+
+FILTERS: list[dict[str, Any]] = [
+    {},
+    {"brewery_uuid": BREWERIES[0]},
+    {"brewery_uuid": "missing"},
+    {"min_abv": 8.0},
+    {"max_abv": 4.5},
+    {"min_abv": 5.0, "max_abv": 6.0},
+    {"min_abv": 7.0, "max_abv": 6.0},
+    {"name": "stout"},
+    {"name": "OUT"},
+    {"name": "Stout 1"},
+    {"name": "no such beer"},
+    {"brewery_uuid": BREWERIES[1], "min_abv": 6.5},
+    {"brewery_uuid": BREWERIES[2], "name": "lager", "max_abv": 9.0},
+]
+
+
+def make_beers(count: int) -> list[dict[str, Any]]:
+    random.seed(0)
+    return [
+        make_beer(
+            f"{random.choice(WORDS)} {index}",
+            brewery_uuid=random.choice(BREWERIES),
+            abv=random.randrange(6, 25) / 2,
+        )
+        for index in range(count)
+    ]
+
+
+def matches(beer: dict[str, Any], filters: dict[str, Any]) -> bool:
+    if "brewery_uuid" in filters and beer["brewery_uuid"] != filters["brewery_uuid"]:
+        return False
+    if "min_abv" in filters and beer["abv"] < filters["min_abv"]:
+        return False
+    if "max_abv" in filters and beer["abv"] > filters["max_abv"]:
+        return False
+    return filters.get("name", "").lower() in beer["name"].lower()
+
+
+async def page_through(
+    database: Database, filters: dict[str, Any], limit: int
+) -> list[list[str]]:
+    pages = []
+    key = None
+    while True:
+        beers = await database.search_beers(**filters, key=key, limit=limit)
+        pages.append([beer["uuid"] for beer in beers])
+        if len(beers) < limit:
+            return pages
+        key = beers[-1]["uuid"]
+
+
+@pytest.mark.parametrize("filters", FILTERS, ids=repr)
+def test_search_beers_pages_through_matches(
+    open_database: Callable[[], AsyncContextManager[Database]],
+    filters: dict[str, Any],
+) -> None:
+    beers = make_beers(300)
+    expected = sorted(beer["uuid"] for beer in beers if matches(beer, filters))
+
+    async def run() -> None:
+        async with open_database() as database:
+            await database.create_beers(beers)
+            for limit in (1, 7, 1000):
+                pages = await page_through(database, filters, limit)
+                assert all(len(page) <= limit for page in pages)
+                assert [key for page in pages for key in page] == expected
+
+    asyncio.run(run())
+
+
+def test_search_beers_sees_writes(
+    open_database: Callable[[], AsyncContextManager[Database]]
+) -> None:
+    beers = make_beers(50)
+
+    async def run() -> None:
+        async with open_database() as database:
+            await database.create_beers(beers)
+            beer = make_beer("Brand New Stout", brewery_uuid=BREWERIES[3], abv=13.0)
+            await database.create_beer(beer)
+            found = await database.search_beers(name="brand new", min_abv=12.5)
+            assert found == [beer]
+
+            await database.delete_beer_by_id(beer["uuid"])
+            assert await database.search_beers(name="brand new", min_abv=12.5) == []
+            remaining = await page_through(database, {"min_abv": 3.0}, 10)
+            assert [key for page in remaining for key in page] == sorted(
+                beer["uuid"] for beer in beers
+            )
+
+    asyncio.run(run())
@@ -0,0 +1,74 @@
+import asyncio
+from typing import Any
+
+from conftest import make_beer
+from db.dummy import DummyUserDatabase
+from utils.http_cache import CollectionVersions
+from utils.singleflight import SingleFlight
+
+
+class SlowReadDatabase(DummyUserDatabase):
+    """Read pages of beers at once, but return them only once `reads` is
+    set, like a read that spans a write."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.read = asyncio.Event()
+        self.reads = asyncio.Event()
+
+    async def get_beers_after(
+        self, key: str | None = None, limit: int = 100
+    ) -> list[dict[str, Any]]:
+        beers = await super().get_beers_after(key, limit)
+        self.read.set()
+        await self.reads.wait()
+        return beers
+
+
+def open_database() -> tuple[SlowReadDatabase, SingleFlight, CollectionVersions]:
+    database = SlowReadDatabase()
+    versions = CollectionVersions()
+    versions.watch(database)
+    single_flight = SingleFlight()
+    single_flight.wrap(database, names=["get_beers_after"], scope=versions.seen)
+    return database, single_flight, versions
+
+
+async def read_page(
+    database: SlowReadDatabase, versions: CollectionVersions
+) -> tuple[tuple[str, int], list[dict[str, Any]]]:
+    """Read the version of the beers (like for the ETag), then a page."""
+    version = await versions.current("beers")
+    return version, await database.get_beers_after()
+
+
+def test_identical_reads_are_coalesced() -> None:
+    async def run() -> None:
+        database, single_flight, versions = open_database()
+        first = asyncio.create_task(read_page(database, versions))
+        await database.read.wait()
+        second = asyncio.create_task(read_page(database, versions))
+        await asyncio.sleep(0)
+        database.reads.set()
+        assert await first == await second
+        assert single_flight.coalesced["get_beers_after"] == 1
+
+    asyncio.run(run())
+
+
+def test_reads_after_a_write_dont_share_reads_from_before() -> None:
+    async def run() -> None:
+        database, single_flight, versions = open_database()
+        before = asyncio.create_task(read_page(database, versions))
+        await database.read.wait()
+        beer = make_beer("Beer")
+        await database.create_beer(beer)
+        after = asyncio.create_task(read_page(database, versions))
+        await asyncio.sleep(0)
+        database.reads.set()
+
+        assert (await before) == ((versions.epoch, 0), [])
+        assert (await after) == ((versions.epoch, 1), [beer])
+        assert single_flight.coalesced["get_beers_after"] == 0
+
+    asyncio.run(run())
@@ -0,0 +1,42 @@
+import asyncio
+import os
+import sqlite3
+import threading
+from typing import Any
+
+from db.sqlite import SQLiteDatabase
+
+
+def test_cancelled_calls_hold_their_connection_until_done(tmp_path: Any) -> None:
+    database = SQLiteDatabase(path=os.path.join(tmp_path, "test.sqlite3"), pool_size=1)
+    release = threading.Event()
+    used_by = []
+
+    def use(name: str) -> Any:
+        def call(connection: sqlite3.Connection) -> None:
+            used_by.append(name)
+            release.wait()
+            connection.execute("SELECT 1").fetchone()
+            used_by.append(name)
+
+        return call
+
+    async def run() -> None:
+        await database.connect()
+        try:
+            running = asyncio.create_task(database._run(use("cancelled")))
+            await asyncio.sleep(0.01)
+            running.cancel()
+            waiting = asyncio.create_task(database._run(use("next")))
+            await asyncio.sleep(0.01)
+            # The cancelled call goes on in its thread, with the connection
+            assert used_by == ["cancelled"]
+            release.set()
+            await waiting
+            assert used_by == ["cancelled", "cancelled", "next", "next"]
+            assert running.cancelled()
+        finally:
+            release.set()
+            await database.disconnect()
+
+    asyncio.run(run())
@@ -0,0 +1,68 @@
+import asyncio
+from typing import Any, AsyncIterator
+
+import pytest
+from utils.streaming import iter_lines, iter_records
+
+
+async def chunked(data: bytes, size: int) -> AsyncIterator[bytes]:
+    for start in range(0, len(data), size):
+        yield data[start : start + size]
+
+
+def lines(text: str, size: int) -> list[str]:
+    async def run() -> list[str]:
+        return [line async for line in iter_lines(chunked(text.encode(), size))]
+
+    return asyncio.run(run())
+
+
+def records(
+    text: str, csv_format: bool, size: int = 1024
+) -> list[tuple[int, dict[str, Any] | None]]:
+    async def run() -> list[tuple[int, dict[str, Any] | None]]:
+        return [
+            record
+            async for record in iter_records(
+                iter_lines(chunked(text.encode(), size)), csv_format=csv_format
+            )
+        ]
+
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize("size", [1, 2, 1024])
+def test_iter_lines_splits_on_newlines_only(size: int) -> None:
+    text = "a b\x1cc\x85\r\né\r\r\n\nlast"
+    assert lines(text, size) == ["a b\x1cc\x85", "é\r", "", "last"]
+
+
+def test_iter_lines_strips_carriage_return_of_last_line() -> None:
+    assert lines("a\nb\r", 1024) == ["a", "b"]
+
+
+def test_iter_records_parses_ndjson() -> None:
+    text = '{"name": "a b"}\n\n[1]\nnot json\n{"name": "c"}'
+    assert records(text, csv_format=False) == [
+        (1, {"name": "a b"}),
+        (2, None),
+        (3, None),
+        (4, {"name": "c"}),
+    ]
+
+
+@pytest.mark.parametrize("size", [1, 3, 1024])
+def test_iter_records_parses_csv_fields_over_lines(size: int) -> None:
+    text = 'name,abv\r\n"Multi\nline\n\nname",5\r\n\r\n"A ""quoted"", name",6\nlast,7'
+    assert records(text, csv_format=True, size=size) == [
+        (1, {"name": "Multi\nline\n\nname", "abv": "5"}),
+        (2, {"name": 'A "quoted", name', "abv": "6"}),
+        (3, {"name": "last", "abv": "7"}),
+    ]
+
+
+def test_iter_records_rejects_unclosed_csv_field() -> None:
+    assert records('name,abv\nok,5\n"never closed,6\nmore,7\n', csv_format=True) == [
+        (1, {"name": "ok", "abv": "5"}),
+        (2, None),
+    ]
@@ -0,0 +1,64 @@
+import asyncio
+import threading
+
+import pytest
+from fastapi import HTTPException
+from utils.workers import BoundedWorkerPool
+
+
+def test_runs_calls_in_workers() -> None:
+    pool = BoundedWorkerPool(max_workers=2, max_queue_size=2)
+    try:
+        assert asyncio.run(pool.run(sum, [1, 2, 3])) == 6
+        assert pool.metrics()["completed"] == 1
+        assert pool.metrics()["in_flight"] == 0
+    finally:
+        pool.shutdown()
+
+
+def test_rejects_calls_beyond_the_queue() -> None:
+    pool = BoundedWorkerPool(max_workers=1, max_queue_size=1)
+    release = threading.Event()
+
+    async def run() -> None:
+        calls = [asyncio.create_task(pool.run(release.wait)) for _ in range(2)]
+        await asyncio.sleep(0)
+        with pytest.raises(HTTPException) as error:
+            await pool.run(release.wait)
+        assert error.value.status_code == 503
+        release.set()
+        await asyncio.gather(*calls)
+
+    try:
+        asyncio.run(run())
+        assert pool.metrics()["rejected"] == 1
+    finally:
+        release.set()
+        pool.shutdown()
+
+
+def test_cancelled_calls_hold_their_slot_until_done() -> None:
+    pool = BoundedWorkerPool(max_workers=1, max_queue_size=1)
+    release = threading.Event()
+
+    async def run() -> None:
+        running = asyncio.create_task(pool.run(release.wait))
+        queued = asyncio.create_task(pool.run(release.wait))
+        await asyncio.sleep(0.01)
+        running.cancel()
+        queued.cancel()
+        await asyncio.sleep(0.01)
+        # The running call goes on in its worker, the queued one never runs
+        assert pool.metrics()["in_flight"] == 1
+        release.set()
+        for _ in range(100):
+            if not pool.metrics()["in_flight"]:
+                break
+            await asyncio.sleep(0.01)
+        assert pool.metrics()["in_flight"] == 0
+
+    try:
+        asyncio.run(run())
+    finally:
+        release.set()
+        pool.shutdown()
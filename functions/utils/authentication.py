@@ -1,18 +1,97 @@
+import asyncio
+import hashlib
+import json
+import uuid
 from datetime import datetime, timedelta
-from typing import Annotated
+from functools import cache
+from typing import TYPE_CHECKING, Annotated, Any
 
 from db.base import Database
+from db.events import ChangeEvent
 from exceptions import inactive_user_exception, unauthorized_exception
-from fastapi import Depends
+from fastapi import Depends, HTTPException
 from fastapi.security.api_key import APIKeyHeader
-from jose import JWTError, jwt
 from models import TokenData, User, UserInDB
-from passlib.context import CryptContext
 
-from utils.constants import ALGORITHM, SECRET_KEY, database
+from utils.constants import (
+    ALGORITHM,
+    PASSWORD_HASH_PROFILE,
+    PASSWORD_HASH_PROFILES,
+    PASSWORD_HASH_QUEUE_SIZE,
+    PASSWORD_HASH_USE_PROCESSES,
+    PASSWORD_HASH_WORKERS,
+    SECRET_KEY,
+    TOKEN_CACHE_SIZE,
+    TOKEN_CACHE_TTL,
+    TOKEN_FORMAT,
+    database,
+)
+from utils.cache import TTLCache
+from utils.metrics import metrics
+from utils.workers import BoundedWorkerPool
+
+# NOTE: jose and passlib (and their crypto backends) are imported on first
+# use, to keep them out of the cold start of the app
+if TYPE_CHECKING:
+    from passlib.context import CryptContext
+
+
+@cache
+def get_password_context(profile: str = PASSWORD_HASH_PROFILE) -> "CryptContext":
+    """Get the password context of a hashing profile, for hashing and
+    verifying passwords, created on first use.
 
-# Create a password context for hashing and verifying passwords
-password_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+    Args:
+        profile (str): The name of the profile. Defaults to the configured
+            profile.
+    """
+    from passlib.context import CryptContext
+
+    return CryptContext(**PASSWORD_HASH_PROFILES[profile], deprecated="auto")
+
+
+# Hashing and verifying passwords is slow on purpose, run it off the event loop
+password_hash_pool = BoundedWorkerPool(
+    max_workers=PASSWORD_HASH_WORKERS,
+    max_queue_size=PASSWORD_HASH_QUEUE_SIZE,
+    use_processes=PASSWORD_HASH_USE_PROCESSES,
+)
+
+# Cache the users resolved from verified tokens, keyed by token digest
+token_cache: TTLCache[str, User] = TTLCache(
+    max_size=TOKEN_CACHE_SIZE, ttl=TOKEN_CACHE_TTL
+)
+
+metrics.add_collector("password_hash_pool", password_hash_pool.metrics)
+metrics.add_collector("token_cache", token_cache.metrics)
+
+
+class UserVersions:
+    """Count the changes to every user, so the users carried by tokens can
+    be checked for changes in memory.
+
+    The counters live in memory, so every instance also gets a random
+    epoch: the versions in tokens issued by another instance (or before a
+    restart) never match.
+    """
+
+    def __init__(self) -> None:
+        self.epoch = uuid.uuid4().hex[:8]
+        self._versions: dict[str, int] = {}
+
+    def get(self, username: str) -> str:
+        """Get the current version of a user."""
+        return f"{self.epoch}.{self._versions.get(username, 0)}"
+
+    def bump(self, username: str) -> None:
+        """Mark a user as changed."""
+        self._versions[username] = self._versions.get(username, 0) + 1
+
+
+user_versions = UserVersions()
+
+# The users whose password hash is being upgraded, and the upgrade tasks
+_rehash_tasks: dict[str, asyncio.Task] = {}
 
 # Extract the API key (JWT token) from the request header
 jwt_header = APIKeyHeader(name="Authorization", scheme_name="JWT")
@@ -50,22 +129,53 @@ async def authenticate_user(
     user = await get_user(database, username)
     if user is None:
         return None
-    if not password_correct(password, user.hashed_password):
+    with metrics.span("password_correct"):
+        correct, needs_update = await password_hash_pool.run(
+            verify_password, password, user.hashed_password
+        )
+    if not correct:
         return None
+    if needs_update and user.username not in _rehash_tasks:
+        task = asyncio.create_task(rehash_password(database, user.username, password))
+        _rehash_tasks[user.username] = task
+        task.add_done_callback(lambda _: _rehash_tasks.pop(user.username, None))
     return User(**user.dict())
 
 
-def password_correct(plain_password: str, hashed_password: str) -> bool:
-    """Check if a plain password matches a hashed password.
+def verify_password(plain_password: str, hashed_password: str) -> tuple[bool, bool]:
+    """Check if a plain password matches a hashed password, and if the hash
+    should be upgraded to the current hashing profile.
 
     Args:
         plain_password (str): The plain password to check.
         hashed_password (str): The hashed password to check.
 
     Returns:
-        bool: True if the passwords match, False otherwise.
+        tuple[bool, bool]: True if the passwords match, False otherwise,
+            and True if the hash is outdated, False otherwise.
+    """
+    password_context = get_password_context()
+    if not password_context.verify(plain_password, hashed_password):
+        return False, False
+    return True, password_context.needs_update(hashed_password)
+
+
+async def rehash_password(database: Database, username: str, password: str) -> None:
+    """Hash a (verified) password with the current hashing profile and
+    store the new hash, in the background after a login. Skipped (until
+    the next login) when the hashing pool is busy.
+
+    Args:
+        database (Database): The database of the user.
+        username (str): The username of the user.
+        password (str): The plain password of the user.
     """
-    return password_context.verify(plain_password, hashed_password)
+    with metrics.span("password_rehash"):
+        try:
+            hashed_password = await password_hash_pool.run(get_password_hash, password)
+        except HTTPException:
+            return
+        await database.update_user_password(username, hashed_password)
 
 
 def get_password_hash(password: str) -> str:
@@ -77,7 +187,27 @@ def get_password_hash(password: str) -> str:
     Returns:
         str: The hashed password.
     """
-    return password_context.hash(password)
+    return get_password_context().hash(password)
+
+
+def get_token_data(
+    user: User | UserInDB, version: str, token_format: str = TOKEN_FORMAT
+) -> dict[str, Any]:
+    """Get the data to encode in an access token for a user.
+
+    Args:
+        user (User | UserInDB): The user.
+        version (str): The version of the user, read before the user.
+        token_format (str): "reference" for just the username, "claims" to
+            add the user and its version. Defaults to the configured format.
+
+    Returns:
+        dict[str, Any]: The data of the token.
+    """
+    if token_format != "claims":
+        return {"sub": user.username}
+    claims = json.loads(User(**user.dict()).json())
+    return {"sub": user.username, "ver": version, "user": claims}
 
 
 def create_access_token(data: dict, expires_delta: timedelta | None = None) -> str:
@@ -92,6 +222,8 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None) -> s
     Returns:
         str: The encoded access token.
     """
+    from jose import jwt
+
     to_encode = data.copy()
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
@@ -102,6 +234,7 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None) -> s
     return encoded_jwt
 
 
+@metrics.timed("get_current_user")
 async def get_current_user(token: Annotated[str, Depends(jwt_header)]) -> User:
     """Get the currently authenticated user.
 
@@ -112,8 +245,16 @@ async def get_current_user(token: Annotated[str, Depends(jwt_header)]) -> User:
         credentials_exception: Raised if the token is invalid.
 
     Returns:
-        User: The user retrieved from the database.
+        User: The user retrieved from the database, or from the token (if
+            it carries the current version of the user) or the token cache.
     """
+    token_key = hashlib.sha256(token.encode()).hexdigest()
+    cached_user = token_cache.get(token_key)
+    if cached_user is not None:
+        return cached_user
+
+    from jose import JWTError, jwt
+
     credentials_exception = unauthorized_exception
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
@@ -125,10 +266,38 @@ async def get_current_user(token: Annotated[str, Depends(jwt_header)]) -> User:
             raise credentials_exception
     except JWTError:
         raise credentials_exception
-    user = await get_user(database=database, username=token_data.username)
-    if user is None:
-        raise credentials_exception
-    return User(**user.dict())
+    claims = payload.get("user")
+    if claims is not None and payload.get("ver") == user_versions.get(username):
+        current_user = User(**claims)
+    else:
+        user = await get_user(database=database, username=token_data.username)
+        if user is None:
+            raise credentials_exception
+        current_user = User(**user.dict())
+    token_cache.set(
+        token_key, current_user, expires_at=payload.get("exp"), tag=username
+    )
+    return current_user
+
+
+def invalidate_user(username: str) -> None:
+    """Evict all cached tokens of a user, and stop trusting the user
+    carried by its tokens, for example when the user is disabled or
+    deleted.
+
+    Args:
+        username (str): The username of the user to evict.
+    """
+    token_cache.invalidate_tag(username)
+    user_versions.bump(username)
+
+
+def _invalidate_changed_user(event: ChangeEvent) -> None:
+    if event.collection == "users":
+        invalidate_user(event.key)
+
+
+database.changes.subscribe(_invalidate_changed_user)
 
 
 async def get_current_active_user(
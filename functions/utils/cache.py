@@ -0,0 +1,113 @@
+import time
+from collections import OrderedDict
+from typing import Generic, Hashable, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class TTLCache(Generic[K, V]):
+    """A bounded LRU cache where every entry expires at a given time.
+
+    Entries can be tagged (for example with a username) so all entries
+    for a tag can be evicted at once.
+
+    Args:
+        max_size (int): The maximum number of entries in the cache. The
+            least recently used entry is evicted when the cache is full.
+        ttl (float): The maximum time (in seconds) to keep an entry.
+    """
+
+    def __init__(self, max_size: int, ttl: float) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[K, tuple[V, float, Hashable | None]] = OrderedDict()
+        self._tags: dict[Hashable, set[K]] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: K) -> V | None:
+        """Get an entry from the cache.
+
+        Args:
+            key (K): The key of the entry.
+
+        Returns:
+            V | None: The cached value, or None if there is no (unexpired)
+                entry for the key.
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        value, expires_at, _ = entry
+        if expires_at <= time.time():
+            self.delete(key)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(
+        self,
+        key: K,
+        value: V,
+        expires_at: float | None = None,
+        tag: Hashable | None = None,
+    ) -> None:
+        """Add an entry to the cache.
+
+        Args:
+            key (K): The key of the entry.
+            value (V): The value to cache.
+            expires_at (float | None): The (epoch) time at which the entry
+                expires. Capped to the TTL of the cache. Defaults to None,
+                in which case the TTL of the cache is used.
+            tag (Hashable | None): An optional tag to evict the entry by.
+        """
+        max_expires_at = time.time() + self.ttl
+        if expires_at is None or expires_at > max_expires_at:
+            expires_at = max_expires_at
+        self.delete(key)
+        self._entries[key] = (value, expires_at, tag)
+        if tag is not None:
+            self._tags.setdefault(tag, set()).add(key)
+        while len(self._entries) > self.max_size:
+            self.delete(next(iter(self._entries)))
+
+    def delete(self, key: K) -> None:
+        """Remove an entry from the cache (if it exists).
+
+        Args:
+            key (K): The key of the entry.
+        """
+        entry = self._entries.pop(key, None)
+        if entry is None or entry[2] is None:
+            return
+        keys = self._tags.get(entry[2])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._tags[entry[2]]
+
+    def invalidate_tag(self, tag: Hashable) -> None:
+        """Remove all entries with the given tag from the cache.
+
+        Args:
+            tag (Hashable): The tag of the entries to remove.
+        """
+        for key in list(self._tags.get(tag, ())):
+            self.delete(key)
+
+    def metrics(self) -> dict[str, float]:
+        """Get the size, hits and misses of the cache."""
+        return {"size": len(self), "hits": self.hits, "misses": self.misses}
+
+    def clear(self) -> None:
+        """Remove all entries from the cache."""
+        self._entries.clear()
+        self._tags.clear()
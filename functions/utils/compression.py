@@ -0,0 +1,231 @@
+import zlib
+from typing import Protocol
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from utils.cache import TTLCache
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+
+class _Compressor(Protocol):
+    def compress(self, data: bytes) -> bytes:
+        ...
+
+    def finish(self) -> bytes:
+        ...
+
+
+class _GzipCompressor:
+    def __init__(self, level: int) -> None:
+        self._compressor = zlib.compressobj(level, wbits=zlib.MAX_WBITS | 16)
+
+    def compress(self, data: bytes) -> bytes:
+        # NOTE: Flush every chunk, so clients can decompress as it streams
+        return self._compressor.compress(data) + self._compressor.flush(
+            zlib.Z_SYNC_FLUSH
+        )
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+
+class _BrotliCompressor:
+    def __init__(self, quality: int) -> None:
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data) + self._compressor.flush()
+
+    def finish(self) -> bytes:
+        return self._compressor.finish()
+
+
+def negotiate_encoding(accept_encoding: str) -> str | None:
+    """Pick the content encoding of a response from the Accept-Encoding
+    header of the request.
+
+    Args:
+        accept_encoding (str): The value of the Accept-Encoding header.
+
+    Returns:
+        str | None: "br" (if brotli is installed) or "gzip", whichever the
+            client prefers (brotli on a tie), or None if it accepts
+            neither.
+    """
+    qualities: dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        coding, *params = part.split(";")
+        quality = 1.0
+        for param in params:
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0
+        qualities[coding.strip().lower()] = quality
+    encodings = ["br", "gzip"] if brotli is not None else ["gzip"]
+    encoding = max(
+        encodings, key=lambda encoding: qualities.get(encoding, qualities.get("*", 0))
+    )
+    return encoding if qualities.get(encoding, qualities.get("*", 0)) > 0 else None
+
+
+def encode_etag(etag: str, encoding: str) -> str:
+    """Get the ETag of a response compressed with some encoding, which
+    differs from the ETag of the response as is (and of its other
+    encodings).
+
+    Args:
+        etag (str): The (strong) ETag of the response.
+        encoding (str): The content encoding of the compressed response.
+
+    Returns:
+        str: The ETag with the encoding as a suffix.
+    """
+    if not etag.endswith('"'):
+        return etag
+    return f'{etag[:-1]}-{encoding}"'
+
+
+def decode_etag(etag: str) -> str:
+    """Get the ETag of a response as is, from the ETag of the response
+    compressed with any encoding (or of the response itself).
+
+    Args:
+        etag (str): The ETag, like from an If-None-Match header.
+
+    Returns:
+        str: The ETag without the encoding suffix.
+    """
+    for encoding in ("br", "gzip"):
+        suffix = f'-{encoding}"'
+        if etag.endswith(suffix):
+            return f'{etag[: -len(suffix)]}"'
+    return etag
+
+
+def _compressible(content_type: str) -> bool:
+    media_type = content_type.partition(";")[0].strip().lower()
+    return media_type.startswith("text/") or media_type.endswith("json")
+
+
+class CompressionMiddleware:
+    """Compress the text and JSON responses with brotli or gzip, as
+    negotiated through the Accept-Encoding header of the request.
+
+    Responses that are already encoded (like compressed exports) are left
+    alone, and so are responses smaller than `minimum_size`. Responses
+    with an ETag are compressed once: the compressed body is cached by
+    ETag and encoding, so unchanged pages aren't compressed again.
+    Streamed responses are compressed chunk by chunk.
+
+    Args:
+        app (ASGIApp): The app to wrap.
+        minimum_size (int): The size (in bytes) from which responses are
+            compressed. Defaults to 1024.
+        cache (TTLCache | None): The cache of compressed bodies. Defaults
+            to None, for no cache.
+        gzip_level (int): The gzip compression level. Defaults to 6.
+        brotli_quality (int): The brotli quality. Defaults to 4.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = 1024,
+        cache: TTLCache[tuple[str, str, int], bytes] | None = None,
+        gzip_level: int = 6,
+        brotli_quality: int = 4,
+    ) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+        self.cache = cache
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    def _compressor(self, encoding: str) -> _Compressor:
+        if encoding == "br":
+            return _BrotliCompressor(self.brotli_quality)
+        return _GzipCompressor(self.gzip_level)
+
+    def _compress(self, encoding: str, body: bytes, etag: str | None) -> bytes:
+        """Compress a whole body, or get it from the cache."""
+        key = (etag, encoding, len(body)) if etag is not None else None
+        if key is not None and self.cache is not None:
+            compressed = self.cache.get(key)
+            if compressed is not None:
+                return compressed
+        if encoding == "br":
+            compressed = brotli.compress(body, quality=self.brotli_quality)
+        else:
+            compressor = zlib.compressobj(self.gzip_level, wbits=zlib.MAX_WBITS | 16)
+            compressed = compressor.compress(body) + compressor.flush()
+        if key is not None and self.cache is not None:
+            self.cache.set(key, compressed)
+        return compressed
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] == "HEAD":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        start_message: Message | None = None
+        compressor: _Compressor | None = None
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal start_message, compressor
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                if "content-encoding" in headers or not _compressible(
+                    headers.get("content-type", "")
+                ):
+                    await send(message)
+                    return
+                MutableHeaders(scope=message).add_vary_header("Accept-Encoding")
+                # NOTE: Hold the start until the body shows whether to compress
+                start_message = message
+                return
+            if message["type"] != "http.response.body" or (
+                start_message is None and compressor is None
+            ):
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if compressor is not None:
+                body = compressor.compress(body)
+                if not more_body:
+                    body += compressor.finish()
+                await send({**message, "body": body})
+                return
+
+            assert start_message is not None
+            response_start, start_message = start_message, None
+            headers = MutableHeaders(scope=response_start)
+            if encoding is None or not more_body and len(body) < self.minimum_size:
+                await send(response_start)
+                await send(message)
+                return
+            headers["Content-Encoding"] = encoding
+            etag = headers.get("etag")
+            if etag is not None:
+                headers["ETag"] = encode_etag(etag, encoding)
+            if more_body:
+                compressor = self._compressor(encoding)
+                del headers["Content-Length"]
+                body = compressor.compress(body)
+            else:
+                body = self._compress(encoding, body, etag)
+                headers["Content-Length"] = str(len(body))
+            await send(response_start)
+            await send({**message, "body": body})
+
+        await self.app(scope, receive, send_wrapper)
@@ -1,9 +1,171 @@
+import os
+from typing import Any
+
+from db.base import Database
+from db.columnar import ColumnarDatabase
 from db.dummy import DummyUserDatabase
+from db.sqlite import SQLiteDatabase
+from db.write_behind import WriteBehind
+
+from utils.http_cache import collection_versions
+from utils.metrics import metrics
+from utils.singleflight import SingleFlight
 
 # Authentication related constants
 SECRET_KEY = "09d25e094faa6ca2556c818166b7a9563b93f7099f6f0f4caa6cf63b88e8d3e7"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
+# "reference" tokens only carry the username, "claims" tokens also carry the
+# (signed) user, so verifying them doesn't read the database
+TOKEN_FORMAT = os.environ.get("TOKEN_FORMAT", "reference")
+
+# Verified token cache
+TOKEN_CACHE_SIZE = int(os.environ.get("TOKEN_CACHE_SIZE", 1024))
+TOKEN_CACHE_TTL = float(os.environ.get("TOKEN_CACHE_TTL", 60))
+
+# Github API client
+GITHUB_API_URL = os.environ.get("GITHUB_API_URL", "https://api.github.com")
+GITHUB_TIMEOUT = float(os.environ.get("GITHUB_TIMEOUT", 5))
+GITHUB_MAX_CONNECTIONS = int(os.environ.get("GITHUB_MAX_CONNECTIONS", 20))
+GITHUB_USER_CACHE_TTL = float(os.environ.get("GITHUB_USER_CACHE_TTL", 30))
+
+# Rate limits (per minute) and concurrency cap of the login endpoints
+AUTH_RATE_LIMIT_PER_IP = float(os.environ.get("AUTH_RATE_LIMIT_PER_IP", 30))
+AUTH_RATE_LIMIT_PER_USERNAME = float(os.environ.get("AUTH_RATE_LIMIT_PER_USERNAME", 10))
+AUTH_RATE_LIMIT_BURST = float(os.environ.get("AUTH_RATE_LIMIT_BURST", 5))
+AUTH_MAX_CONCURRENCY = int(os.environ.get("AUTH_MAX_CONCURRENCY", 8))
+# The number of proxies in front of the app whose X-Forwarded-For entries are
+# trusted to find the client IP (set to 1 on Azure Functions). With 0 the
+# header is ignored, clients could otherwise pick their own IP
+TRUSTED_PROXY_HOPS = int(os.environ.get("TRUSTED_PROXY_HOPS", 0))
+
+# Password hashing profile ("bcrypt", or "argon2" when argon2-cffi is
+# installed). Stored hashes of the other scheme, or with other costs, are
+# upgraded in the background on login. The argon2 memory cost is in KiB
+PASSWORD_HASH_PROFILE = os.environ.get("PASSWORD_HASH_PROFILE", "bcrypt")
+PASSWORD_BCRYPT_ROUNDS = int(os.environ.get("PASSWORD_BCRYPT_ROUNDS", 12))
+PASSWORD_ARGON2_TIME_COST = int(os.environ.get("PASSWORD_ARGON2_TIME_COST", 2))
+PASSWORD_ARGON2_MEMORY_COST = int(os.environ.get("PASSWORD_ARGON2_MEMORY_COST", 19456))
+PASSWORD_ARGON2_PARALLELISM = int(os.environ.get("PASSWORD_ARGON2_PARALLELISM", 1))
+PASSWORD_HASH_PROFILES: dict[str, dict[str, Any]] = {
+    "bcrypt": {
+        "schemes": ["bcrypt", "argon2"],
+        "bcrypt__default_rounds": PASSWORD_BCRYPT_ROUNDS,
+        "bcrypt__min_rounds": PASSWORD_BCRYPT_ROUNDS,
+        "bcrypt__max_rounds": PASSWORD_BCRYPT_ROUNDS,
+    },
+    "argon2": {
+        "schemes": ["argon2", "bcrypt"],
+        "argon2__time_cost": PASSWORD_ARGON2_TIME_COST,
+        "argon2__memory_cost": PASSWORD_ARGON2_MEMORY_COST,
+        "argon2__parallelism": PASSWORD_ARGON2_PARALLELISM,
+    },
+}
+
+# Password hashing worker pool
+PASSWORD_HASH_WORKERS = int(os.environ.get("PASSWORD_HASH_WORKERS", 2))
+PASSWORD_HASH_QUEUE_SIZE = int(os.environ.get("PASSWORD_HASH_QUEUE_SIZE", 16))
+PASSWORD_HASH_USE_PROCESSES = os.environ.get("PASSWORD_HASH_EXECUTOR") == "process"
+
+# HTTP caching of beer reads
+BEER_CACHE_CONTROL = os.environ.get("BEER_CACHE_CONTROL", "public, no-cache")
+
+# Compression of the responses (with brotli when it is installed, gzip
+# otherwise). Compressed bodies of responses with an ETag are cached
+COMPRESSION_MINIMUM_SIZE = int(os.environ.get("COMPRESSION_MINIMUM_SIZE", 1024))
+COMPRESSION_GZIP_LEVEL = int(os.environ.get("COMPRESSION_GZIP_LEVEL", 6))
+COMPRESSION_BROTLI_QUALITY = int(os.environ.get("COMPRESSION_BROTLI_QUALITY", 4))
+COMPRESSION_CACHE_SIZE = int(os.environ.get("COMPRESSION_CACHE_SIZE", 256))
+COMPRESSION_CACHE_TTL = float(os.environ.get("COMPRESSION_CACHE_TTL", 300))
+
+# Skip re-validating trusted database rows on the hot list endpoints
+FAST_SERIALIZATION = os.environ.get("FAST_SERIALIZATION", "false").lower() == "true"
+
+# Database connection ("dummy", "columnar" or "sqlite")
+DATABASE_BACKEND = os.environ.get("DATABASE_BACKEND", "dummy")
+SQLITE_PATH = os.environ.get("SQLITE_PATH", "db.sqlite3")
+SQLITE_POOL_SIZE = int(os.environ.get("SQLITE_POOL_SIZE", 4))
+# Read the changes to the users made by other processes sharing the file at
+# this interval (in seconds, off if unset), to invalidate the cached tokens
+SQLITE_WATCH_INTERVAL = (
+    float(os.environ["SQLITE_WATCH_INTERVAL"])
+    if os.environ.get("SQLITE_WATCH_INTERVAL")
+    else None
+)
+# Persist the columnar database to this directory (in memory only if unset)
+COLUMNAR_DATA_DIR = os.environ.get("COLUMNAR_DATA_DIR")
+COLUMNAR_SNAPSHOT_EVERY = int(os.environ.get("COLUMNAR_SNAPSHOT_EVERY", 10000))
+
+# Queue beer writes in this directory and write them in the background (off
+# if unset)
+WRITE_BEHIND_DIR = os.environ.get("WRITE_BEHIND_DIR")
+WRITE_BEHIND_BATCH_SIZE = int(os.environ.get("WRITE_BEHIND_BATCH_SIZE", 500))
+WRITE_BEHIND_INTERVAL = float(os.environ.get("WRITE_BEHIND_INTERVAL", 1))
+
+BEER_IMPORT_BATCH_SIZE = int(os.environ.get("BEER_IMPORT_BATCH_SIZE", 500))
+BEER_BATCH_MAX_IDS = int(os.environ.get("BEER_BATCH_MAX_IDS", 100))
+
+# The database reads where identical concurrent calls share one call. Set
+# to an empty string to turn it off
+SINGLE_FLIGHT_METHODS = [
+    method
+    for method in os.environ.get(
+        "SINGLE_FLIGHT_METHODS",
+        "get_by_username,get_beer_by_id,get_beers_by_ids,get_all_beers,"
+        "get_beers_after,search_beers,get_brewery_aggregates,get_all_users,"
+        "get_users_after",
+    ).split(",")
+    if method
+]
+
+# Add the spans of every request to its response in a Server-Timing header
+SERVER_TIMING = os.environ.get("SERVER_TIMING", "false").lower() == "true"
+
+database: Database
+if DATABASE_BACKEND == "sqlite":
+    database = SQLiteDatabase(
+        path=SQLITE_PATH,
+        pool_size=SQLITE_POOL_SIZE,
+        watch_interval=SQLITE_WATCH_INTERVAL,
+    )
+elif DATABASE_BACKEND == "columnar":
+    database = ColumnarDatabase(
+        data_dir=COLUMNAR_DATA_DIR, snapshot_every=COLUMNAR_SNAPSHOT_EVERY
+    )
+else:
+    database = DummyUserDatabase()
+
+# Time every database call
+metrics.instrument(
+    database,
+    prefix="db",
+    names=[
+        *Database.__abstractmethods__,
+        "create_beer_if_absent",
+        "delete_beer_if_present",
+        "get_collection_version",
+    ],
+)
+
+# Coalesce identical concurrent reads (after timing, so only the shared call
+# is timed) of requests that saw the same collection versions
+database_single_flight = SingleFlight()
+database_single_flight.wrap(
+    database, names=SINGLE_FLIGHT_METHODS, scope=collection_versions.seen
+)
+metrics.add_collector("db_single_flight", database_single_flight.metrics)
+
+# Queue beer writes (outside the coalescing, so queued beers are read from
+# the queue)
+if WRITE_BEHIND_DIR is not None:
+    database_write_behind = WriteBehind(
+        data_dir=WRITE_BEHIND_DIR,
+        batch_size=WRITE_BEHIND_BATCH_SIZE,
+        interval=WRITE_BEHIND_INTERVAL,
+    )
+    database_write_behind.wrap(database)
+    metrics.add_collector("db_write_behind", database_write_behind.metrics)
 
-# Database connection
-database = DummyUserDatabase()
+# Derive the ETags of the collections from their changes (or their versions
+# in the database, when it keeps track of them)
+collection_versions.watch(database)
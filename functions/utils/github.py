@@ -0,0 +1,121 @@
+import asyncio
+import hashlib
+from typing import TYPE_CHECKING
+
+from exceptions import github_unavailable_exception, unauthorized_exception
+
+from utils.cache import TTLCache
+from utils.metrics import metrics
+
+# NOTE: httpx and the Github models are imported on first use, to keep them
+# out of the cold start of the app
+if TYPE_CHECKING:
+    import httpx
+    from models.providers.github import GithubUserData
+
+
+class GithubClient:
+    """An async client for the Github API that keeps its connections
+    alive between requests.
+
+    Args:
+        base_url (str): The base URL of the Github API.
+        timeout (float): The timeout (in seconds) of every call.
+        max_connections (int): The maximum number of open connections.
+        cache_ttl (float): How long (in seconds) to cache the user data
+            of an access token.
+    """
+
+    def __init__(
+        self, base_url: str, timeout: float, max_connections: int, cache_ttl: float
+    ) -> None:
+        self.base_url = base_url
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.user_data_cache: TTLCache[str, "GithubUserData"] = TTLCache(
+            max_size=256, ttl=cache_ttl
+        )
+        self._client: "httpx.AsyncClient | None" = None
+
+    @property
+    def client(self) -> "httpx.AsyncClient":
+        """The shared HTTP client, created on first use."""
+        if self._client is None:
+            import httpx
+
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                ),
+                headers={"Accept": "application/vnd.github+json"},
+            )
+        return self._client
+
+    async def _get(self, path: str, access_token: str) -> "httpx.Response":
+        """Call a Github API endpoint with an access token.
+
+        Args:
+            path (str): The path of the endpoint.
+            access_token (str): The Github access token.
+
+        Raises:
+            HTTPException: Raised (401) if Github rejects the access
+                token, or (502) if Github can't be reached.
+
+        Returns:
+            httpx.Response: The response of the Github API.
+        """
+        import httpx
+
+        try:
+            with metrics.span("github" + path.replace("/", ".")):
+                response = await self.client.get(
+                    path, headers={"Authorization": f"token {access_token}"}
+                )
+            response.raise_for_status()
+        except httpx.HTTPStatusError as error:
+            if error.response.status_code in (401, 403):
+                raise unauthorized_exception
+            raise github_unavailable_exception
+        except httpx.HTTPError:
+            raise github_unavailable_exception
+        return response
+
+    async def get_user_data(self, access_token: str) -> "GithubUserData":
+        """Get the profile and email addresses of a Github user.
+
+        Both are fetched concurrently and cached briefly by the digest of
+        the access token.
+
+        Args:
+            access_token (str): The Github access token of the user.
+
+        Returns:
+            GithubUserData: The profile and email addresses of the user.
+        """
+        from models.providers.github import GithubEmailData, GithubUserData
+
+        cache_key = hashlib.sha256(access_token.encode()).hexdigest()
+        user_data = self.user_data_cache.get(cache_key)
+        if user_data is not None:
+            return user_data
+
+        profile_response, email_response = await asyncio.gather(
+            self._get("/user", access_token),
+            self._get("/user/emails", access_token),
+        )
+        email_addresses = [GithubEmailData(**email) for email in email_response.json()]
+        user_data = GithubUserData(
+            **profile_response.json(), email_addresses=email_addresses
+        )
+        self.user_data_cache.set(cache_key, user_data)
+        return user_data
+
+    async def close(self) -> None:
+        """Close the connections of the client."""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
@@ -0,0 +1,128 @@
+import hashlib
+import uuid
+from contextvars import ContextVar
+
+from db.base import Database
+from db.events import ChangeEvent
+from fastapi import Request, Response
+
+from utils.compression import decode_etag
+
+
+# The versions of the collections read by the current request (that its ETags
+# are built from), as (collection, epoch, version) triples
+_seen_versions: ContextVar[tuple[tuple[str, str, int], ...]] = ContextVar(
+    "seen_versions", default=()
+)
+
+
+class CollectionVersions:
+    """Count the changes to every collection, to derive ETags from.
+
+    The counters live in memory, so every instance also gets a random
+    epoch to keep its ETags apart from those of other instances. Databases
+    that keep track of the versions themselves (so the processes sharing
+    them agree on the ETags) are read instead.
+    """
+
+    def __init__(self) -> None:
+        self.epoch = uuid.uuid4().hex
+        self._versions: dict[str, int] = {}
+        self._database: Database | None = None
+
+    def get(self, collection: str) -> int:
+        """Get the current version of a collection."""
+        return self._versions.get(collection, 0)
+
+    def bump(self, collection: str) -> None:
+        """Mark a collection as changed."""
+        self._versions[collection] = self.get(collection) + 1
+
+    def on_change(self, event: ChangeEvent) -> None:
+        """Mark the collection of a database change event as changed."""
+        self.bump(event.collection)
+
+    def watch(self, database: Database) -> None:
+        """Count the changes to a database, or read its versions if it keeps
+        track of them."""
+        self._database = database
+        database.changes.subscribe(self.on_change)
+
+    async def current(self, collection: str) -> tuple[str, int]:
+        """Get the epoch and the current version of a collection, and
+        remember it as seen by the current request."""
+        version = None
+        if self._database is not None:
+            version = await self._database.get_collection_version(collection)
+        epoch, number = version or (self.epoch, self.get(collection))
+        _seen_versions.set(
+            (
+                *(seen for seen in _seen_versions.get() if seen[0] != collection),
+                (collection, epoch, number),
+            )
+        )
+        return epoch, number
+
+    def seen(self) -> tuple[tuple[str, str, int], ...]:
+        """Get the versions of the collections that the current request
+        read, as (collection, epoch, version) triples.
+
+        Reads that coalesce with other reads only share the reads of
+        requests that saw the same versions, so a read that started
+        before a write isn't returned under the ETag of after the write.
+        """
+        return _seen_versions.get()
+
+
+collection_versions = CollectionVersions()
+
+
+async def get_etag(request: Request, collection: str) -> str:
+    """Get the (strong) ETag of a read of a collection.
+
+    Args:
+        request (Request): The request that reads the collection.
+        collection (str): The name of the collection.
+
+    Returns:
+        str: The ETag, which changes whenever the collection changes.
+    """
+    epoch, version = await collection_versions.current(collection)
+    digest = hashlib.sha256(
+        f"{epoch}:{version}:{request.url.path}?" f"{request.url.query}".encode()
+    ).hexdigest()
+    return f'"{version}-{digest[:20]}"'
+
+
+async def check_not_modified(
+    request: Request, response: Response, collection: str, cache_control: str
+) -> Response | None:
+    """Set the caching headers of a read of a collection and check if the
+    client already has the current version.
+
+    Args:
+        request (Request): The request that reads the collection.
+        response (Response): The response to set the caching headers on.
+        collection (str): The name of the collection.
+        cache_control (str): The value of the Cache-Control header.
+
+    Returns:
+        Response | None: A 304 (Not Modified) response if an ETag in the
+            If-None-Match header is current (in any content encoding),
+            None otherwise.
+    """
+    etag = await get_etag(request, collection)
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = cache_control
+    # NOTE: "*" isn't special-cased, the resource isn't known to exist yet
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is None:
+        return None
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if decode_etag(tag) == etag:
+            # NOTE: The ETag of the encoding the client has
+            return Response(
+                status_code=304, headers={"ETag": tag, "Cache-Control": cache_control}
+            )
+    return None
@@ -0,0 +1,265 @@
+import functools
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Iterable, Iterator, TypeVar
+
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+T = TypeVar("T")
+
+# The upper bounds (in seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+PROMETHEUS_MEDIA_TYPE = "text/plain; version=0.0.4"
+
+# The spans of the current request, as (name, seconds) pairs
+_request_spans: ContextVar[list[tuple[str, float]] | None] = ContextVar(
+    "request_spans", default=None
+)
+
+
+class Histogram:
+    """A latency histogram with fixed buckets.
+
+    Args:
+        buckets (tuple[float, ...]): The upper bounds of the buckets.
+    """
+
+    def __init__(self, buckets: tuple[float, ...] = LATENCY_BUCKETS) -> None:
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative_counts(self) -> Iterator[tuple[str, int]]:
+        """Get the cumulative count of every bucket, by upper bound."""
+        total = 0
+        for bound, count in zip((*map(str, self.buckets), "+Inf"), self.counts):
+            total += count
+            yield bound, total
+
+
+def _labels(**labels: str) -> str:
+    return ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items())
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class MetricsRegistry:
+    """Collect the latency of requests and of the named spans inside them,
+    and render everything in the Prometheus text format.
+
+    Other components expose their own numbers through collectors.
+    """
+
+    def __init__(self) -> None:
+        self.requests: dict[tuple[str, str, str], Histogram] = defaultdict(Histogram)
+        self.spans: dict[str, Histogram] = defaultdict(Histogram)
+        self.in_flight: dict[int, Scope] = {}
+        self.collectors: dict[str, Callable[[], dict[str, float]]] = {}
+
+    def add_collector(
+        self, prefix: str, collect: Callable[[], dict[str, float]]
+    ) -> None:
+        """Expose the numbers of a component.
+
+        Args:
+            prefix (str): The prefix of the metric names.
+            collect (Callable[[], dict[str, float]]): Get the current
+                numbers, by name.
+        """
+        self.collectors[prefix] = collect
+
+    @contextmanager
+    def span(self, name: str) -> Iterator[None]:
+        """Time a named step of a request.
+
+        Args:
+            name (str): The name of the step.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            self.spans[name].observe(seconds)
+            request_spans = _request_spans.get()
+            if request_spans is not None:
+                request_spans.append((name, seconds))
+
+    def timed(
+        self, name: str
+    ) -> Callable[[Callable[..., Awaitable[T]]], Callable[..., Awaitable[T]]]:
+        """Time every call of a coroutine function as a named span.
+
+        Args:
+            name (str): The name of the span.
+        """
+
+        def decorator(func: Callable[..., Awaitable[T]]) -> Callable[..., Awaitable[T]]:
+            @functools.wraps(func)
+            async def wrapper(*args: Any, **kwargs: Any) -> T:
+                with self.span(name):
+                    return await func(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    def instrument(self, obj: T, prefix: str, names: Iterable[str]) -> T:
+        """Time every call of some coroutine methods of an object, as spans
+        named after the methods.
+
+        Args:
+            obj (T): The object to instrument.
+            prefix (str): The prefix of the span names.
+            names (Iterable[str]): The names of the methods.
+
+        Returns:
+            T: The same object.
+        """
+        for name in names:
+            method = getattr(obj, name)
+            setattr(obj, name, self.timed(f"{prefix}.{name}")(method))
+        return obj
+
+    def render(self) -> str:
+        """Render all metrics in the Prometheus text format."""
+        lines = [
+            "# HELP http_requests_in_flight The number of requests being served.",
+            "# TYPE http_requests_in_flight gauge",
+        ]
+        in_flight: dict[tuple[str, str], int] = defaultdict(int)
+        for scope in list(self.in_flight.values()):
+            in_flight[scope["method"], _route(scope)] += 1
+        for (method, route), count in sorted(in_flight.items()):
+            lines.append(
+                f"http_requests_in_flight{{{_labels(method=method, route=route)}}} "
+                f"{count}"
+            )
+
+        lines += [
+            "# HELP http_request_duration_seconds The latency of the requests.",
+            "# TYPE http_request_duration_seconds histogram",
+        ]
+        for (method, route, status), histogram in sorted(self.requests.items()):
+            labels = _labels(method=method, route=route, status=status)
+            lines += _render_histogram(
+                "http_request_duration_seconds", labels, histogram
+            )
+
+        lines += [
+            "# HELP span_duration_seconds The latency of the steps of requests.",
+            "# TYPE span_duration_seconds histogram",
+        ]
+        for name, histogram in sorted(self.spans.items()):
+            labels = _labels(span=name)
+            lines += _render_histogram("span_duration_seconds", labels, histogram)
+
+        for prefix, collect in self.collectors.items():
+            for name, value in collect().items():
+                lines.append(f"# TYPE {prefix}_{name} untyped")
+                lines.append(f"{prefix}_{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def _render_histogram(name: str, labels: str, histogram: Histogram) -> list[str]:
+    lines = [
+        f'{name}_bucket{{{labels},le="{bound}"}} {count}'
+        for bound, count in histogram.cumulative_counts()
+    ]
+    lines.append(f"{name}_sum{{{labels}}} {histogram.sum}")
+    lines.append(f"{name}_count{{{labels}}} {histogram.count}")
+    return lines
+
+
+def _route(scope: Scope) -> str:
+    """Get the path template of the route that handles a request, so
+    the metrics are grouped by route instead of by path."""
+    route = scope.get("route")
+    if route is None:
+        return "unmatched"
+    return scope.get("root_path", "") + getattr(route, "path", "")
+
+
+def _server_timing(spans: list[tuple[str, float]], total: float) -> str:
+    entries = [f"{name};dur={seconds * 1000:.2f}" for name, seconds in spans]
+    entries.append(f"total;dur={total * 1000:.2f}")
+    return ", ".join(entries)
+
+
+class MetricsMiddleware:
+    """Record the latency of every request, by route, and the requests in
+    flight.
+
+    Args:
+        app (ASGIApp): The app to wrap.
+        registry (MetricsRegistry): The registry to record the metrics in.
+        server_timing (bool): Whether to add a `Server-Timing` header with
+            the spans of the request to every response.
+    """
+
+    def __init__(
+        self, app: ASGIApp, registry: "MetricsRegistry", server_timing: bool = False
+    ) -> None:
+        self.app = app
+        self.registry = registry
+        self.server_timing = server_timing
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = 500
+        spans: list[tuple[str, float]] = []
+        token = _request_spans.set(spans)
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if self.server_timing:
+                    headers = MutableHeaders(scope=message)
+                    total = time.perf_counter() - start
+                    headers.append("Server-Timing", _server_timing(spans, total))
+            await send(message)
+
+        # NOTE: The routing fills in the route of the (shared) scope
+        self.registry.in_flight[id(scope)] = scope
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            del self.registry.in_flight[id(scope)]
+            _request_spans.reset(token)
+            key = (scope["method"], _route(scope), str(status))
+            self.registry.requests[key].observe(time.perf_counter() - start)
+
+
+metrics = MetricsRegistry()
@@ -0,0 +1,42 @@
+import base64
+import binascii
+
+from exceptions import invalid_cursor_exception
+
+# The response header that holds the cursor of the next page
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(key: str) -> str:
+    """Encode the key of the last record on a page as an opaque cursor.
+
+    Args:
+        key (str): The key of the last record on the page.
+
+    Returns:
+        str: The cursor of the next page.
+    """
+    return base64.urlsafe_b64encode(key.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> str | None:
+    """Decode a cursor back into the key to start after.
+
+    Args:
+        cursor (str): The cursor. An empty cursor starts at the first
+            record.
+
+    Raises:
+        HTTPException: Raised (400) if the cursor is invalid.
+
+    Returns:
+        str | None: The key to start after, or None to start at the
+            first record.
+    """
+    if not cursor:
+        return None
+    try:
+        padded_cursor = cursor + "=" * (-len(cursor) % 4)
+        return base64.b64decode(padded_cursor, altchars=b"-_", validate=True).decode()
+    except (binascii.Error, UnicodeDecodeError):
+        raise invalid_cursor_exception
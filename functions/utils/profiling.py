@@ -0,0 +1,54 @@
+import sys
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+# The heavy modules that are only imported on first use
+LAZY_MODULES = ("jose", "passlib", "bcrypt", "httpx", "models.providers.github")
+
+
+class StartupProfiler:
+    """Break down the cold start of the app into the time spent importing
+    modules and the time spent in every step of building the app.
+
+    The import time is the CPU time the process used before the profiler
+    was created, so create it right after the imports.
+
+    Args:
+        enabled (bool): Whether to print the breakdown.
+    """
+
+    def __init__(self, enabled: bool) -> None:
+        self.enabled = enabled
+        self.import_time = time.process_time()
+        self.stages: list[tuple[str, float]] = []
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Time a step of building the app.
+
+        Args:
+            name (str): The name of the step.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages.append((name, time.perf_counter() - start))
+
+    def report(self) -> str:
+        """Get the breakdown of the cold start as text."""
+        lines = [f"{'imports (CPU time)':<30} {self.import_time * 1000:8.1f} ms"]
+        lines += [
+            f"{name:<30} {seconds * 1000:8.1f} ms" for name, seconds in self.stages
+        ]
+        total = self.import_time + sum(seconds for _, seconds in self.stages)
+        lines.append(f"{'total':<30} {total * 1000:8.1f} ms")
+        deferred = [module for module in LAZY_MODULES if module not in sys.modules]
+        lines.append(f"deferred imports: {', '.join(deferred) or 'none'}")
+        return "\n".join(lines)
+
+    def print_report(self) -> None:
+        """Print the breakdown of the cold start (if enabled)."""
+        if self.enabled:
+            print(f"Startup profile:\n{self.report()}", file=sys.stderr)
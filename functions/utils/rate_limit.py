@@ -0,0 +1,153 @@
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import AsyncIterator
+
+from exceptions import service_busy_exception, too_many_requests_exception
+from fastapi import HTTPException, Request
+
+
+class RateLimitStore(ABC):
+    """Where the token buckets of a rate limiter are kept. Implement this
+    on a shared store (like Redis) to rate limit across instances."""
+
+    @abstractmethod
+    async def take(self, key: str, rate: float, capacity: float) -> float:
+        """Take a token from a bucket, refilling it first.
+
+        Args:
+            key (str): The key of the bucket.
+            rate (float): The number of tokens added per second.
+            capacity (float): The maximum number of tokens in the bucket.
+
+        Returns:
+            float: 0 if a token was taken, otherwise the number of
+                seconds until the next token is added.
+        """
+
+
+class MemoryRateLimitStore(RateLimitStore):
+    """Keep the token buckets in memory, so every instance (and process)
+    rate limits on its own.
+
+    Args:
+        max_keys (int): The maximum number of buckets. The least recently
+            used bucket is dropped when there are more. Defaults to 10000.
+    """
+
+    def __init__(self, max_keys: int = 10000) -> None:
+        self.max_keys = max_keys
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+
+    async def take(self, key: str, rate: float, capacity: float) -> float:
+        now = time.monotonic()
+        tokens, updated_at = self._buckets.pop(key, (capacity, now))
+        tokens = min(capacity, tokens + (now - updated_at) * rate)
+        retry_after = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            retry_after = (1 - tokens) / rate
+        self._buckets[key] = (tokens, now)
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return retry_after
+
+
+class RateLimiter:
+    """Rate limit expensive endpoints by client IP and username with token
+    buckets, and cap the number of requests they serve at once.
+
+    Args:
+        store (RateLimitStore): Where the token buckets are kept.
+        ip_rate (float): The requests per minute per client IP.
+        username_rate (float): The requests per minute per username.
+        burst (float): The requests a client can make at once.
+        max_concurrency (int): The maximum number of requests served at
+            once, over all clients.
+    """
+
+    def __init__(
+        self,
+        store: RateLimitStore,
+        ip_rate: float,
+        username_rate: float,
+        burst: float,
+        max_concurrency: int,
+    ) -> None:
+        self.store = store
+        self.ip_rate = ip_rate
+        self.username_rate = username_rate
+        self.burst = burst
+        self.max_concurrency = max_concurrency
+        self.in_flight = 0
+        self.rate_limited = 0
+        self.concurrency_rejected = 0
+
+    async def check(self, ip: str, username: str | None = None) -> None:
+        """Take a token from the buckets of a client.
+
+        Args:
+            ip (str): The IP address of the client.
+            username (str | None): The username the client logs in with.
+
+        Raises:
+            HTTPException: Raised (429) if a bucket is empty.
+        """
+        buckets = [(f"ip:{ip}", self.ip_rate)]
+        if username is not None:
+            buckets.append((f"username:{username.lower()}", self.username_rate))
+        for key, rate in buckets:
+            retry_after = await self.store.take(key, rate / 60, self.burst)
+            if retry_after:
+                self.rate_limited += 1
+                raise HTTPException(
+                    status_code=too_many_requests_exception.status_code,
+                    detail=too_many_requests_exception.detail,
+                    headers={"Retry-After": str(int(retry_after) + 1)},
+                )
+
+    async def guard(self) -> AsyncIterator[None]:
+        """A dependency that holds one of the concurrent request slots for
+        the duration of a request.
+
+        Raises:
+            HTTPException: Raised (503) if all slots are taken.
+        """
+        if self.in_flight >= self.max_concurrency:
+            self.concurrency_rejected += 1
+            raise service_busy_exception
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+
+    def metrics(self) -> dict[str, float]:
+        """Get the number of requests in flight and rejected requests."""
+        return {
+            "in_flight": self.in_flight,
+            "rate_limited": self.rate_limited,
+            "concurrency_rejected": self.concurrency_rejected,
+        }
+
+
+def get_client_ip(request: Request, trusted_proxy_hops: int = 0) -> str:
+    """Get the IP address of the client of a request.
+
+    Every proxy appends the address it got the request from to the
+    `X-Forwarded-For` header, and the client can send any addresses in it,
+    so only the addresses added by the trusted proxies are used: the
+    client is the address that the first of them added.
+
+    Args:
+        request (Request): The request.
+        trusted_proxy_hops (int): The number of proxies in front of the app
+            (1 behind the Azure Functions front end). Defaults to 0, to
+            ignore the header and use the address of the connection.
+    """
+    forwarded_for = request.headers.get("X-Forwarded-For")
+    if trusted_proxy_hops > 0 and forwarded_for:
+        addresses = [address.strip() for address in forwarded_for.split(",")]
+        return addresses[max(0, len(addresses) - trusted_proxy_hops)]
+    return request.client.host if request.client is not None else "unknown"
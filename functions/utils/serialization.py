@@ -0,0 +1,56 @@
+import json
+from typing import Any, Iterable, Mapping
+
+from fastapi import Response
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None  # type: ignore[assignment]
+
+
+def dumps(content: Any) -> bytes:
+    """Encode content as compact JSON, with orjson when it is installed.
+
+    Args:
+        content (Any): The content to encode.
+
+    Returns:
+        bytes: The encoded content.
+    """
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, separators=(",", ":"), ensure_ascii=False).encode()
+
+
+def project(
+    records: Iterable[Mapping[str, Any]], model: type[BaseModel]
+) -> list[dict[str, Any]]:
+    """Pick the fields of a model from records, without validating them.
+
+    Only use this for trusted records (for example rows from the
+    database) that already match the model.
+
+    Args:
+        records (Iterable[Mapping[str, Any]]): The records.
+        model (type[BaseModel]): The model that defines the fields.
+
+    Returns:
+        list[dict[str, Any]]: The records with only the fields of the
+            model (missing fields get their default).
+    """
+    fields = [(name, field.default) for name, field in model.__fields__.items()]
+    return [
+        {name: record.get(name, default) for name, default in fields}
+        for record in records
+    ]
+
+
+class FastJSONResponse(Response):
+    """A JSON response that is encoded with `dumps`."""
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -0,0 +1,90 @@
+import asyncio
+import functools
+from collections import defaultdict
+from typing import Any, Awaitable, Callable, Hashable, Iterable, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """Coalesce identical concurrent calls, so they share one call (and
+    its result or error) instead of each calling the backend.
+
+    Only use this for reads: the callers share the same result objects.
+    """
+
+    def __init__(self) -> None:
+        self._calls: dict[tuple[str, str], asyncio.Future] = {}
+        self.calls: dict[str, int] = defaultdict(int)
+        self.coalesced: dict[str, int] = defaultdict(int)
+
+    async def do(self, name: str, key: str, func: Callable[[], Awaitable[T]]) -> T:
+        """Call a function, or wait for the identical call in flight.
+
+        Args:
+            name (str): The name of the function, for the metrics.
+            key (str): The key of the call, equal for identical calls.
+            func (Callable[[], Awaitable[T]]): Make the call.
+
+        Returns:
+            T: The result of the (shared) call.
+        """
+        self.calls[name] += 1
+        call = self._calls.get((name, key))
+        if call is not None:
+            self.coalesced[name] += 1
+        else:
+            # NOTE: Run the call in its own task, so cancelling the request
+            # that started it doesn't cancel it for the other callers
+            call = asyncio.ensure_future(func())
+            self._calls[name, key] = call
+            call.add_done_callback(lambda _: self._calls.pop((name, key), None))
+        return await asyncio.shield(call)
+
+    def wrap(
+        self,
+        obj: T,
+        names: Iterable[str],
+        scope: Callable[[], Hashable] | None = None,
+    ) -> T:
+        """Coalesce the identical concurrent calls of some coroutine methods
+        of an object.
+
+        Args:
+            obj (T): The object to wrap the methods of.
+            names (Iterable[str]): The names of the methods.
+            scope (Callable[[], Hashable] | None): Get a part of the key of
+                a call, like the version of the data the caller expects,
+                so calls only share calls made in the same scope. Defaults
+                to None.
+
+        Returns:
+            T: The same object.
+        """
+        for name in names:
+            setattr(obj, name, self._wrap_method(name, getattr(obj, name), scope))
+        return obj
+
+    def _wrap_method(
+        self,
+        name: str,
+        method: Callable[..., Awaitable[Any]],
+        scope: Callable[[], Hashable] | None,
+    ) -> Callable[..., Awaitable[Any]]:
+        @functools.wraps(method)
+        async def wrapper(*args: Any, **kwargs: Any) -> Any:
+            key = repr(
+                (scope() if scope is not None else None, args, sorted(kwargs.items()))
+            )
+            return await self.do(name, key, lambda: method(*args, **kwargs))
+
+        return wrapper
+
+    def metrics(self) -> dict[str, float]:
+        """Get the number of calls and coalesced calls of every method, and
+        the number of calls in flight."""
+        metrics: dict[str, float] = {"in_flight": len(self._calls)}
+        for name, calls in self.calls.items():
+            metrics[f"{name}_calls"] = calls
+            metrics[f"{name}_coalesced"] = self.coalesced[name]
+        return metrics
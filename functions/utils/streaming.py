@@ -0,0 +1,177 @@
+import codecs
+import csv
+import json
+import zlib
+from typing import Any, AsyncIterator
+
+from pydantic import BaseModel
+
+# The media type of newline delimited JSON
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+async def ndjson_stream(
+    records: AsyncIterator[dict[str, Any]],
+    model: type[BaseModel],
+    chunk_size: int = 16384,
+) -> AsyncIterator[bytes]:
+    """Serialise records as newline delimited JSON, one chunk at a time.
+
+    Args:
+        records (AsyncIterator[dict[str, Any]]): The records to serialise.
+        model (type[BaseModel]): The model that defines the public fields
+            of a record.
+        chunk_size (int): The (approximate) size in bytes of the chunks.
+            Defaults to 16384.
+
+    Yields:
+        bytes: Chunks of serialised records, each ending with a newline.
+    """
+    buffer: list[bytes] = []
+    buffered = 0
+    async for record in records:
+        line = model(**record).json().encode() + b"\n"
+        buffer.append(line)
+        buffered += len(line)
+        if buffered >= chunk_size:
+            yield b"".join(buffer)
+            buffer.clear()
+            buffered = 0
+    if buffer:
+        yield b"".join(buffer)
+
+
+async def gzip_stream(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """Compress a stream of chunks with gzip. Every chunk is flushed, so
+    clients can start decompressing before the stream ends.
+
+    Args:
+        chunks (AsyncIterator[bytes]): The chunks to compress.
+
+    Yields:
+        bytes: The compressed chunks.
+    """
+    compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16)
+    async for chunk in chunks:
+        yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
+
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Split a stream of chunks into lines of text.
+
+    Args:
+        chunks (AsyncIterator[bytes]): The UTF-8 encoded chunks.
+
+    Lines end with "\n" (or "\r\n") only, not with the other line
+    boundaries of `str.splitlines`, which can be part of a value.
+
+    Yields:
+        str: The lines (empty ones included, as CSV fields can span
+            them), without line endings.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    remainder = ""
+    async for chunk in chunks:
+        *lines, remainder = (remainder + decoder.decode(chunk)).split("\n")
+        for line in lines:
+            yield line[:-1] if line.endswith("\r") else line
+    remainder += decoder.decode(b"", final=True)
+    if remainder:
+        yield remainder[:-1] if remainder.endswith("\r") else remainder
+
+
+class _LineFeed:
+    """Feed the lines of a row to a `csv.reader` as they arrive, and tell
+    if the reader ran out of lines before the end of the row."""
+
+    def __init__(self) -> None:
+        self.lines: list[str] = []
+        self.exhausted = False
+        self._position = 0
+
+    def __iter__(self) -> "_LineFeed":
+        return self
+
+    def __next__(self) -> str:
+        if self._position == len(self.lines):
+            self.exhausted = True
+            raise StopIteration
+        self._position += 1
+        return self.lines[self._position - 1]
+
+    def rewind(self) -> None:
+        """Feed the lines of the row again, from the first one."""
+        self.exhausted = False
+        self._position = 0
+
+    def clear(self) -> None:
+        """Start the next row."""
+        self.lines.clear()
+        self.rewind()
+
+
+async def iter_records(
+    lines: AsyncIterator[str], csv_format: bool = False
+) -> AsyncIterator[tuple[int, dict[str, Any] | None]]:
+    """Parse lines of NDJSON (or CSV with a header row) into records.
+
+    Empty lines are skipped. CSV rows can span several lines (in quoted
+    fields).
+
+    Args:
+        lines (AsyncIterator[str]): The lines to parse.
+        csv_format (bool): Parse the lines as CSV instead of NDJSON.
+            Defaults to False.
+
+    Yields:
+        tuple[int, dict[str, Any] | None]: The (1-based) row number and
+            the record, or None if the row couldn't be parsed.
+    """
+    if csv_format:
+        async for row, record in _iter_csv_records(lines):
+            yield row, record
+        return
+    row = 0
+    async for line in lines:
+        if not line.strip():
+            continue
+        row += 1
+        try:
+            record = json.loads(line)
+        except ValueError:
+            yield row, None
+            continue
+        yield row, record if isinstance(record, dict) else None
+
+
+async def _iter_csv_records(
+    lines: AsyncIterator[str],
+) -> AsyncIterator[tuple[int, dict[str, Any] | None]]:
+    # NOTE: One reader parses all rows, but a row is only read once all of
+    # its lines arrived: when the reader runs out of lines in a quoted
+    # field, the row is read again with its next line
+    feed = _LineFeed()
+    reader = csv.reader(feed)
+    header: list[str] | None = None
+    row = 0
+    async for line in lines:
+        feed.lines.append(line + "\n")
+        feed.rewind()
+        try:
+            fields = next(reader)
+        except csv.Error:
+            fields = None
+        if fields is not None and feed.exhausted:
+            continue
+        feed.clear()
+        if fields == []:
+            continue
+        if header is None and fields is not None:
+            header = fields
+            continue
+        row += 1
+        yield row, dict(zip(header, fields)) if header and fields else None
+    if feed.lines:
+        # NOTE: A quoted field that is never closed
+        yield row + 1, None
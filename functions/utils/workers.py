@@ -0,0 +1,132 @@
+import asyncio
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, TypeVar
+
+from exceptions import service_busy_exception
+
+T = TypeVar("T")
+
+
+def _timed_call(func: Callable[..., T], *args: Any) -> tuple[T, float]:
+    """Call a function and measure how long it took inside the worker.
+
+    Defined at module level so it can be pickled for process pools.
+
+    Args:
+        func (Callable[..., T]): The function to call.
+        *args (Any): The arguments to call the function with.
+
+    Returns:
+        tuple[T, float]: The result of the call and the time (in
+            seconds) it took to compute it.
+    """
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+class BoundedWorkerPool:
+    """A bounded pool of workers to run blocking, CPU heavy functions
+    (like password hashing) off the event loop.
+
+    At most `max_workers` calls run at the same time and at most
+    `max_queue_size` calls wait for a free worker. Calls beyond that are
+    rejected right away with a 503 so latency doesn't pile up.
+
+    Args:
+        max_workers (int): The number of workers in the pool.
+        max_queue_size (int): The number of calls that may wait for a
+            free worker.
+        use_processes (bool): Use processes instead of threads.
+            Defaults to False.
+    """
+
+    def __init__(
+        self, max_workers: int, max_queue_size: int, use_processes: bool = False
+    ) -> None:
+        self.max_workers = max_workers
+        self.max_queue_size = max_queue_size
+        self.use_processes = use_processes
+        self._executor: Executor | None = None
+        self._pending = 0
+        self._completed = 0
+        self._rejected = 0
+        self._service_time_total = 0.0
+        self._service_time_max = 0.0
+        self._wait_time_total = 0.0
+
+    @property
+    def executor(self) -> Executor:
+        """The executor, created on first use to keep cold starts fast."""
+        if self._executor is None:
+            if self.use_processes:
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix="worker-pool"
+                )
+        return self._executor
+
+    @property
+    def queue_depth(self) -> int:
+        """The number of calls waiting for a free worker."""
+        return max(0, self._pending - self.max_workers)
+
+    async def run(self, func: Callable[..., T], *args: Any) -> T:
+        """Run a function in the pool and wait for the result.
+
+        Args:
+            func (Callable[..., T]): The function to run.
+            *args (Any): The arguments to call the function with.
+
+        Raises:
+            HTTPException: Raised (503) if the pool and its queue are full.
+
+        Returns:
+            T: The result of the function.
+        """
+        if self._pending >= self.max_workers + self.max_queue_size:
+            self._rejected += 1
+            raise service_busy_exception
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        future = self.executor.submit(partial(_timed_call, func, *args))
+        self._pending += 1
+        # NOTE: Release the slot once the worker is done, not when the caller
+        # stops waiting (a cancelled call keeps running unless it was queued)
+        future.add_done_callback(lambda _: loop.call_soon_threadsafe(self._release))
+        result, service_time = await asyncio.wrap_future(future)
+        self._completed += 1
+        self._service_time_total += service_time
+        self._service_time_max = max(self._service_time_max, service_time)
+        self._wait_time_total += time.perf_counter() - start - service_time
+        return result
+
+    def _release(self) -> None:
+        self._pending -= 1
+
+    def metrics(self) -> dict[str, float]:
+        """Get the current metrics of the pool.
+
+        Returns:
+            dict[str, float]: The queue depth, number of in-flight,
+                completed and rejected calls, and the service and wait
+                times (in seconds).
+        """
+        return {
+            "queue_depth": self.queue_depth,
+            "in_flight": self._pending,
+            "completed": self._completed,
+            "rejected": self._rejected,
+            "service_time_seconds_total": self._service_time_total,
+            "service_time_seconds_max": self._service_time_max,
+            "wait_time_seconds_total": self._wait_time_total,
+        }
+
+    def shutdown(self) -> None:
+        """Shut down the workers of the pool."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None